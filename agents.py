@@ -5,6 +5,7 @@ Created on Fri Jun 14 16:39:22 2024
 Author: andreadesogus
 """
 
+import logging
 from typing import List
 
 class Agent:
@@ -26,6 +27,8 @@ class Agent:
         self.context = features.get('context')
         self.task_description = features.get('task_description')
         self.expected_output = features.get('expected_output')
+        # Token budget of the other agents' outputs in this agent's prompt, see ContextViews
+        self.context_budget = features.get('context_budget')
 
     # Uncomment and implement this method if task execution logic is needed
     # def execute_task(self):
@@ -60,3 +63,38 @@ class Team:
                 'task_description': agent.task_description
             }
         return agents_mapping
+
+    def dependency_levels(self) -> List[List[Agent]]:
+        """
+        Orders the team topologically using each agent's context dependencies.
+
+        Agents in the same level only depend on agents of earlier levels, so
+        they can work in parallel. Dependencies on roles outside the team are
+        ignored.
+
+        Returns:
+            List[List[Agent]]: The levels, each keeping the team's agent order.
+
+        Raises:
+            ValueError: If the context dependencies contain a cycle.
+        """
+        roles = {agent.agent_role for agent in self.agents}
+        pending = {}
+        for agent in self.agents:
+            dependencies = set(agent.context or [])
+            unknown = dependencies - roles
+            if unknown:
+                logging.warning(f"Agent '{agent.agent_role}' depends on roles outside the team: {sorted(unknown)}")
+            pending[agent.agent_role] = dependencies & roles
+
+        levels = []
+        done = set()
+        while len(done) < len(self.agents):
+            level = [agent for agent in self.agents
+                     if agent.agent_role not in done and pending[agent.agent_role] <= done]
+            if not level:
+                cycle = sorted(role for role in pending if role not in done)
+                raise ValueError(f"Circular context dependencies between agents: {cycle}")
+            levels.append(level)
+            done.update(agent.agent_role for agent in level)
+        return levels
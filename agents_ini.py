@@ -13,6 +13,7 @@ class DefaultAgentSystem:
     """
     def __init__(self, agent: Agent):
         self.agent = agent 
+        self._prefix = None
         
     def get_tool_info(self):
         if self.agent.tools:
@@ -21,17 +22,21 @@ class DefaultAgentSystem:
                 tools_mapping[tool.name] = tool.description
             return str(tools_mapping)
         
-    def system(self, context: str) -> str:
+    def prefix(self) -> str:
         """
-        Generates a system message for an agent based on their role and task description.
-        
-        Args:
-            agent (Agent): The agent for whom the system message is generated.
-        
+        Returns the static part of the agent's system message, compiled on the
+        first call and reused afterwards. It does not depend on the run, so it
+        is byte-stable across calls and provider-side prompt caching can reuse it.
+
         Returns:
-            str: A formatted system message string.
+            str: The system message without the context section.
         """
-        system = f"""
+        if self._prefix is None:
+            self._prefix = self._build_prefix()
+        return self._prefix
+
+    def _build_prefix(self) -> str:
+        return f"""
 Welcome, Agent.
 
 You have been assigned the role of {self.agent.agent_role} within our organization. 
@@ -42,9 +47,6 @@ Task Overview:
 You are required to undertake the following task:
 {self.agent.task_description}
 
-Context:
-If specified, consider the following context from previous interactions of other agents: {context}
-
 Expected Output:
 Upon completion, the expected deliverable is {self.agent.expected_output}. This output must meet our high standards of quality, accuracy, and relevance to the task requirements.
 
@@ -64,7 +66,24 @@ Remember, collaboration is key to our success. Engage with your peers, share ins
 
 We trust in your abilities and dedication to fulfill this task with excellence. Your contributions are integral to achieving our organizational objectives.
 """
-        return system
+
+    def system(self, context: str) -> str:
+        """
+        Generates a system message for an agent based on their role and task description.
+
+        The context from other agents is the only part that changes between
+        calls, so it comes last, after the cached prefix.
+        
+        Args:
+            context (str): What the upstream agents said.
+        
+        Returns:
+            str: A formatted system message string.
+        """
+        return self.prefix() + f"""
+Context:
+If specified, consider the following context from previous interactions of other agents: {context}
+"""
 
 class SupervisorSystem:
     """
@@ -79,19 +98,27 @@ class SupervisorSystem:
             team (Team): The team of agents to be supervised.
         """
         self.team = team
+        self._system = None
+        self._planner = None
         
     def system(self) -> str:
         """
         Generates a system message for the AI supervisor to manage and coordinate the team.
+        The message is compiled on the first call and reused afterwards.
         
         Returns:
             str: A formatted system message string.
         """
+        if self._system is None:
+            self._system = self._build(self.team.agent_mapping())
+        return self._system
+
+    def _build(self, mapping: dict) -> str:
         system = f"""
 You are an AI Manager tasked with coordinating a team of AI agents. Your role is to coordinate the agents, assign tasks based on their competencies, and monitor the progress of activities. 
 The agents in your team have specific roles and various skill sets.
 
-Here is a mapping of the agents and their associated tasks: {self.team.agent_mapping()}
+Here is a mapping of the agents and their associated tasks: {mapping}
 
 Inputs Provided:
 - Roles of Agents: A list of agents with their respective roles and competencies.
@@ -117,7 +144,76 @@ Answer must be in JSON format. Here are the expected dictionary keys [EACH KEY M
 - question: None/str,      # if delegation == True
 - answer: None/str,        # if delegation == False
 - stop: True/False,        # True if a satisfactory response is obtained. Default is False
+- delegations: None/list,  # optional, if delegation == True: [{{"agent_role": str, "question": str}}, ...]
+
+To ask several agents whose tasks do not depend on each other at the same time, list them all in "delegations"; they will work in parallel.
 """
         return system
 
+    def compose(self) -> str:
+        """
+        Generates the instruction asking the supervisor for the final answer
+        once every agent has already worked on the question.
+
+        Returns:
+            str: The instruction message.
+        """
+        return ("All the agents have completed their tasks and their outputs are reported above. "
+                "Do not delegate any further: set delegation to False, stop to True and write "
+                "the final answer to the user's question in the answer key.")
+
+    def planner(self) -> str:
+        """
+        Generates the system message asking the supervisor for a complete
+        execution plan, for the "plan" execution mode.
+        The message is compiled on the first call and reused afterwards.
+
+        Returns:
+            str: A formatted system message string.
+        """
+        if self._planner is None:
+            self._planner = self._build_planner(self.team.agent_mapping())
+        return self._planner
+
+    def _build_planner(self, mapping: dict) -> str:
+        return f"""
+You are an AI Manager tasked with coordinating a team of AI agents. Before the work starts, you write the complete execution plan that the team will follow to answer the user's question, without consulting you in between.
+
+Here is a mapping of the agents and their associated tasks: {mapping}
+
+Objectives:
+- Delegate tasks efficiently based on the specific competencies of the agents.
+- Involve ALL the agents you are provided with.
+- Write every question so that the agent can answer it with the user's question and the outputs of the agents of the previous steps.
+
+Answer must be in JSON format with a single key [IT MUST BE PRESENT]:
+- steps: list,  # [{{"delegations": [{{"agent_role": str, "question": str}}, ...]}}, ...]
+
+The steps run in order; the delegations of one step run in parallel. Put together only agents whose tasks do not depend on each other, and put every agent in a step after the agents whose outputs it needs.
+"""
+
+    def plan(self) -> str:
+        """
+        Generates the instruction asking the supervisor for the execution plan.
+
+        Returns:
+            str: The instruction message.
+        """
+        return "Write the execution plan that answers the user's question."
+
+    def replan(self, flagged: list) -> str:
+        """
+        Generates the instruction asking the supervisor to plan again the work
+        left, after some agent outputs were flagged as unsatisfactory.
+
+        Args:
+            flagged (list): The roles of the agents whose outputs were flagged.
+
+        Returns:
+            str: The instruction message.
+        """
+        return (f"The outputs of {', '.join(flagged)} were flagged as unsatisfactory. Write the execution plan "
+                "of the work left: ask those agents again, with better questions, and keep the steps of "
+                "the previous plan that are still needed.")
+
 # Note: Answer directly only if you already have the highest quality response to the user's initial question.
@@ -5,81 +5,641 @@ Created on Fri Jun 14 14:42:37 2024
 @author: AGO6359
 """
 
-from openai import OpenAI
-import io
-import requests
-from typing import Union, List
-
-file_path= "/Users/andreadesogus/Downloads/api_key.txt"
-with open(file_path, 'r') as f:
-        api_key = f.read()
-
-class openaiApis:
-    def __init__(self):
+import time
+import asyncio
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Union, List, Optional, Tuple
+from config import get_settings
+from llm_cache import CacheBackend, request_key
+from metrics import check_budget, record_completion
+from rate_limit import RetryPolicy
+
+if TYPE_CHECKING:
+    import numpy as np
+    from openai.types.chat import ChatCompletion
+    from vector_store import EmbeddingStore
+
+# The openai package, and numpy, are imported on first use: they dominate the
+# import time of the package, which worker processes pay at start-up.
+
+def read_api_key(path: str = None) -> str:
+    """
+    Reads the OpenAI API key from a file, or from the configured settings.
+
+    Args:
+        path (str): Path of the file containing the key; defaults to the settings,
+            see config.Settings.
+
+    Returns:
+        str: The API key.
+    """
+    if path is None:
+        return get_settings().resolve_api_key()
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+def build_messages(system: str, question: str = None, message: List = None) -> List:
+    """
+    Builds the chat messages list sent to the completion endpoint.
+
+    Args:
+        system (str): The system message to include in the conversation.
+        question (str): The user's input text.
+        message (List): Further messages appended after the question.
+
+    Returns:
+        List: The list of chat messages.
+    """
+    messages = [
+        {"role": "system", "content": system},
+    ]
+
+    if question:
+        user = [{"role": "user", "content": question}]
+        messages = messages + user
+
+    if message:
+        messages = messages + message
+    return messages
+
+
+def completion_kwargs(messages: List, tools = None, tool_choice = None, _format: str = "text", model: str = "gpt-4o", max_tokens: int = 3000) -> dict:
+    """
+    Builds the keyword arguments for a chat completion request.
+
+    Args:
+        messages (List): The chat messages.
+        tools: The tool definitions, if any.
+        tool_choice: The tool choice strategy, if any.
+        _format (Union[str, dict]): The format of the response: "json" for JSON mode, a
+            JSON schema for structured outputs (see structured_output.json_schema_format),
+            or anything else for text.
+        model (str): The chat model.
+        max_tokens (int): Maximum completion tokens for text responses.
+
+    Returns:
+        dict: The request parameters.
+    """
+    if isinstance(_format, dict):
+        return dict(
+            model=model,
+            response_format={"type": "json_schema", "json_schema": _format},
+            messages=messages,
+            tools=tools,
+            tool_choice=tool_choice
+        )
+    if _format == "json":
+        return dict(
+            model=model,
+            response_format={"type": "json_object"},
+            messages=messages,
+            tools=tools,
+            tool_choice=tool_choice
+        )
+    return dict(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        tools=tools,
+        tool_choice=tool_choice
+    )
+
+
+def embedding_kwargs(text: Union[str, List[str]], model: str = "text-embedding-3-large", dimensions: Optional[int] = 3072) -> dict:
+    """
+    Builds the keyword arguments for an embeddings request.
+
+    Args:
+        text (Union[str, List[str]]): The input text, or a batch of texts.
+        model (str): The embedding model.
+        dimensions (Optional[int]): The vector size; None lets the model decide.
+
+    Returns:
+        dict: The request parameters.
+    """
+    request = dict(
+        input=text,
+        model=model
+    )
+    if dimensions is not None:
+        request["dimensions"] = dimensions
+    return request
+
+
+def request_tokens(request: dict) -> int:
+    """
+    Estimates the tokens a request counts against a tokens-per-minute limit:
+    its input (about four characters per token) plus the completion allowance.
+
+    Args:
+        request (dict): The request parameters.
+
+    Returns:
+        int: The estimated tokens.
+    """
+    payload = request.get("messages", request.get("input"))
+    size = len(json.dumps(payload, default=str)) if payload is not None else 0
+    return size // 4 + 1 + (request.get("max_tokens") or 0)
+
+
+def _usage_tokens(response) -> int:
+    """
+    Returns the total tokens reported by a response, 0 if unknown.
+    """
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", 0) or 0
+
+
+def _plan_embeddings(texts: List[str], store, batch_size: int) -> Tuple[List[str], List[str], List[List[str]]]:
+    """
+    Deduplicates texts by hash and leaves out the ones already in store.
+
+    Returns:
+        tuple: The key of every text, the keys to embed and the texts to embed, in batches.
+    """
+    from vector_store import text_hash
+
+    keys = [text_hash(text) for text in texts]
+    unique = dict(zip(keys, texts))
+    known = store.rows(unique) if store is not None else {}
+    missing = [key for key in unique if key not in known]
+    batches = [[unique[key] for key in missing[i:i + batch_size]] for i in range(0, len(missing), batch_size)]
+    return keys, missing, batches
+
+
+def _assemble_embeddings(keys: List[str], missing: List[str], rows: List[List[float]], store) -> "np.ndarray":
+    """
+    Stores the new vectors and returns the vectors of keys, in order.
+    """
+    import numpy as np
+
+    vectors = np.asarray(rows, dtype=np.float32).reshape(len(missing), -1) if missing else None
+    if store is not None:
+        if missing:
+            store.add(missing, vectors)
+        return store.get(keys) if keys else np.zeros((0, store.dimensions or 0), dtype=np.float32)
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    position = {key: i for i, key in enumerate(missing)}
+    return vectors[[position[key] for key in keys]]
+
+
+def replay_deltas(completion, on_delta: Callable[[str], None]):
+    """
+    Feeds the content of a complete response to on_delta word by word, for
+    responses that were not streamed (cache hits, non-streaming providers).
+
+    Args:
+        completion: The ChatCompletion.
+        on_delta (Callable): Receives each fragment of the content.
+    """
+    content = completion.choices[0].message.content or ""
+    start = 0
+    for end in range(1, len(content) + 1):
+        if end == len(content) or (content[end - 1].isspace() and not content[end].isspace()):
+            on_delta(content[start:end])
+            start = end
+
+
+class StreamAccumulator:
+    """
+    Rebuilds the ChatCompletion of a streamed text response, chunk by chunk,
+    passing every content fragment to on_delta on the way.
+
+    Attributes:
+        on_delta (Callable): Receives each fragment of the content.
+        model (str): The model to report if the chunks carry none.
+    """
+    def __init__(self, on_delta: Callable[[str], None], model: str = None):
+        self.on_delta = on_delta
+        self.model = model
+        self.parts = []
+        self.usage = None
+        self.finish_reason = "stop"
+        self.id = "stream"
+        self.created = int(time.time())
+
+    def add(self, chunk):
+        """
+        Consumes one ChatCompletionChunk.
+        """
+        self.id = chunk.id or self.id
+        self.created = chunk.created or self.created
+        self.model = chunk.model or self.model
+        if chunk.usage is not None:
+            self.usage = chunk.usage.model_dump()
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        if choice.delta.content:
+            self.parts.append(choice.delta.content)
+            self.on_delta(choice.delta.content)
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+
+    def completion(self) -> "ChatCompletion":
+        """
+        Returns the assembled completion, with usage when the server sent it.
+        """
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate({
+            "id": self.id,
+            "object": "chat.completion",
+            "created": self.created,
+            "model": self.model or "unknown",
+            "choices": [{
+                "index": 0,
+                "finish_reason": self.finish_reason,
+                "message": {"role": "assistant", "content": "".join(self.parts)},
+            }],
+            "usage": self.usage,
+        })
+
+
+class LLMProvider:
+    """
+    Interface of the LLM backends used by Supervisor, ToolResponseHandler and
+    ToolInputHandler. gptText must return a ChatCompletion-shaped object.
+
+    Attributes:
+        model (str): The chat model used by gptText.
+        embedding_model (str): The model used by embeddings.
+        dimensions (Optional[int]): The embedding size requested, if configurable.
+    """
+    model = None
+    embedding_model = None
+    dimensions = None
+
+    def embeddings(self, text: str, use_cache: bool = True) -> list:
+        """
+        Retrieves embeddings for the given text.
+        This method should be overridden by subclasses.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+    def embed_many(self, texts: List[str], batch_size: int = 256, max_workers: int = 4,
+                   store: "EmbeddingStore" = None) -> "np.ndarray":
+        """
+        Embeds many texts: duplicates are embedded once, texts already in store
+        are not embedded again, and the rest is sent in batches of batch_size
+        with up to max_workers requests in flight.
+
+        Args:
+            texts (List[str]): The texts.
+            batch_size (int): Number of texts per request.
+            max_workers (int): Number of concurrent requests.
+            store (EmbeddingStore): Optional persistent store, read and extended.
+
+        Returns:
+            np.ndarray: The (len(texts), dimensions) float32 vectors, in input order.
+        """
+        keys, missing, batches = _plan_embeddings(texts, store, batch_size)
+        rows = []
+        if len(batches) == 1:
+            rows = self._embed_batch(batches[0])
+        elif batches:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, self._embed_batch, batch) for batch in batches]
+                rows = [vector for future in futures for vector in future.result()]
+        return _assemble_embeddings(keys, missing, rows, store)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds one batch. Providers with a batch endpoint override this.
+        """
+        return [self.embeddings(text) for text in texts]
+
+    def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                on_delta: Callable[[str], None] = None):
+        """
+        Returns a chat completion for the given conversation. When on_delta is
+        given, text responses are also passed to it fragment by fragment as
+        they are generated.
+        This method should be overridden by subclasses.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+
+class AsyncLLMProvider:
+    """
+    Interface of the asynchronous LLM backends used by AsyncSupervisor.
+    Methods mirror LLMProvider but are coroutines.
+    """
+    model = None
+    embedding_model = None
+    dimensions = None
+
+    async def embeddings(self, text: str, use_cache: bool = True) -> list:
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+    async def embed_many(self, texts: List[str], batch_size: int = 256, max_workers: int = 4,
+                         store: "EmbeddingStore" = None) -> "np.ndarray":
+        """
+        Embeds many texts, as LLMProvider.embed_many.
+        """
+        keys, missing, batches = _plan_embeddings(texts, store, batch_size)
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def embed(batch):
+            async with semaphore:
+                return await self._embed_batch(batch)
+
+        results = await asyncio.gather(*(embed(batch) for batch in batches))
+        return _assemble_embeddings(keys, missing, [vector for batch in results for vector in batch], store)
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [await self.embeddings(text) for text in texts]
+
+    async def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                      on_delta: Callable[[str], None] = None):
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+
+class _LazyClient:
+    """
+    Creates the OpenAI client, and reads the API key, on first use rather
+    than at construction, so building providers is free until they are called.
+    """
+    _client_class = "OpenAI"
+
+    def _init_client(self, api_key: Optional[str], base_url: Optional[str], timeout: Optional[float]):
         self.api_key = api_key
-        self.client = OpenAI(api_key = self.api_key)
+        self._client_options = {"base_url": base_url, "timeout": timeout}
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import openai
+                    if self.api_key is None:
+                        self.api_key = read_api_key()
+                    timeout = self._client_options["timeout"]
+                    # Retries are handled by the policy, which shares the quota with the other providers
+                    self._client = getattr(openai, self._client_class)(
+                        api_key=self.api_key, base_url=self._client_options["base_url"], max_retries=0,
+                        **({"timeout": timeout} if timeout is not None else {}))
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
 
-    def embeddings(self, text: str) -> list:
+class openaiApis(_LazyClient, LLMProvider):
+    def __init__(self, api_key: str = None, model: str = "gpt-4o", embedding_model: str = "text-embedding-3-large",
+                 base_url: str = None, max_tokens: int = 3000, cache: CacheBackend = None, dimensions: Optional[int] = 3072,
+                 retry: RetryPolicy = None, timeout: Optional[float] = None):
+        """
+        Args:
+            api_key (str): The API key. When omitted it is read on first use from the
+                settings, see config.Settings.
+            model (str): The chat model.
+            embedding_model (str): The embedding model.
+            base_url (str): Optional endpoint URL, for proxies or compatible servers.
+            max_tokens (int): Maximum completion tokens for text responses.
+            cache (CacheBackend): Optional response cache, e.g. a TieredCache.
+                Identical requests are then answered from the cache.
+            dimensions (Optional[int]): Size of the embeddings; smaller vectors trade
+                some accuracy for space and speed. None lets the model decide.
+            retry (RetryPolicy): Rate limits, backoff and circuit breaker of the requests;
+                by default a policy of its own under the process-wide shared_limiter.
+            timeout (Optional[float]): Request timeout, in seconds; None keeps the client default.
+        """
+        self._init_client(api_key, base_url, timeout)
+        self.model = model
+        self.embedding_model = embedding_model
+        self.dimensions = dimensions
+        self.base_url = base_url
+        self.max_tokens = max_tokens
+        self.retry = retry or RetryPolicy()
+        self.cache = cache
+
+    def embeddings(self, text: str, use_cache: bool = True) -> list:
         """
         Retrieves embeddings for the given text using the specified OpenAI client.
     
         Args:
             text (str): The input text for which embeddings are to be retrieved.
+            use_cache (bool): Set to False to bypass the response cache for this call.
     
         Returns:
             list: A list containing the embeddings for the input text.
         """
-    
-        response = self.client.embeddings.create(
-            input=text,
-            model="text-embedding-3-large",
-            dimensions=3072
-        )
+        request = embedding_kwargs(text, self.embedding_model, self.dimensions)
+        key = request_key("embeddings", request)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached["embedding"]
+
+        response = self.retry.call(lambda: self.client.embeddings.create(**request), request_tokens(request), _usage_tokens)
         embeddings = response.data[0].embedding
+
+        if self.cache is not None and use_cache:
+            self.cache.set(key, {"embedding": embeddings})
         return embeddings
 
-    def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text") -> str:
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a batch of texts in a single request.
+        """
+        request = embedding_kwargs(texts, self.embedding_model, self.dimensions)
+        response = self.retry.call(lambda: self.client.embeddings.create(**request), request_tokens(request), _usage_tokens)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                on_delta: Callable[[str], None] = None) -> str:
         """
         Builds a response using the specified OpenAI client and parameters.
     
         Args:
             system (str): The system message to include in the conversation.
             text (str): The user's input text.
-            format_ (str): The format of the response. Possible values are "json" or anything else for default.
+            format_ (Union[str, dict]): The format of the response, see completion_kwargs.
+            use_cache (bool): Set to False to bypass the response cache for this call.
+            on_delta (Callable): Receives the text fragments as they are generated.
+                Requests with tools are not streamed; their content is passed once complete.
     
         Returns:
-            tuple: A tuple containing the response message and the total tokens used.
+            ChatCompletion: The completion, either fresh or rebuilt from the cache.
         """
         
-        messages = [
-            {"role": "system", "content": system},
-        ]
-        
-        if question:
-            user = [{"role": "user", "content": question}]
-            messages = messages + user
-            
-        if message:
-            messages = messages + message
-        
-        if _format == "json":
-            completion = self.client.chat.completions.create(
-                model="gpt-4o",# "gpt-3.5-turbo-1106" 
-                response_format={"type": "json_object"},
-                messages=messages,
-                tools=tools,
-                tool_choice=tool_choice
-            )
+        messages = build_messages(system, question, message)
+        request = completion_kwargs(messages, tools, tool_choice, _format, self.model, self.max_tokens)
+        key = request_key("chat", request)
+        check_budget()
+        start = time.perf_counter()
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                from openai.types.chat import ChatCompletion
+                completion = ChatCompletion.model_validate(cached)
+                record_completion(completion, time.perf_counter() - start, cached=True)
+                if on_delta is not None:
+                    replay_deltas(completion, on_delta)
+                return completion
+
+        if on_delta is not None and not tools:
+            stream = StreamAccumulator(on_delta, self.model)
+            tokens = request_tokens(request)
+            chunks = self.retry.call(
+                lambda: self.client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True}),
+                tokens)
+            for chunk in chunks:
+                stream.add(chunk)
+            completion = stream.completion()
+            self.retry.limiter.settle(tokens, _usage_tokens(completion))
         else:
-            completion = self.client.chat.completions.create(
-                model="gpt-4o",# "gpt-3.5-turbo-1106"
-                messages=messages,
-                max_tokens=3000,
-                tools=tools,
-                tool_choice=tool_choice
-            )
+            completion = self.retry.call(lambda: self.client.chat.completions.create(**request),
+                                         request_tokens(request), _usage_tokens)
+            if on_delta is not None:
+                replay_deltas(completion, on_delta)
+        record_completion(completion, time.perf_counter() - start)
 
+        if self.cache is not None and use_cache:
+            self.cache.set(key, completion.model_dump(mode="json"))
         return completion#.choices[0].message.content
 
 
-    
\ No newline at end of file
+class localOpenaiApis(openaiApis):
+    """
+    Provider for any OpenAI-compatible HTTP endpoint, such as a self-hosted
+    vLLM, llama.cpp or Ollama server, or a local stand-in server for offline
+    throughput tests.
+    """
+    def __init__(self, base_url: str, model: str, api_key: str = "not-needed",
+                 embedding_model: str = None, max_tokens: int = 3000, cache: CacheBackend = None,
+                 dimensions: Optional[int] = None, retry: RetryPolicy = None, timeout: Optional[float] = None):
+        """
+        Args:
+            base_url (str): The endpoint URL, e.g. "http://localhost:8000/v1".
+            model (str): The model name served by the endpoint.
+            api_key (str): The key expected by the endpoint, if any.
+            embedding_model (str): The embedding model served by the endpoint; model by default, as
+                servers such as vLLM or Ollama embed with the model they serve.
+            max_tokens (int): Maximum completion tokens for text responses.
+            cache (CacheBackend): Optional response cache.
+            dimensions (Optional[int]): Size of the embeddings, if the endpoint supports choosing it.
+            retry (RetryPolicy): Rate limits, backoff and circuit breaker of the requests.
+            timeout (Optional[float]): Request timeout, in seconds.
+        """
+        super().__init__(api_key=api_key, model=model, embedding_model=embedding_model or model,
+                         base_url=base_url, max_tokens=max_tokens, cache=cache, dimensions=dimensions,
+                         retry=retry, timeout=timeout)
+
+
+class asyncOpenaiApis(_LazyClient, AsyncLLMProvider):
+    """
+    Asynchronous counterpart of openaiApis, backed by the AsyncOpenAI client.
+
+    Many coroutines can share one instance, so a single event loop can drive
+    hundreds of conversations while they wait on the network.
+    """
+    _client_class = "AsyncOpenAI"
+
+    def __init__(self, api_key: str = None, model: str = "gpt-4o", embedding_model: str = "text-embedding-3-large",
+                 base_url: str = None, max_tokens: int = 3000, cache: CacheBackend = None, dimensions: Optional[int] = 3072,
+                 retry: RetryPolicy = None, timeout: Optional[float] = None):
+        self._init_client(api_key, base_url, timeout)
+        self.model = model
+        self.embedding_model = embedding_model
+        self.dimensions = dimensions
+        self.base_url = base_url
+        self.max_tokens = max_tokens
+        self.retry = retry or RetryPolicy()
+        self.cache = cache
+
+    async def embeddings(self, text: str, use_cache: bool = True) -> list:
+        """
+        Retrieves embeddings for the given text.
+
+        Args:
+            text (str): The input text for which embeddings are to be retrieved.
+            use_cache (bool): Set to False to bypass the response cache for this call.
+
+        Returns:
+            list: A list containing the embeddings for the input text.
+        """
+        request = embedding_kwargs(text, self.embedding_model, self.dimensions)
+        key = request_key("embeddings", request)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached["embedding"]
+
+        response = await self.retry.acall(lambda: self.client.embeddings.create(**request), request_tokens(request), _usage_tokens)
+        embeddings = response.data[0].embedding
+
+        if self.cache is not None and use_cache:
+            self.cache.set(key, {"embedding": embeddings})
+        return embeddings
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a batch of texts in a single request.
+        """
+        request = embedding_kwargs(texts, self.embedding_model, self.dimensions)
+        response = await self.retry.acall(lambda: self.client.embeddings.create(**request), request_tokens(request), _usage_tokens)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                      on_delta: Callable[[str], None] = None):
+        """
+        Builds a response with the same parameters as openaiApis.gptText.
+
+        Returns:
+            ChatCompletion: The completion, either fresh or rebuilt from the cache.
+        """
+        messages = build_messages(system, question, message)
+        request = completion_kwargs(messages, tools, tool_choice, _format, self.model, self.max_tokens)
+        key = request_key("chat", request)
+        check_budget()
+        start = time.perf_counter()
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                from openai.types.chat import ChatCompletion
+                completion = ChatCompletion.model_validate(cached)
+                record_completion(completion, time.perf_counter() - start, cached=True)
+                if on_delta is not None:
+                    replay_deltas(completion, on_delta)
+                return completion
+
+        if on_delta is not None and not tools:
+            stream = StreamAccumulator(on_delta, self.model)
+            tokens = request_tokens(request)
+            chunks = await self.retry.acall(
+                lambda: self.client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True}),
+                tokens)
+            async for chunk in chunks:
+                stream.add(chunk)
+            completion = stream.completion()
+            self.retry.limiter.settle(tokens, _usage_tokens(completion))
+        else:
+            completion = await self.retry.acall(lambda: self.client.chat.completions.create(**request),
+                                                request_tokens(request), _usage_tokens)
+            if on_delta is not None:
+                replay_deltas(completion, on_delta)
+        record_completion(completion, time.perf_counter() - start)
+
+        if self.cache is not None and use_cache:
+            self.cache.set(key, completion.model_dump(mode="json"))
+        return completion
+
+
+class asyncLocalOpenaiApis(asyncOpenaiApis):
+    """
+    Asynchronous provider for any OpenAI-compatible HTTP endpoint, see localOpenaiApis.
+    """
+    def __init__(self, base_url: str, model: str, api_key: str = "not-needed",
+                 embedding_model: str = None, max_tokens: int = 3000, cache: CacheBackend = None,
+                 dimensions: Optional[int] = None, retry: RetryPolicy = None, timeout: Optional[float] = None):
+        super().__init__(api_key=api_key, model=model, embedding_model=embedding_model or model,
+                         base_url=base_url, max_tokens=max_tokens, cache=cache, dimensions=dimensions,
+                         retry=retry, timeout=timeout)
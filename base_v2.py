@@ -10,6 +10,13 @@ from agents import Agent
 from supervisor_v2 import Supervisor
 from baseLLM import openaiApis
 from basetool import CustomTool
+from retrieval import DocumentIndex
+from config import configure_logging
+
+configure_logging("/Users/andreadesogus/Downloads/TeamWork/", level="DEBUG")
+
+# Inizializzazione dell'API di OpenAI
+ai = openaiApis()
 
 def info_retriever(filepath: str):
     """
@@ -21,7 +28,8 @@ def info_retriever(filepath: str):
         file = f.read()
     return file
 
-info_retriever_tool = CustomTool(info_retriever)
+# Reading a file is pure: the result is reused until the file changes
+info_retriever_tool = CustomTool(info_retriever, cacheable=True, file_params=["filepath"])
 
 
 def info_downloader(destination_path: str, content: str):
@@ -36,6 +44,9 @@ def info_downloader(destination_path: str, content: str):
 
 info_downloader_tool = CustomTool(info_downloader)
 
+# Ricerca dei passaggi rilevanti del contratto, invece della lettura dell'intero file
+contract_search_tool = DocumentIndex(ai, "/Users/andreadesogus/Downloads/TeamWork/index").as_tool(k=5)
+
 # Definizione delle caratteristiche del primo agente
 agent1_f = {
     'agent_role': 'Senior Clause Precence Verifier',
@@ -45,8 +56,9 @@ agent1_f = {
                   "identify and verify the presence of fallback clauses related to "
                   "the cessation of benchmark indices, ensuring that every contract "
                   "is thoroughly vetted for compliance and risk mitigation."),
-    'tools': [info_retriever_tool],
-    'resources': 'Percorso per il file: /Users/andreadesogus/Downloads/contratto.txt',
+    'tools': [contract_search_tool],
+    'resources': ('Contratto da interrogare con document_search, passando il percorso e cosa cercare: '
+                  '/Users/andreadesogus/Downloads/contratto.txt'),
     'context': [],
     'task_description': 'Verify the precence of a fallback clause following the termination of a benchmark index.',
     'expected_output': 'ONLY the fallback clause '
@@ -92,14 +104,11 @@ agent3_f = {
 # Creazione dell'istanza del secondo agente
 agent3 = Agent(agent3_f)
 
-# Inizializzazione dell'API di OpenAI
-ai = openaiApis()
-
 # Creazione dell'istanza del supervisore con i due agenti
 supervisor = Supervisor([agent1, agent2, agent3], ai)
 
 # Formulazione della domanda per la traduzione
-question = f"Puoi verificare la presenza e la robustezza della clausola di fallback?"
+question = "Puoi verificare la presenza e la robustezza della clausola di fallback?"
 
 # Esecuzione del processo di supervisione per ottenere la traduzione
 response = supervisor.execution(question)
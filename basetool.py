@@ -10,10 +10,16 @@ import inspect
 import logging
 import json
 import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable, List, Union, Dict, Optional, get_type_hints
 from error_handling import ToolInputHandler
-
-logging.basicConfig(level=logging.INFO)
+from events import emit, ToolCallStartedEvent, ToolCallFinishedEvent
+from tool_cache import ToolResultCache, tool_cache
+from rate_limit import default_backoff
+from run_log import log_event
+from tracing import span
 
 # Definizione della classe base (stub)
 class BaseTool:
@@ -38,18 +44,30 @@ class CustomTool(BaseTool):
     Attributes:
         func (Callable): The function to be wrapped and executed.
         details (Dict[str, Union[str, List[str]]]): Metadata details of the function.
+        cacheable (bool): Whether the function is pure, i.e. its result only depends
+            on its arguments (and on the files named by file_params), so it can be memoized.
+        file_params (List[str]): The parameters holding paths of files the function reads.
+        cache (ToolResultCache): The cache of the results, when cacheable.
     """
-    def __init__(self, func: Callable):
+    def __init__(self, func: Callable, cacheable: bool = False, file_params: List[str] = None,
+                 cache: ToolResultCache = None):
         """
         Initializes a CustomTool instance by extracting function details and setting up the base tool attributes.
 
         Args:
             func (Callable): The function to be wrapped and executed.
+            cacheable (bool): Memoize the results, e.g. for file readers, database lookups or HTTP fetches.
+            file_params (List[str]): Parameters holding file paths; a cached result is
+                discarded when the path, modification time or size of one of the files changes.
+            cache (ToolResultCache): The cache to use; defaults to the process-wide tool_cache.
         """
         if not callable(func):
             raise TypeError("The provided argument must be a callable (function).")
 
         self.func = func
+        self.cacheable = cacheable
+        self.file_params = file_params or []
+        self.cache = (cache or tool_cache) if cacheable else None
         func_details = self._extract_function_details()
 
         # Initialize the base class with the extracted function details
@@ -61,7 +79,7 @@ class CustomTool(BaseTool):
             param_description=func_details["param_descriptions"]
         )
         self.details = func_details
-        logging.info(f"CustomTool for function '{self.func.__name__}' initialized successfully with details: {self.details}")
+        log_event("tool_registered", level=logging.DEBUG, tool=self.name, payload={"details": self.details})
 
     def _extract_function_details(self) -> Dict[str, Union[str, List[str], List[Optional[type]]]]:
         """
@@ -134,9 +152,7 @@ class CustomTool(BaseTool):
             Any: The result of the function execution.
         """
         try:
-            result = self.func(*args, **kwargs)
-            logging.info(f"Function '{self.func.__name__}' executed successfully.")
-            return result
+            return self.func(*args, **kwargs)
         except Exception as e:
             logging.error(f"Error executing function '{self.func.__name__}': {e}")
             raise
@@ -166,6 +182,7 @@ class OpenaiFunctionCalling:
             tools (List[CustomTool]): List of CustomTool instances.
         """
         self.tools = tools
+        self._definitions = None
 
     def map_param_type(self, param_type: type) -> str:
         """
@@ -191,10 +208,17 @@ class OpenaiFunctionCalling:
     def generate_function_definitions(self) -> List[Dict[str, Union[str, Dict[str, Union[str, Dict[str, Dict[str, List[str]]]]]]]]:
         """
         Generates function definitions for the provided tools.
+        The definitions are compiled on the first call and shared afterwards,
+        so callers must not mutate them.
 
         Returns:
             List[Dict[str, Union[str, Dict[str, Union[str, Dict[str, Dict[str, List[str]]]]]]]]: List of function definitions.
         """
+        if self._definitions is None:
+            self._definitions = self._build_function_definitions()
+        return self._definitions
+
+    def _build_function_definitions(self) -> List[Dict]:
         function_definitions = []
 
         for tool in self.tools:
@@ -230,25 +254,32 @@ class ToolResponseHandler:
     Attributes:
         response (object): The response object from the OpenAI API.
         agent (object): The agent object containing the tools.
-        ai (object): The OpenAI API client instance.
+        ai (LLMProvider): The LLM provider, used to repair failing tool inputs.
+        max_workers (int): Maximum number of tool calls of one response run concurrently.
     """
-    def __init__(self, response, agent, ai):
+    def __init__(self, response, agent, ai, max_workers: int = 4):
         """
         Initializes the ToolResponseHandler with necessary attributes.
 
         Args:
             response (object): The response object from the OpenAI API.
             agent (object): The agent object containing the tools.
-            ai (object): The OpenAI API client instance.
+            ai (LLMProvider): The LLM provider, used to repair failing tool inputs.
+            max_workers (int): Maximum number of tool calls of one response run concurrently.
         """
         self.response = response
         self.agent = agent
         self.ai = ai
+        self.max_workers = max_workers
 
     def process_tool_response(self) -> List[Dict[str, Union[str, Dict[str, Union[str, Dict[str, Union[str, str]]]]]]]:
         """
         Process the tool response from the OpenAI API.
 
+        The tool calls of the response are independent, so they run
+        concurrently; their results are appended in the order of the
+        response's tool_call_ids whatever order they finish in.
+
         Returns:
             List[Dict[str, Union[str, Dict[str, Union[str, Dict[str, Union[str, str]]]]]]]: A list of messages including the function call responses.
         """
@@ -256,33 +287,101 @@ class ToolResponseHandler:
         tool_calls = response_message.tool_calls
         
         if tool_calls:
-            available_functions = {tool.name: tool.func for tool in self.agent.tools}
+            available_tools = {tool.name: tool for tool in self.agent.tools}
 
             message = [response_message]  # Extend conversation with assistant's reply
 
-            # Iterate through each tool call in the response and execute corresponding function dynamically
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions.get(function_name)
+            if len(tool_calls) == 1 or self.max_workers <= 1:
+                results = [self._run_tool_call(tool_call, available_tools) for tool_call in tool_calls]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tool_calls))) as executor:
+                    # Each worker runs in a copy of the caller's context, to keep usage accounting and events per run
+                    futures = [executor.submit(contextvars.copy_context().run, self._run_tool_call, tool_call, available_tools)
+                               for tool_call in tool_calls]
+                    results = [future.result() for future in futures]
 
-                if function_to_call:
-                    function_args = json.loads(tool_call.function.arguments)
-                    function_response = self.call_function_dynamically(function_to_call, function_args)
-                else:
-                    function_response = f"Function '{function_name}' not found in available tools."
+            message.extend(results)  # Extend conversation with function responses
+            return message
 
-                message.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": function_response if function_response is not None else "",
-                })  # Extend conversation with function response
+    def _run_tool_call(self, tool_call, available_tools: Dict[str, BaseTool]) -> Dict[str, str]:
+        """
+        Executes a single tool call.
 
-            return message
+        Args:
+            tool_call (object): The tool call requested by the model.
+            available_tools (dict): The agent's tools, by name.
+
+        Returns:
+            Dict[str, str]: The tool message.
+        """
+        function_name = tool_call.function.name
+        tool = available_tools.get(function_name)
+
+        if tool:
+            function_args = json.loads(tool_call.function.arguments)
+            with span("tool_call", tool=function_name) as tool_span:
+                start = self._tool_started(tool_call, function_args)
+                cache = getattr(tool, "cache", None)
+                cached, function_response = cache.lookup(tool, function_args) if cache else (False, None)
+                tool_span.set(cached=cached)
+                if not cached:
+                    fingerprints = cache.fingerprints(tool, function_args) if cache else None
+                    try:
+                        function_response = self.call_function_dynamically(tool.func, function_args, tool=tool)
+                    except Exception as e:
+                        self._tool_finished(tool_call, start, e)
+                        raise
+                    if cache:
+                        cache.store(tool, function_args, function_response, fingerprints)
+                self._tool_finished(tool_call, start, cached=cached)
+        else:
+            function_response = f"Function '{function_name}' not found in available tools."
+
+        return self._tool_message(tool_call, function_response)
+
+    def _tool_started(self, tool_call, function_args: Dict) -> float:
+        """
+        Emits the ToolCallStartedEvent of a tool call.
+
+        Returns:
+            float: The start time, to pass to _tool_finished.
+        """
+        emit(ToolCallStartedEvent(agent_role=self.agent.agent_role, tool_name=tool_call.function.name,
+                                  tool_call_id=tool_call.id, arguments=function_args))
+        return time.perf_counter()
+
+    def _tool_finished(self, tool_call, start: float, error: Exception = None, cached: bool = False):
+        """
+        Emits the ToolCallFinishedEvent of a tool call.
+        """
+        duration = time.perf_counter() - start
+        emit(ToolCallFinishedEvent(agent_role=self.agent.agent_role, tool_name=tool_call.function.name,
+                                   tool_call_id=tool_call.id, duration=duration,
+                                   error=str(error) if error is not None else None, cached=cached))
+        log_event("tool_finished", tool=tool_call.function.name, duration=round(duration, 4), cached=cached,
+                  error=str(error) if error is not None else None)
+
+    def _tool_message(self, tool_call, function_response) -> Dict[str, str]:
+        """
+        Builds the tool message returned to the model for a single tool call.
+
+        Args:
+            tool_call (object): The tool call requested by the model.
+            function_response: The result of the function call.
+
+        Returns:
+            Dict[str, str]: The tool message.
+        """
+        return {
+            "tool_call_id": tool_call.id,
+            "role": "tool",
+            "name": tool_call.function.name,
+            "content": function_response if function_response is not None else "",
+        }
 
     def call_function_dynamically(self, function_to_call: Callable[..., Union[str, int, float, dict, list, None]], 
                                   function_args: Dict[str, Union[str, int, float, bool, dict, list, None]], 
-                                  retries: int = 3) -> Union[str, int, float, dict, list, None]:
+                                  retries: int = 3, tool: BaseTool = None) -> Union[str, int, float, dict, list, None]:
         """
         Dynamically call a function with retry logic.
     
@@ -290,6 +389,8 @@ class ToolResponseHandler:
             function_to_call (Callable[..., Union[str, int, float, dict, list, None]]): The function to call.
             function_args (Dict[str, Union[str, int, float, bool, dict, list, None]]): The arguments for the function.
             retries (int, optional): Number of retry attempts. Default is 3.
+            tool (BaseTool, optional): The tool wrapping the function, reused for input repair
+                instead of introspecting the function again.
     
         Returns:
             Union[str, int, float, dict, list, None]: The result of the function call, or None if all retries fail.
@@ -303,28 +404,131 @@ class ToolResponseHandler:
     
         while attempt < retries:
             try:
-                # print("\n\n\n\n\n---------")
-                # print(str(combined_args))
-                # print("---------\n\n\n\n\n")
                 return function_to_call(**combined_args)
-            except FileNotFoundError as e:
-                print(f"Attempt {attempt + 1} failed (FileNotFoundError): {e}")
-                last_exception = e
-            except TypeError as e:
-                print(f"Attempt {attempt + 1} failed (TypeError): {e}")
-                last_exception = e
             except Exception as e:
-                print(f"Attempt {attempt + 1} failed (Exception): {e}")
+                log_event("tool_attempt_failed", level=logging.WARNING, tool=function_to_call.__name__,
+                          attempt=attempt + 1, error=f"{type(e).__name__}: {e}")
                 last_exception = e
-            
-            solver = ToolInputHandler()
-            combined_args = solver.solve(self.agent, CustomTool(function_to_call), self.ai)
+
             attempt += 1
-            time.sleep(1)  # Wait for a second before retrying
+            if attempt < retries:
+                # Repair the inputs only when another attempt will use them
+                solver = ToolInputHandler()
+                with span("tool_input_repair", tool=function_to_call.__name__, attempt=attempt) as repair_span:
+                    repaired = solver.solve(self.agent, tool or CustomTool(function_to_call), self.ai, last_exception)
+                    repair_span.set(repaired=repaired is not None)
+                if repaired is not None:
+                    combined_args = repaired
+                time.sleep(default_backoff.delay(attempt - 1))  # Back off before retrying
     
         # If all retries fail, re-raise the last exception
         if last_exception:
             raise last_exception
     
         # Return None if all retries fail
-        return None
\ No newline at end of file
+        return None
+
+
+class AsyncToolResponseHandler(ToolResponseHandler):
+    """
+    Asynchronous counterpart of ToolResponseHandler, for use with an AsyncLLMProvider.
+
+    Tool functions are blocking, so they run in a worker thread to keep the
+    event loop free; input repair goes through ToolInputHandler.asolve.
+    """
+    async def process_tool_response(self) -> List[Dict[str, Union[str, Dict[str, Union[str, Dict[str, Union[str, str]]]]]]]:
+        """
+        Process the tool response from the OpenAI API, running the tool calls
+        concurrently and appending their results in tool_call_id order.
+
+        Returns:
+            List[Dict]: A list of messages including the function call responses.
+        """
+        response_message = self.response.choices[0].message
+        tool_calls = response_message.tool_calls
+
+        if tool_calls:
+            available_tools = {tool.name: tool for tool in self.agent.tools}
+            semaphore = asyncio.Semaphore(max(self.max_workers, 1))
+
+            async def run(tool_call):
+                async with semaphore:
+                    return await self._run_tool_call(tool_call, available_tools)
+
+            message = [response_message]  # Extend conversation with assistant's reply
+            message.extend(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
+            return message
+
+    async def _run_tool_call(self, tool_call, available_tools: Dict[str, BaseTool]) -> Dict[str, str]:
+        """
+        Executes a single tool call, see ToolResponseHandler._run_tool_call.
+        """
+        function_name = tool_call.function.name
+        tool = available_tools.get(function_name)
+
+        if tool:
+            function_args = json.loads(tool_call.function.arguments)
+            with span("tool_call", tool=function_name) as tool_span:
+                start = self._tool_started(tool_call, function_args)
+                cache = getattr(tool, "cache", None)
+                cached, function_response = cache.lookup(tool, function_args) if cache else (False, None)
+                tool_span.set(cached=cached)
+                if not cached:
+                    fingerprints = cache.fingerprints(tool, function_args) if cache else None
+                    try:
+                        function_response = await self.call_function_dynamically(tool.func, function_args, tool=tool)
+                    except Exception as e:
+                        self._tool_finished(tool_call, start, e)
+                        raise
+                    if cache:
+                        cache.store(tool, function_args, function_response, fingerprints)
+                self._tool_finished(tool_call, start, cached=cached)
+        else:
+            function_response = f"Function '{function_name}' not found in available tools."
+
+        return self._tool_message(tool_call, function_response)
+
+    async def call_function_dynamically(self, function_to_call: Callable[..., Union[str, int, float, dict, list, None]],
+                                        function_args: Dict[str, Union[str, int, float, bool, dict, list, None]],
+                                        retries: int = 3, tool: BaseTool = None) -> Union[str, int, float, dict, list, None]:
+        """
+        Dynamically call a function with retry logic, without blocking the event loop.
+
+        Args:
+            function_to_call (Callable): The function to call.
+            function_args (Dict): The arguments for the function.
+            retries (int, optional): Number of retry attempts. Default is 3.
+            tool (BaseTool, optional): The tool wrapping the function, reused for input repair.
+
+        Returns:
+            Union[str, int, float, dict, list, None]: The result of the function call.
+
+        Raises:
+            Exception: Re-raises the last exception if all retries fail.
+        """
+        combined_args = {**function_args}
+        attempt = 0
+        last_exception = None
+
+        while attempt < retries:
+            try:
+                return await asyncio.to_thread(function_to_call, **combined_args)
+            except Exception as e:
+                log_event("tool_attempt_failed", level=logging.WARNING, tool=function_to_call.__name__,
+                          attempt=attempt + 1, error=f"{type(e).__name__}: {e}")
+                last_exception = e
+
+            attempt += 1
+            if attempt < retries:
+                solver = ToolInputHandler()
+                with span("tool_input_repair", tool=function_to_call.__name__, attempt=attempt) as repair_span:
+                    repaired = await solver.asolve(self.agent, tool or CustomTool(function_to_call), self.ai, last_exception)
+                    repair_span.set(repaired=repaired is not None)
+                if repaired is not None:
+                    combined_args = repaired
+                await asyncio.sleep(default_backoff.delay(attempt - 1))  # Back off before retrying
+
+        if last_exception:
+            raise last_exception
+
+        return None
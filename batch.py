@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Batch runner: one supervision per input over a whole corpus, with
+concurrency, resumable checkpoints and a streamed JSONL output.
+
+Example:
+    python batch.py --inputs contracts/ --output results.jsonl \
+        --team my_teams:make_supervisor --workers 8 --backend process \
+        --template "Can you verify the presence and robustness of the fallback clause in {path}?"
+
+Author: andreadesogus
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from pydantic import BaseModel
+
+from config import configure_logging
+from prompt_cache import content_hash
+
+
+class BatchItem(BaseModel):
+    """
+    One supervision of the batch.
+
+    Attributes:
+        id (str): Unique identifier, used to resume: the file path for files, a hash of the
+            question for questions. Callers with ids of their own build the items directly.
+        question (str): The question asked to the supervisor.
+    """
+    id: str
+    question: str
+
+
+def load_items(inputs: Union[str, Iterable[str]], template: str = "{text}") -> List[BatchItem]:
+    """
+    Builds the batch items.
+
+    Args:
+        inputs: A directory, whose files are the items (sorted by name), or a
+            list of questions or file paths.
+        template (str): The question of each item, formatted with {path},
+            {name} and {text} (the file content) for files, {text} for questions.
+
+    Returns:
+        list: The items. A question repeated in inputs is a single item.
+    """
+    if isinstance(inputs, str):
+        if not os.path.isdir(inputs):
+            raise ValueError(f"{inputs} is not a directory")
+        inputs = [os.path.join(inputs, name) for name in sorted(os.listdir(inputs))
+                  if os.path.isfile(os.path.join(inputs, name)) and not name.startswith(".")]
+
+    items, ids = [], set()
+    for entry in inputs:
+        if os.path.isfile(entry):
+            path = os.path.abspath(entry)
+            text = ""
+            if "{text}" in template:
+                # The content is only read when the template uses it
+                with open(path, "r") as f:
+                    text = f.read()
+            question = template.format(path=path, name=os.path.basename(path), text=text)
+            item = BatchItem(id=path, question=question)
+        else:
+            # Derived from the question, not its position, so that resuming survives edits of the inputs
+            question = template.format(path="", name="", text=entry)
+            item = BatchItem(id=content_hash(question)[:16], question=question)
+        if item.id not in ids:
+            ids.add(item.id)
+            items.append(item)
+    return items
+
+
+def resolve_factory(factory: Union[str, Callable]) -> Callable:
+    """
+    Returns the supervisor factory, given as a callable or as "module:function".
+    """
+    if callable(factory):
+        return factory
+    module_name, _, attribute = factory.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def completed_ids(output_path: str) -> set:
+    """
+    Reads the ids of the items completed by a previous run of the batch.
+
+    Args:
+        output_path (str): The JSONL output.
+
+    Returns:
+        set: The ids of the items with status "ok".
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut by an interruption
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def _result(item: BatchItem, answer, error, latency: float, report: Optional[Dict]) -> Dict:
+    """
+    Builds the output record of an item.
+    """
+    report = report or {}
+    return {
+        "id": item.id,
+        "run_id": report.get("run_id"),
+        "status": "error" if error else "ok",
+        "answer": answer,
+        "error": error,
+        "latency": latency,
+        "calls": report.get("calls", 0),
+        "prompt_tokens": report.get("prompt_tokens", 0),
+        "completion_tokens": report.get("completion_tokens", 0),
+    }
+
+
+def run_item(supervisor, item: BatchItem, mode: str = "supervised") -> Dict:
+    """
+    Runs the supervision of one item, turning errors into an error record.
+    """
+    start = time.perf_counter()
+    try:
+        (answer, report), error = supervisor.execution(item.question, mode=mode, return_report=True), None
+    except Exception as e:
+        logging.exception(f"Item {item.id} failed")
+        answer, report, error = None, getattr(e, "run_report", None), f"{type(e).__name__}: {e}"
+    return _result(item, answer, error, time.perf_counter() - start, report)
+
+
+async def arun_item(supervisor, item: BatchItem, mode: str = "supervised") -> Dict:
+    """
+    Runs the supervision of one item on an AsyncSupervisor.
+    """
+    start = time.perf_counter()
+    try:
+        (answer, report), error = await supervisor.execution(item.question, mode=mode, return_report=True), None
+    except Exception as e:
+        logging.exception(f"Item {item.id} failed")
+        answer, report, error = None, getattr(e, "run_report", None), f"{type(e).__name__}: {e}"
+    return _result(item, answer, error, time.perf_counter() - start, report)
+
+
+# Supervisor of a worker process, built once by _init_worker
+_worker_supervisor = None
+
+
+def _init_worker(factory: Union[str, Callable]):
+    """
+    Builds the supervisor of a worker process. The worker's INFO logs are
+    muted, the parent logs the progress of the batch; logging.disable is
+    process-wide, so it is left alone when not in a child process.
+    """
+    global _worker_supervisor
+    if multiprocessing.parent_process() is not None:
+        logging.disable(logging.INFO)
+    _worker_supervisor = resolve_factory(factory)()
+
+
+def _run_in_worker(item: BatchItem, mode: str) -> Dict:
+    return run_item(_worker_supervisor, item, mode)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class BatchRunner:
+    """
+    Runs a supervision per item and appends one JSON line per finished item
+    to output_path. Items already completed in output_path are skipped, so an
+    interrupted batch resumes where it left off; failed items are retried.
+
+    Attributes:
+        factory (Union[str, Callable]): Builds the Supervisor shared by the runs (an
+            AsyncSupervisor for the "asyncio" backend), one per worker process with the
+            "process" backend, for which it must be picklable, e.g. a module-level
+            function or a "module:function" string.
+        output_path (str): The JSONL output, also the checkpoint.
+        workers (int): Number of supervisions run concurrently.
+        backend (str): "thread", "process" or "asyncio".
+        mode (str): The execution mode, see Supervisor.execution.
+        stats (Optional[Dict]): Statistics of the last run.
+    """
+    BACKENDS = ("thread", "process", "asyncio")
+
+    def __init__(self, factory: Union[str, Callable], output_path: str, workers: int = 4,
+                 backend: str = "thread", mode: str = "supervised"):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        self.factory = factory
+        self.output_path = output_path
+        self.workers = workers
+        self.backend = backend
+        self.mode = mode
+        self.stats = None
+
+    @property
+    def stats_path(self) -> str:
+        return os.path.splitext(self.output_path)[0] + ".stats.json"
+
+    def run(self, items: List[BatchItem]) -> Dict:
+        """
+        Runs the pending items.
+
+        Args:
+            items (list): The items of the batch.
+
+        Returns:
+            dict: Throughput, latency and token statistics, also written to stats_path.
+        """
+        done = completed_ids(self.output_path)
+        pending = [item for item in items if item.id not in done]
+        logging.info(f"Batch of {len(items)} items: {len(done & {item.id for item in items})} already done, {len(pending)} to run")
+
+        results = []
+        start = time.perf_counter()
+        with open(self.output_path, "a") as output:
+            def write(record):
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                results.append(record)
+
+            if self.backend == "asyncio":
+                asyncio.run(self._run_async(pending, write))
+            else:
+                self._run_pool(pending, write)
+        wall_time = time.perf_counter() - start
+
+        self.stats = self._stats(items, pending, results, wall_time)
+        with open(self.stats_path, "w") as f:
+            json.dump(self.stats, f, indent=2)
+        return self.stats
+
+    def _run_pool(self, pending: List[BatchItem], write: Callable[[Dict], None]):
+        """
+        Runs the items on a thread or process pool, writing them as they finish.
+        """
+        if self.backend == "process":
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.factory,))
+            submit = lambda item: executor.submit(_run_in_worker, item, self.mode)
+        else:
+            # The threads share one supervisor: every run returns its own report
+            supervisor = resolve_factory(self.factory)()
+            executor = ThreadPoolExecutor(max_workers=self.workers)
+            submit = lambda item: executor.submit(run_item, supervisor, item, self.mode)
+        with executor:
+            futures = [submit(item) for item in pending]
+            for future in as_completed(futures):
+                write(future.result())
+
+    async def _run_async(self, pending: List[BatchItem], write: Callable[[Dict], None]):
+        """
+        Runs the items on the event loop, writing them as they finish.
+        """
+        supervisor = resolve_factory(self.factory)()
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def run(item):
+            async with semaphore:
+                return await arun_item(supervisor, item, self.mode)
+
+        for next_result in asyncio.as_completed([run(item) for item in pending]):
+            write(await next_result)
+
+    def _stats(self, items: List[BatchItem], pending: List[BatchItem], results: List[Dict], wall_time: float) -> Dict:
+        """
+        Summarises a run.
+        """
+        latencies = [r["latency"] for r in results]
+        ok = [r for r in results if r["status"] == "ok"]
+        return {
+            "items": len(items),
+            "skipped": len(items) - len(pending),
+            "completed": len(ok),
+            "failed": len(results) - len(ok),
+            "wall_time": wall_time,
+            "throughput": len(results) / wall_time if wall_time else 0.0,
+            "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p50": _percentile(latencies, 0.5),
+            "latency_p95": _percentile(latencies, 0.95),
+            "latency_max": max(latencies, default=0.0),
+            "calls": sum(r["calls"] for r in results),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in results),
+            "completion_tokens": sum(r["completion_tokens"] for r in results),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a supervision per input over a corpus.")
+    parser.add_argument("--inputs", nargs="+", required=True, help="A directory, or files or questions")
+    parser.add_argument("--output", required=True, help="The JSONL output, also used to resume")
+    parser.add_argument("--team", required=True, help="module:function building the Supervisor")
+    parser.add_argument("--template", default="{text}", help="The question, formatted with {path}, {name} and {text}")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backend", choices=BatchRunner.BACKENDS, default="thread")
+    parser.add_argument("--mode", choices=["supervised", "dag", "plan"], default="supervised")
+    args = parser.parse_args()
+
+    configure_logging()
+    inputs = args.inputs[0] if len(args.inputs) == 1 and os.path.isdir(args.inputs[0]) else args.inputs
+    items = load_items(inputs, args.template)
+    stats = BatchRunner(args.team, args.output, args.workers, args.backend, args.mode).run(items)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmarks of the supervision loop against a deterministic fake LLM.
+
+Usage:
+    python benchmark.py --agents 3 10 50 --modes supervised dag plan --latency 0.01
+    python benchmark.py --backend http            # through localOpenaiApis and a local server
+    python benchmark.py --backend http --fail-every 5 --retry-after 0.1   # with injected 429s
+    python benchmark.py --replay trace.json       # replay a recorded production trace
+    python benchmark.py --import-budget 0.5       # fail if importing the package gets slow
+    python benchmark.py --agents 10 --trace-dir traces/   # write a Chrome trace per run
+
+Author: andreadesogus
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from agents import Agent
+from context_view import DEFAULT_CONTEXT_TOKENS
+from basetool import CustomTool
+from baseLLM import localOpenaiApis
+from fake_llm import FakeLLM, CassetteProvider, FakeOpenAIServer
+from supervisor_v2 import Supervisor
+from tracing import ChromeTraceExporter, configure_tracing
+
+
+def lookup(key: str):
+    """
+    Returns the value stored for the given key.
+
+    :param key: The key to look up.
+    """
+    return f"value of {key}"
+
+lookup_tool = CustomTool(lookup)
+
+
+def make_team(size: int, tools_every: int = 2, chain: bool = True) -> List[Agent]:
+    """
+    Builds a synthetic team.
+
+    Args:
+        size (int): Number of agents.
+        tools_every (int): Every n-th agent gets the lookup tool; 0 for none.
+        chain (bool): Make each agent depend on the previous one, otherwise
+            all agents are independent.
+
+    Returns:
+        List[Agent]: The agents.
+    """
+    agents = []
+    for i in range(size):
+        role = f"Analyst {i + 1}"
+        agents.append(Agent({
+            'agent_role': role,
+            'backstory': f"You are {role}, a careful analyst of contractual documents.",
+            'tools': [lookup_tool] if tools_every and i % tools_every == 0 else None,
+            'resources': f"/data/document_{i + 1}.txt",
+            'context': [agents[-1].agent_role] if chain and agents else [],
+            'task_description': f"Analyse section {i + 1} of the document.",
+            'expected_output': 'A short report.'
+        }))
+    return agents
+
+
+def _busy_time(intervals: List) -> float:
+    """
+    Returns the total time during which at least one LLM call was in flight.
+    """
+    busy = 0.0
+    end = None
+    for start, stop in sorted(intervals):
+        if end is None or start > end:
+            busy += stop - start
+            end = stop
+        elif stop > end:
+            busy += stop - end
+            end = stop
+    return busy
+
+
+def run_scenario(team: List[Agent], ai, mode: str, runs: int, question: str, stats=None,
+                 speculation_match: str = None,
+                 context_tokens: Optional[int] = DEFAULT_CONTEXT_TOKENS) -> Dict:
+    """
+    Runs the same supervision several times and aggregates the measurements.
+
+    Args:
+        team (List[Agent]): The agents.
+        ai: The provider used by the supervisor.
+        mode (str): The execution mode passed to Supervisor.execution.
+        runs (int): Number of runs.
+        question (str): The user question.
+        stats: The FakeLLM or CassetteProvider counting the calls; defaults to ai.
+        speculation_match (str): Runs the supervisor speculatively with this match, see Supervisor.
+        context_tokens (int): Budget of the dependencies' outputs in the agents' prompts and of
+            each output in the supervisor memory, see Supervisor.
+
+    Returns:
+        dict: Per-run latency, LLM calls, tokens, prompt bytes, framework overhead
+        and, when speculative, the speculation hit rate and wasted tokens.
+    """
+    stats = stats if stats is not None else ai
+    latencies, calls, tokens, prompt_bytes, overheads = [], [], [], [], []
+    hit_rates, wasted_tokens = [], []
+    for _ in range(runs):
+        stats.reset()
+        if speculation_match:
+            supervisor = Supervisor(team, ai, speculative=True, speculation_match=speculation_match,
+                                    context_tokens=context_tokens)
+        else:
+            supervisor = Supervisor(team, ai, context_tokens=context_tokens)
+        start = time.perf_counter()
+        _, report = supervisor.execution(question, mode=mode, return_report=True)
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        calls.append(stats.calls)
+        tokens.append(report["prompt_tokens"] + report["completion_tokens"])
+        prompt_bytes.append(stats.prompt_bytes)
+        overheads.append(elapsed - _busy_time(stats.intervals))
+        speculation = report["speculation"]
+        hit_rates.append(speculation["hit_rate"] or 0.0)
+        wasted_tokens.append(speculation["wasted_tokens"])
+    result = {
+        "agents": len(team),
+        "mode": mode,
+        "runs": runs,
+        "latency_s": statistics.median(latencies),
+        "llm_calls": statistics.median(calls),
+        "tokens": statistics.median(tokens),
+        "prompt_bytes": statistics.median(prompt_bytes),
+        "overhead_ms": statistics.median(overheads) * 1000,
+    }
+    if speculation_match:
+        result["hit_rate"] = statistics.median(hit_rates)
+        result["wasted_tokens"] = statistics.median(wasted_tokens)
+    return result
+
+
+# Imports paid by every worker process, and the checks they must pass
+IMPORT_PROBE = """
+import logging, os, sys, time
+start = time.perf_counter()
+import supervisor_v2, basetool, baseLLM, retrieval, client_pool, batch
+baseLLM.openaiApis()
+elapsed = time.perf_counter() - start
+problems = []
+if "openai" in sys.modules:
+    problems.append("openai imported before the first call")
+if logging.getLogger().handlers:
+    problems.append("logging configured at import")
+print(elapsed)
+print("; ".join(problems))
+"""
+
+
+def import_time(runs: int = 5) -> Dict:
+    """
+    Measures the import of the package in fresh interpreters, as a worker
+    process of the batch runner would pay it, and checks that importing has
+    no side effects.
+
+    Args:
+        runs (int): Number of interpreters; the median is reported.
+
+    Returns:
+        dict: The median import time in seconds and the side effects found.
+    """
+    times, problems = [], set()
+    for _ in range(runs):
+        # No API key nor log directory: importing and building a provider must not need them
+        env = {k: v for k, v in os.environ.items() if not k.startswith("TEAMWORK_") and k != "OPENAI_API_KEY"}
+        env["TEAMWORK_API_KEY_FILE"] = os.devnull + ".missing"
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, env=env,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.splitlines()
+        times.append(float(output[0]))
+        if len(output) > 1 and output[1]:
+            problems.update(output[1].split("; "))
+    return {"import_s": statistics.median(times), "side_effects": sorted(problems)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, nargs="+", default=[3, 10, 25, 50], help="Team sizes to benchmark.")
+    parser.add_argument("--modes", nargs="+", default=["supervised", "dag", "plan"], help="Execution modes to benchmark.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated latency per LLM call, in seconds.")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per scenario; the median is reported.")
+    parser.add_argument("--output-bytes", type=int, default=0, help="Approximate size of every agent answer.")
+    parser.add_argument("--independent", action="store_true", help="Agents do not depend on each other.")
+    parser.add_argument("--backend", choices=["inprocess", "http"], default="inprocess",
+                        help="Call the fake LLM directly or through localOpenaiApis and a local HTTP server.")
+    parser.add_argument("--fail-every", type=int, default=0, help="With --backend http, answer every n-th request with a 429.")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After of the injected 429s, in seconds.")
+    parser.add_argument("--replay", help="Replay a cassette recorded with fake_llm.RecordingProvider.")
+    parser.add_argument("--question", default="Can you verify the presence and robustness of the fallback clause?")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per scenario.")
+    parser.add_argument("--context-tokens", type=int, default=DEFAULT_CONTEXT_TOKENS,
+                        help="Budget of the dependencies' outputs in an agent's prompt; 0 sends them in full.")
+    parser.add_argument("--speculative", choices=["question", "role"],
+                        help="Run the supervisor speculatively, committing on this match.")
+    parser.add_argument("--trace-dir", help="Write the trace of every run there, see tracing.ChromeTraceExporter.")
+    parser.add_argument("--import-budget", type=float, help="Only check that importing the package takes at most "
+                                                             "this many seconds and has no side effects.")
+    args = parser.parse_args()
+
+    if args.import_budget is not None:
+        result = import_time(args.runs)
+        print(json.dumps(result) if args.json else
+              f"import {result['import_s']:.3f} s (budget {args.import_budget:.3f} s)"
+              + "".join(f"\n  side effect: {problem}" for problem in result["side_effects"]))
+        sys.exit(0 if result["import_s"] <= args.import_budget and not result["side_effects"] else 1)
+
+    if args.trace_dir:
+        configure_tracing(ChromeTraceExporter(args.trace_dir))
+
+    scenarios = []
+    if args.replay:
+        cassette = CassetteProvider(args.replay, latency=args.latency)
+        args.question = cassette.question or args.question
+        scenarios.append((cassette.agents(), cassette, args.modes[0]))
+    else:
+        for size in args.agents:
+            team = make_team(size, chain=not args.independent)
+            for mode in args.modes:
+                scenarios.append((team, FakeLLM([agent.agent_role for agent in team], latency=args.latency,
+                                                        output_bytes=args.output_bytes), mode))
+
+    for team, fake, mode in scenarios:
+        server = None
+        ai = fake
+        if args.backend == "http":
+            server = FakeOpenAIServer(fake, fail_every=args.fail_every, retry_after=args.retry_after).start()
+            ai = localOpenaiApis(server.url, fake.model)
+        try:
+            result = run_scenario(team, ai, mode, args.runs, args.question, stats=fake,
+                                  speculation_match=args.speculative, context_tokens=args.context_tokens or None)
+        finally:
+            if server is not None:
+                server.stop()
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{result['agents']:>4} agents  {result['mode']:<10}  "
+                  f"latency {result['latency_s']:8.3f} s  calls {result['llm_calls']:5.0f}  tokens {result['tokens']:8.0f}  "
+                  f"prompt {result['prompt_bytes'] / 1024:9.1f} KiB  overhead {result['overhead_ms']:8.1f} ms"
+                  + (f"  hit rate {result['hit_rate']:4.0%}  wasted {result['wasted_tokens']:6.0f} tokens"
+                     if "hit_rate" in result else ""))
+
+
+if __name__ == "__main__":
+    main()
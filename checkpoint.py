@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints of supervision runs, saved after every step so that a run
+interrupted by a crash, a restart or a network error resumes where it
+stopped instead of paying again for the LLM calls already made.
+
+Author: andreadesogus
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class Checkpoint(BaseModel):
+    """
+    The state of a run after its last completed step.
+
+    Attributes:
+        run_id (str): The run id, see run_log.run_scope.
+        question (str): The user's question.
+        mode (str): "supervised", "dag" or "plan".
+        iteration (int): The next iteration (or DAG level) to run.
+        memory (dict): The supervisor memory, see ConversationMemory.to_dict.
+        context (dict): The agents' answers so far, by role; None for an agent that gave none.
+        output (Optional[str]): The last output, the final answer once completed.
+        pending (Optional[dict]): The supervisor's decision for the iteration under way,
+            whose delegations are not answered yet; in the "plan" mode, the steps left.
+        status (str): "running", "completed" or "failed".
+        error (Optional[str]): Why the run failed.
+        updated (float): time.time() of the save.
+    """
+    run_id: str
+    question: str
+    mode: str = "supervised"
+    iteration: int = 0
+    memory: Dict = {}
+    context: Dict[str, Optional[str]] = {}
+    output: Optional[str] = None
+    pending: Optional[Dict] = None
+    status: str = "running"
+    error: Optional[str] = None
+    updated: float = 0.0
+
+
+class CheckpointStore:
+    """
+    Base class of the checkpoint stores.
+    """
+    def save(self, checkpoint: Checkpoint):
+        """
+        Stores checkpoint, replacing the previous one of the run.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+    def load(self, run_id: str) -> Optional[Checkpoint]:
+        """
+        Returns the last checkpoint of a run, or None.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+    def delete(self, run_id: str):
+        """
+        Forgets a run.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+    def runs(self, status: Optional[str] = None) -> List[str]:
+        """
+        Returns the ids of the stored runs, optionally only those with a status,
+        e.g. the "running" runs left behind by a crash.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    One JSON file per run in a directory, replaced atomically on every save.
+
+    Attributes:
+        directory (str): Where the checkpoints are written.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.json")
+
+    def save(self, checkpoint: Checkpoint):
+        checkpoint.updated = time.time()
+        tmp_path = self.path(checkpoint.run_id) + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(checkpoint.model_dump_json())
+        os.replace(tmp_path, self.path(checkpoint.run_id))
+
+    def load(self, run_id: str) -> Optional[Checkpoint]:
+        if not os.path.exists(self.path(run_id)):
+            return None
+        with open(self.path(run_id), "r") as f:
+            return Checkpoint.model_validate_json(f.read())
+
+    def delete(self, run_id: str):
+        if os.path.exists(self.path(run_id)):
+            os.remove(self.path(run_id))
+
+    def runs(self, status: Optional[str] = None) -> List[str]:
+        run_ids = sorted(name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json"))
+        if status is None:
+            return run_ids
+        return [run_id for run_id in run_ids if self.load(run_id).status == status]
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    Checkpoints stored in a SQLite database, e.g. shared by the workers of a batch.
+
+    Attributes:
+        path (str): Path of the database file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "run_id TEXT PRIMARY KEY, status TEXT NOT NULL, state TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def save(self, checkpoint: Checkpoint):
+        checkpoint.updated = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, status, state, updated) VALUES (?, ?, ?, ?)",
+                (checkpoint.run_id, checkpoint.status, checkpoint.model_dump_json(), checkpoint.updated)
+            )
+
+    def load(self, run_id: str) -> Optional[Checkpoint]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM checkpoints WHERE run_id = ?", (run_id,)).fetchone()
+        return Checkpoint.model_validate_json(row[0]) if row is not None else None
+
+    def delete(self, run_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+
+    def runs(self, status: Optional[str] = None) -> List[str]:
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute("SELECT run_id FROM checkpoints ORDER BY run_id").fetchall()
+            else:
+                rows = self._conn.execute("SELECT run_id FROM checkpoints WHERE status = ? ORDER BY run_id",
+                                          (status,)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self._conn.close()
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Pools of LLM providers (API keys, deployments, regions) behind a single
+provider, with least-outstanding-requests routing and failover.
+
+Author: andreadesogus
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from baseLLM import LLMProvider, AsyncLLMProvider, openaiApis, asyncOpenaiApis
+from rate_limit import CircuitOpenError, RateLimiter, RetryPolicy, is_api_error, is_retryable
+
+
+def should_fail_over(error: Exception) -> bool:
+    """
+    Whether another endpoint may succeed where this one failed: transient
+    errors, open circuits and rejected credentials. Invalid requests and
+    budget stops would fail everywhere.
+    """
+    return (is_retryable(error) or isinstance(error, CircuitOpenError)
+            or is_api_error(error, "AuthenticationError", "PermissionDeniedError"))
+
+
+class Endpoint:
+    """
+    A provider of the pool and its routing statistics.
+
+    Attributes:
+        provider: The LLMProvider or AsyncLLMProvider.
+        name (str): The name used in the statistics.
+        outstanding (int): Requests in flight.
+        calls (int): Requests completed, successful or not.
+        errors (int): Failed requests.
+        latency (float): Total duration of the successful requests, in seconds.
+        prompt_tokens (int): Prompt tokens reported by the successful requests.
+        completion_tokens (int): Completion tokens reported by the successful requests.
+        down_until (float): time.monotonic() before which the endpoint is skipped.
+    """
+    def __init__(self, provider, name: str):
+        self.provider = provider
+        self.name = name
+        self.outstanding = 0
+        self.calls = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.down_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        """
+        Whether the endpoint takes calls: not cooling down, and its circuit
+        breaker, if any, would let a call through.
+        """
+        breaker = getattr(getattr(self.provider, "retry", None), "breaker", None)
+        return now >= self.down_until and (breaker is None or breaker.admits())
+
+    def stats(self) -> Dict:
+        successes = self.calls - self.errors
+        return {
+            "name": self.name,
+            "healthy": self.healthy(time.monotonic()),
+            "outstanding": self.outstanding,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency": self.latency / successes if successes else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class _Deltas:
+    """
+    Forwards the fragments of a streamed answer to on_delta, remembering
+    whether any was sent: once the caller has seen part of an answer, the
+    pool cannot fail over without repeating it.
+    """
+    def __init__(self, on_delta: Callable[[str], None]):
+        self.on_delta = on_delta
+        self.sent = False
+
+    def __call__(self, delta: str):
+        self.sent = True
+        self.on_delta(delta)
+
+
+class _Router:
+    """
+    Routing shared by the synchronous and asynchronous pools.
+    """
+    def __init__(self, providers: List, names: Optional[List[str]] = None, cooldown: float = 30.0):
+        if not providers:
+            raise ValueError("A pool needs at least one provider")
+        names = names or [f"{getattr(p, 'base_url', None) or 'endpoint'}#{i}" for i, p in enumerate(providers)]
+        self.endpoints = [Endpoint(provider, name) for provider, name in zip(providers, names)]
+        self.cooldown = cooldown
+        self.model = providers[0].model
+        self.embedding_model = providers[0].embedding_model
+        self.dimensions = getattr(providers[0], "dimensions", None)
+        self._lock = threading.Lock()
+
+    def _acquire(self, tried: set) -> Optional[Endpoint]:
+        """
+        Picks the healthy endpoint with the fewest requests in flight; if
+        every untried endpoint is down, the one that recovers first.
+        """
+        with self._lock:
+            candidates = [e for e in self.endpoints if id(e) not in tried]
+            if not candidates:
+                return None
+            now = time.monotonic()
+            healthy = [e for e in candidates if e.healthy(now)]
+            if healthy:
+                endpoint = min(healthy, key=lambda e: (e.outstanding, e.latency / max(1, e.calls - e.errors)))
+            else:
+                endpoint = min(candidates, key=lambda e: e.down_until)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint: Endpoint, start: float, result=None, error: Exception = None):
+        """
+        Updates the statistics of a finished request.
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.calls += 1
+            if error is not None:
+                endpoint.errors += 1
+                if should_fail_over(error):
+                    endpoint.down_until = time.monotonic() + self.cooldown
+                return
+            endpoint.latency += time.perf_counter() - start
+            endpoint.down_until = 0.0
+            usage = getattr(result, "usage", None)
+            endpoint.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            endpoint.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def _failed(self, endpoint: Endpoint, start: float, error: Exception, deltas: Optional[_Deltas] = None):
+        """
+        Records a failure, re-raising errors another endpoint would not fix
+        and errors that interrupted a streamed answer after its first fragment.
+        """
+        self._release(endpoint, start, error=error)
+        if not should_fail_over(error):
+            raise error
+        if deltas is not None and deltas.sent:
+            logging.warning(f"Endpoint {endpoint.name} failed mid-stream ({type(error).__name__}: {error})")
+            raise error
+        logging.warning(f"Endpoint {endpoint.name} failed ({type(error).__name__}: {error}), failing over")
+
+    def stats(self) -> List[Dict]:
+        """
+        Returns the statistics of every endpoint.
+        """
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+
+class ProviderPool(_Router, LLMProvider):
+    """
+    An LLMProvider spreading calls across several providers, e.g. one per API
+    key or deployment, so the pool gets the sum of their rate limits and a
+    slow or failing endpoint does not stall the team. Each call goes to the
+    healthy endpoint with the fewest requests in flight; on transient errors,
+    timeouts or rejected keys it is retried on the next one and the failing
+    endpoint is skipped for cooldown seconds. A streamed answer fails over
+    only until its first fragment is sent, so no fragment is repeated.
+
+    Example:
+        ai = ProviderPool.from_keys([key1, key2, key3], rpm=500, tpm=30000)
+        supervisor = Supervisor(agents, ai)
+        ai.stats()
+
+    Attributes:
+        endpoints (List[Endpoint]): The providers and their statistics.
+        cooldown (float): How long a failing endpoint is skipped, in seconds.
+    """
+    def __init__(self, providers: List[LLMProvider], names: Optional[List[str]] = None, cooldown: float = 30.0):
+        _Router.__init__(self, providers, names, cooldown)
+
+    @classmethod
+    def from_keys(cls, api_keys: List[str], base_url: str = None, rpm: float = None, tpm: float = None,
+                  timeout: float = 60.0, max_retries: int = 1, cooldown: float = 30.0, **kwargs) -> "ProviderPool":
+        """
+        Builds a pool of openaiApis, one per key, each with its own rate limits.
+
+        Args:
+            api_keys (list): The API keys.
+            base_url (str): The endpoint shared by the keys, if not OpenAI's.
+            rpm (float): Requests per minute of each key.
+            tpm (float): Tokens per minute of each key.
+            timeout (float): Request timeout, after which the pool fails over.
+            max_retries (int): Retries on the same endpoint before failing over.
+            cooldown (float): How long a failing endpoint is skipped, in seconds.
+            **kwargs: Further openaiApis arguments, e.g. model or cache.
+
+        Returns:
+            ProviderPool: The pool.
+        """
+        providers = [openaiApis(api_key=key, base_url=base_url, timeout=timeout,
+                                retry=RetryPolicy(limiter=RateLimiter(rpm, tpm), max_retries=max_retries), **kwargs)
+                     for key in api_keys]
+        return cls(providers, [f"key#{i}" for i in range(len(api_keys))], cooldown)
+
+    def _route(self, call: Callable, deltas: Optional[_Deltas] = None):
+        """
+        Runs call(provider) on an endpoint, failing over to the others until
+        deltas, the stream of the answer if any, has sent a fragment.
+        """
+        tried = set()
+        last_error = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                if last_error is None:
+                    raise RuntimeError("No endpoint available")
+                raise last_error
+            start = time.perf_counter()
+            try:
+                result = call(endpoint.provider)
+            except Exception as e:
+                self._failed(endpoint, start, e, deltas)
+                tried.add(id(endpoint))
+                last_error = e
+                continue
+            self._release(endpoint, start, result)
+            return result
+
+    def embeddings(self, text: str, use_cache: bool = True) -> list:
+        return self._route(lambda provider: provider.embeddings(text, use_cache=use_cache))
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # Batches of embed_many are spread across the endpoints
+        return self._route(lambda provider: provider._embed_batch(texts))
+
+    def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                on_delta: Callable[[str], None] = None):
+        deltas = _Deltas(on_delta) if on_delta is not None else None
+        stream = {"on_delta": deltas} if deltas is not None else {}
+        return self._route(lambda provider: provider.gptText(system, question, message=message, tools=tools,
+                                                             tool_choice=tool_choice, _format=_format,
+                                                             use_cache=use_cache, **stream), deltas)
+
+
+class AsyncProviderPool(_Router, AsyncLLMProvider):
+    """
+    Asynchronous counterpart of ProviderPool, over AsyncLLMProviders.
+    """
+    def __init__(self, providers: List[AsyncLLMProvider], names: Optional[List[str]] = None, cooldown: float = 30.0):
+        _Router.__init__(self, providers, names, cooldown)
+
+    @classmethod
+    def from_keys(cls, api_keys: List[str], base_url: str = None, rpm: float = None, tpm: float = None,
+                  timeout: float = 60.0, max_retries: int = 1, cooldown: float = 30.0, **kwargs) -> "AsyncProviderPool":
+        """
+        Builds a pool of asyncOpenaiApis, one per key, see ProviderPool.from_keys.
+        """
+        providers = [asyncOpenaiApis(api_key=key, base_url=base_url, timeout=timeout,
+                                     retry=RetryPolicy(limiter=RateLimiter(rpm, tpm), max_retries=max_retries), **kwargs)
+                     for key in api_keys]
+        return cls(providers, [f"key#{i}" for i in range(len(api_keys))], cooldown)
+
+    async def _route(self, call: Callable, deltas: Optional[_Deltas] = None):
+        """
+        Awaits call(provider) on an endpoint, failing over to the others, see ProviderPool._route.
+        """
+        tried = set()
+        last_error = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                if last_error is None:
+                    raise RuntimeError("No endpoint available")
+                raise last_error
+            start = time.perf_counter()
+            try:
+                result = await call(endpoint.provider)
+            except Exception as e:
+                self._failed(endpoint, start, e, deltas)
+                tried.add(id(endpoint))
+                last_error = e
+                continue
+            self._release(endpoint, start, result)
+            return result
+
+    async def embeddings(self, text: str, use_cache: bool = True) -> list:
+        return await self._route(lambda provider: provider.embeddings(text, use_cache=use_cache))
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self._route(lambda provider: provider._embed_batch(texts))
+
+    async def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                      on_delta: Callable[[str], None] = None):
+        deltas = _Deltas(on_delta) if on_delta is not None else None
+        stream = {"on_delta": deltas} if deltas is not None else {}
+        return await self._route(lambda provider: provider.gptText(system, question, message=message, tools=tools,
+                                                                   tool_choice=tool_choice, _format=_format,
+                                                                   use_cache=use_cache, **stream), deltas)
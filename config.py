@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Settings read from environment variables on first use, and the explicit
+logging setup. Importing a module of the package has no side effects:
+nothing is read, created or configured until it is needed.
+
+Environment variables:
+    TEAMWORK_API_KEY (or OPENAI_API_KEY): The OpenAI API key.
+    TEAMWORK_API_KEY_FILE: A file holding the key, used when no key is set
+        (default: DEFAULT_API_KEY_FILE).
+    TEAMWORK_LOG_DIR: Directory of the supervision log written by configure_logging.
+    TEAMWORK_LOG_LEVEL: Level of that log, e.g. "INFO" (default) or "DEBUG".
+    TEAMWORK_LOG_FORMAT: "json" (default), one object per line, or "text".
+    TEAMWORK_LOG_PAYLOADS: Fraction of the runs logging full questions and answers (default 0).
+
+Author: andreadesogus
+"""
+
+import logging
+import os
+import threading
+from typing import Optional
+
+from pydantic import BaseModel
+
+DEFAULT_API_KEY_FILE = "/Users/andreadesogus/Downloads/api_key.txt"
+LOG_FILE = "supervision.log"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class Settings(BaseModel):
+    """
+    Configuration of the package.
+
+    Attributes:
+        api_key (Optional[str]): The OpenAI API key.
+        api_key_file (Optional[str]): A file holding the key, read when api_key is not set.
+        log_dir (Optional[str]): Directory of the supervision log; None logs to stderr.
+        log_level (str): Level of the supervision log.
+        log_format (str): "json" or "text".
+        log_payload_rate (float): Fraction of the runs logging full questions and answers.
+    """
+    api_key: Optional[str] = None
+    api_key_file: Optional[str] = DEFAULT_API_KEY_FILE
+    log_dir: Optional[str] = None
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_payload_rate: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """
+        Reads the settings from the environment variables.
+        """
+        return cls(
+            api_key=os.environ.get("TEAMWORK_API_KEY") or os.environ.get("OPENAI_API_KEY"),
+            api_key_file=os.environ.get("TEAMWORK_API_KEY_FILE", DEFAULT_API_KEY_FILE),
+            log_dir=os.environ.get("TEAMWORK_LOG_DIR"),
+            log_level=os.environ.get("TEAMWORK_LOG_LEVEL", "INFO"),
+            log_format=os.environ.get("TEAMWORK_LOG_FORMAT", "json"),
+            log_payload_rate=float(os.environ.get("TEAMWORK_LOG_PAYLOADS", 0.0)),
+        )
+
+    def resolve_api_key(self) -> str:
+        """
+        Returns the API key, reading api_key_file if needed.
+
+        Raises:
+            RuntimeError: If no key is set and the key file does not exist.
+        """
+        if self.api_key:
+            return self.api_key
+        if self.api_key_file and os.path.exists(os.path.expanduser(self.api_key_file)):
+            with open(os.path.expanduser(self.api_key_file), 'r') as f:
+                return f.read().strip()
+        raise RuntimeError("No API key configured: set TEAMWORK_API_KEY, OPENAI_API_KEY or TEAMWORK_API_KEY_FILE, "
+                           "or pass api_key to the provider.")
+
+
+_settings = None
+_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """
+    Returns the settings, read from the environment on the first call.
+    """
+    global _settings
+    with _lock:
+        if _settings is None:
+            _settings = Settings.from_env()
+        return _settings
+
+
+def configure(settings: Optional[Settings] = None, **overrides) -> Settings:
+    """
+    Replaces the settings, e.g. configure(api_key_file="~/api_key.txt", log_dir="logs").
+
+    Args:
+        settings (Settings): The new settings; defaults to the current ones.
+        **overrides: Fields to change.
+
+    Returns:
+        Settings: The settings now in use.
+    """
+    global _settings
+    base = settings or get_settings()
+    with _lock:
+        _settings = base.model_copy(update=overrides)
+        return _settings
+
+
+def configure_logging(log_dir: Optional[str] = None, level: Optional[str] = None, log_format: Optional[str] = None,
+                      payload_rate: Optional[float] = None) -> Optional[str]:
+    """
+    Sends the package logs to log_dir/supervision.log, or to stderr without a
+    directory, through a queue written by a background thread (see run_log).
+    Applications call this once at start-up; library imports never do.
+
+    Args:
+        log_dir (str): The log directory; defaults to the TEAMWORK_LOG_DIR setting.
+        level (str): The log level; defaults to the TEAMWORK_LOG_LEVEL setting.
+        log_format (str): "json" or "text"; defaults to the TEAMWORK_LOG_FORMAT setting.
+        payload_rate (float): Fraction of the runs logging full questions and answers;
+            defaults to the TEAMWORK_LOG_PAYLOADS setting.
+
+    Returns:
+        Optional[str]: The log file path, if logging to a file.
+    """
+    from run_log import JsonFormatter, TextFormatter, start_queue_logging
+
+    settings = get_settings()
+    log_dir = log_dir or settings.log_dir
+    level = (level or settings.log_level).upper()
+    log_format = log_format or settings.log_format
+    payload_rate = payload_rate if payload_rate is not None else settings.log_payload_rate
+    log_path = None
+    if log_dir:
+        os.makedirs(os.path.expanduser(log_dir), exist_ok=True)
+        log_path = os.path.join(os.path.expanduser(log_dir), LOG_FILE)
+        handler = logging.FileHandler(log_path)
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter(LOG_FORMAT))
+    start_queue_logging(handler, logging.getLevelName(level), payload_rate)
+    return log_path
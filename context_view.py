@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Budgeted views of the agents' outputs for the downstream agents.
+
+The outputs of a run are kept once, by role, in its OutputStore. The
+supervisor memory holds references to them, and an agent depending on other
+agents gets a view of their outputs cut to a context budget, so that a large
+output (a whole clause, the contents of a file) is neither copied nor pasted
+in full into every prompt. Shortened outputs are built once per output and
+budget by each ContextViews, which has its own summarizer.
+
+Author: andreadesogus
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from memory import estimate_tokens, truncate
+from prompt_cache import PromptCache, content_hash
+
+# Default budget of an agent's context and of each output in the supervisor memory, see Supervisor
+DEFAULT_CONTEXT_TOKENS = 2000
+
+REFERENCE = re.compile(r"\[\[output:(.+?)\]\]")
+
+
+class LLMContextSummarizer:
+    """
+    Shortens an output by asking the LLM to summarize it, instead of
+    keeping its head and tail.
+
+    Attributes:
+        ai (LLMProvider): The LLM provider, typically a cheaper model than the agents'.
+    """
+    def __init__(self, ai):
+        self.ai = ai
+
+    def __call__(self, text: str, max_tokens: int) -> str:
+        system = (
+            "You summarize the output of an AI agent for the colleagues who build on it. "
+            f"Use at most {max_tokens * 3 // 4} words. Keep every finding, figure, name, date and "
+            "quotation the others may need; drop explanations and repetitions. Answer with the summary only."
+        )
+        response = self.ai.gptText(system=system, question=text)
+        return truncate(response.choices[0].message.content or "", max_tokens)
+
+
+class ContextViews:
+    """
+    Builds the context section of the agents' prompts from the outputs of the
+    agents they depend on, within a token budget per agent. It holds no
+    outputs: the views are computed from the run's OutputStore when an agent
+    is asked, and only the shortened outputs are cached.
+
+    The budget is split evenly between the dependencies, and what a short
+    output does not use goes to the longer ones, so only outputs that do not
+    fit are shortened.
+
+    Attributes:
+        max_tokens (Optional[int]): The default budget of an agent's context; None sends
+            the outputs in full. Agent.context_budget sets it per agent.
+        summarizer (Callable): Shortens an output, called as summarizer(text, max_tokens);
+            by default keeps its head and tail, see memory.truncate.
+    """
+    def __init__(self, max_tokens: Optional[int] = DEFAULT_CONTEXT_TOKENS,
+                 summarizer: Optional[Callable[[str, int], str]] = None):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer or truncate
+        # Shortened outputs, by output and budget; each instance has its own summarizer
+        self._shortened = PromptCache()
+
+    def budget(self, agent) -> Optional[int]:
+        """
+        Returns the context budget of an agent, in tokens.
+        """
+        budget = getattr(agent, "context_budget", None)
+        return budget if budget is not None else self.max_tokens
+
+    def allocate(self, outputs: List[Tuple[str, str]], budget: int) -> Dict[str, int]:
+        """
+        Splits budget between outputs, giving no output more than it needs.
+
+        Args:
+            outputs (list): (agent_role, output) pairs.
+            budget (int): The total budget, in tokens.
+
+        Returns:
+            dict: The budget of every role.
+        """
+        shares = {}
+        remaining = budget
+        by_size = sorted(outputs, key=lambda item: estimate_tokens(item[1]))
+        for position, (agent_role, output) in enumerate(by_size):
+            share = remaining // (len(by_size) - position)
+            shares[agent_role] = min(estimate_tokens(output), share)
+            remaining -= shares[agent_role]
+        return shares
+
+    def shorten(self, text: str, max_tokens: int) -> str:
+        """
+        Returns text cut to max_tokens, built once per text, budget and summarizer.
+        """
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        return self._shortened.get_or_build("context_view", content_hash(text, max_tokens),
+                                            lambda: self.summarizer(text, max_tokens))
+
+    def view(self, agent, context: Dict) -> str:
+        """
+        Returns the outputs the agent depends on, within its budget.
+
+        Args:
+            agent (Agent): The agent about to be asked.
+            context (dict): The outputs of the run so far, by role, e.g. its OutputStore.
+
+        Returns:
+            str: One "- role said: output" line per available dependency.
+        """
+        outputs = [(agent_role, context[agent_role]) for agent_role in agent.context or []
+                   if context.get(agent_role) is not None]
+        budget = self.budget(agent)
+        if budget is not None:
+            shares = self.allocate(outputs, budget)
+            outputs = [(agent_role, self.shorten(output, shares[agent_role])) for agent_role, output in outputs]
+        return "".join(f"- {agent_role} said: {output}\n" for agent_role, output in outputs)
+
+
+class OutputStore(dict):
+    """
+    The outputs of a run, each kept once, by agent role. The supervisor
+    memory holds references to them instead of copies, expanded when the
+    memory is rendered to a view cut to max_tokens; a checkpoint saves the
+    outputs once, in its context.
+
+    Attributes:
+        views (ContextViews): Shortens the outputs over budget.
+        max_tokens (Optional[int]): Budget of each expanded output; None expands them in full.
+    """
+    def __init__(self, outputs: Optional[Dict[str, Optional[str]]] = None, views: Optional[ContextViews] = None,
+                 max_tokens: Optional[int] = DEFAULT_CONTEXT_TOKENS):
+        super().__init__(outputs or {})
+        self.views = views or ContextViews()
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def reference(agent_role: str) -> str:
+        """
+        Returns the reference to the output of agent_role, to put in a message.
+        """
+        return f"[[output:{agent_role}]]"
+
+    def render(self, text: str) -> str:
+        """
+        Expands the references of text to the outputs they refer to, cut to
+        max_tokens. References to roles without output are kept.
+        """
+        return REFERENCE.sub(self._expand, text)
+
+    def _expand(self, match: re.Match) -> str:
+        agent_role = match.group(1)
+        if agent_role not in self:
+            return match.group(0)
+        output = str(self[agent_role])
+        return output if self.max_tokens is None else self.views.shorten(output, self.max_tokens)
@@ -6,8 +6,22 @@ Created on Sun Jun 23 16:54:38 2024
 @author: andreadesogus
 """
 
+import json
+
+
 class ToolInputHandler():
-    def solve(self, agent, tool, e):
+    def _build_prompt(self, agent, tool, error):
+        """
+        Builds the system and user messages used to repair the tool inputs.
+
+        Args:
+            agent: The agent using the tool.
+            tool: The CustomTool that failed.
+            error: The error raised by the tool.
+
+        Returns:
+            tuple: A tuple containing the system message and the question.
+        """
         system = f"""
         You are one of the best Python developers and part of a team of AI agents whose task is to carry out specific duties to complete a complex task. Your specific role is to ensure that the tools available to each agent are functioning properly.
 
@@ -24,9 +38,48 @@ class ToolInputHandler():
         Tool Parameter Descriptions: {tool.param_description}
 
         The agent will provide you with the error they are encountering, and you must respond exclusively with the following format:
-        {"parameter_name": "parameter_input"}"""
+        {{"parameter_name": "parameter_input"}}"""
+
+        question = f"I received the following error, could you help the agent?\nERROR: {error}"
+        return system, question
+
+    def _parse(self, content):
+        """
+        Parses the corrected inputs, returning None for a reply that is not a
+        JSON object, so that the tool error is not hidden by a parsing one.
+        """
+        try:
+            inputs = json.loads(content or "")
+        except json.JSONDecodeError:
+            return None
+        return inputs if isinstance(inputs, dict) else None
+
+    def solve(self, agent, tool, ai, error=None):
+        """
+        Asks the LLM for corrected tool inputs.
+
+        Args:
+            agent: The agent using the tool.
+            tool: The CustomTool that failed.
+            ai (LLMProvider): The LLM provider.
+            error: The error raised by the tool.
+
+        Returns:
+            dict: The corrected keyword arguments for the tool, or None if the
+            reply is not a JSON object.
+        """
+        system, question = self._build_prompt(agent, tool, error)
+        response = ai.gptText(system=system, question=question, _format='json')
+        return self._parse(response.choices[0].message.content)
+
+    async def asolve(self, agent, tool, ai, error=None):
+        """
+        Asynchronous counterpart of solve, for use with an AsyncLLMProvider.
 
-        question = f"I received the following error, could you help the agent?\nERROR: {e}"
-        # Assuming ai.gptText is a placeholder for interacting with an AI service
-        response = ai.gptText(system=system, question=question)
-        return response.choices[0].message.content
+        Returns:
+            dict: The corrected keyword arguments for the tool, or None if the
+            reply is not a JSON object.
+        """
+        system, question = self._build_prompt(agent, tool, error)
+        response = await ai.gptText(system=system, question=question, _format='json')
+        return self._parse(response.choices[0].message.content)
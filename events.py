@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Typed events emitted while a supervision runs, for streaming consumers.
+
+Author: andreadesogus
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Literal, Optional, Union
+
+from pydantic import BaseModel
+
+# The callback receiving the events of the run in progress, if anyone listens
+_current_listener = ContextVar("event_listener", default=None)
+
+
+class DelegationEvent(BaseModel):
+    """
+    The supervisor (or the scheduler) handed a question to an agent.
+    """
+    type: Literal["delegation"] = "delegation"
+    iteration: int
+    agent_role: str
+    question: Optional[str] = None
+
+
+class AgentTokenEvent(BaseModel):
+    """
+    A fragment of an agent's answer, as streamed by the provider.
+    """
+    type: Literal["agent_token"] = "agent_token"
+    agent_role: Optional[str] = None
+    delta: str
+
+
+class ToolCallStartedEvent(BaseModel):
+    """
+    An agent's tool call is about to run.
+    """
+    type: Literal["tool_call_started"] = "tool_call_started"
+    agent_role: Optional[str] = None
+    tool_name: str
+    tool_call_id: str
+    arguments: Dict[str, Any] = {}
+
+
+class ToolCallFinishedEvent(BaseModel):
+    """
+    An agent's tool call returned or failed.
+    """
+    type: Literal["tool_call_finished"] = "tool_call_finished"
+    agent_role: Optional[str] = None
+    tool_name: str
+    tool_call_id: str
+    duration: float
+    error: Optional[str] = None
+    cached: bool = False
+
+
+class AgentOutputEvent(BaseModel):
+    """
+    An agent finished and its output was merged into the context.
+    """
+    type: Literal["agent_output"] = "agent_output"
+    agent_role: str
+    output: Optional[str] = None
+
+
+class FinalAnswerEvent(BaseModel):
+    """
+    The run is over.
+    """
+    type: Literal["final_answer"] = "final_answer"
+    answer: Optional[str] = None
+    report: Optional[Dict[str, Any]] = None
+
+
+Event = Union[DelegationEvent, AgentTokenEvent, ToolCallStartedEvent, ToolCallFinishedEvent,
+              AgentOutputEvent, FinalAnswerEvent]
+
+
+@contextmanager
+def listen(callback: Callable[[Event], None]):
+    """
+    Sends the events emitted in this context to callback.
+    """
+    token = _current_listener.set(callback)
+    try:
+        yield
+    finally:
+        _current_listener.reset(token)
+
+
+def listening() -> bool:
+    """
+    Returns whether anyone listens to the events of the current context.
+    """
+    return _current_listener.get() is not None
+
+
+def emit(event: Event):
+    """
+    Sends event to the current listener, if any.
+    """
+    callback = _current_listener.get()
+    if callback is not None:
+        callback(event)
@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic LLM stand-ins for benchmarks and offline runs.
+
+Author: andreadesogus
+"""
+
+import itertools
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from openai.types.chat import ChatCompletion
+
+from agents import Agent
+from baseLLM import LLMProvider, build_messages, completion_kwargs, replay_deltas
+from basetool import BaseTool, OpenaiFunctionCalling
+from llm_cache import request_key
+from metrics import check_budget, record_completion
+
+
+def make_completion(content: Optional[str] = None, tool_calls: Optional[List[Dict]] = None,
+                    prompt_tokens: int = 0, completion_tokens: int = 0, model: str = "fake") -> ChatCompletion:
+    """
+    Builds a ChatCompletion object like the ones returned by the OpenAI client.
+
+    Args:
+        content (str): The assistant message content.
+        tool_calls (list): Tool calls as {"name": str, "arguments": dict} dictionaries.
+        prompt_tokens (int): Prompt tokens reported in usage.
+        completion_tokens (int): Completion tokens reported in usage.
+        model (str): The model name reported in the completion.
+
+    Returns:
+        ChatCompletion: The completion.
+    """
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = [
+            {"id": f"call_{i}", "type": "function",
+             "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+            for i, call in enumerate(tool_calls)
+        ]
+    return ChatCompletion.model_validate({
+        "id": "fake-completion",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "tool_calls" if tool_calls else "stop", "message": message}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    })
+
+
+def _content(message) -> str:
+    """
+    Returns the text content of a chat message, whether a dict or a client object.
+    """
+    if isinstance(message, dict):
+        return message.get("content") or ""
+    return getattr(message, "content", None) or ""
+
+
+def _role(message) -> str:
+    """
+    Returns the role of a chat message, whether a dict or a client object.
+    """
+    if isinstance(message, dict):
+        return message.get("role")
+    return getattr(message, "role", None)
+
+
+class FakeLLM(LLMProvider):
+    """
+    A scripted LLM that plays a supervision run: the supervisor delegates to
+    each agent once in team order, every agent with tools calls its first
+    tool once, and the supervisor then answers.
+
+    Attributes:
+        roles (List[str]): The team roles, in delegation order.
+        latency (float): Simulated latency of every call, in seconds.
+        output_bytes (int): Approximate size of every agent answer.
+        calls (int): Number of calls served.
+        prompt_bytes (int): Total size of the prompts received.
+        intervals (list): (start, end) times of every call.
+    """
+    model = "fake"
+    embedding_model = "fake-embedding"
+
+    def __init__(self, roles: List[str], latency: float = 0.0, output_bytes: int = 0, embedding_dimensions: int = 8):
+        self.roles = roles
+        self.latency = latency
+        self.output_bytes = output_bytes
+        self.embedding_dimensions = embedding_dimensions
+        self.calls = 0
+        self.prompt_bytes = 0
+        self.intervals = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        Clears the call statistics.
+        """
+        with self._lock:
+            self.calls = 0
+            self.prompt_bytes = 0
+            self.intervals = []
+
+    def embeddings(self, text: str, use_cache: bool = True) -> list:
+        time.sleep(self.latency)
+        seed = sum(text.encode("utf-8"))
+        return [((seed * (i + 1)) % 97) / 97 for i in range(self.embedding_dimensions)]
+
+    def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                on_delta=None):
+        check_budget()
+        start = time.perf_counter()
+        messages = build_messages(system, question, message)
+        size = len(json.dumps(completion_kwargs(messages, tools, tool_choice, _format, self.model),
+                              default=lambda o: o.model_dump(exclude_none=True)))
+        time.sleep(self.latency)
+
+        if (_format == "json" or isinstance(_format, dict)) and "execution plan" in _content(messages[0]):
+            completion = self._plan(messages)
+        elif _format == "json" or isinstance(_format, dict):
+            completion = self._supervise(messages)
+        else:
+            completion = self._work(messages, tools)
+        completion.usage.prompt_tokens = size // 4
+        completion.usage.total_tokens = completion.usage.prompt_tokens + completion.usage.completion_tokens
+
+        with self._lock:
+            self.calls += 1
+            self.prompt_bytes += size
+            self.intervals.append((start, time.perf_counter()))
+        record_completion(completion, time.perf_counter() - start)
+        if on_delta is not None:
+            replay_deltas(completion, on_delta)
+        return completion
+
+    def _pending(self, messages: List) -> List[str]:
+        """
+        Returns the roles that have not answered yet.
+        """
+        transcript = "\n".join(_content(m) for m in messages[1:])
+        answered = set()
+        for line in transcript.splitlines():
+            if line.startswith("Agents who have already answered: "):
+                answered.update(line.split(": ", 1)[1].split("; "))
+        return [role for role in self.roles if role not in answered and f"The {role} says:" not in transcript]
+
+    def _plan(self, messages: List) -> ChatCompletion:
+        """
+        Answers as the planning supervisor: one step per agent yet to answer,
+        or whose output was just flagged as unsatisfactory.
+        """
+        last = _content(messages[-1])
+        flagged = [role for role in self.roles if "flagged" in last and role in last.split(" were flagged")[0]]
+        roles = flagged + [role for role in self._pending(messages) if role not in flagged]
+        steps = [{"delegations": [{"agent_role": role, "question": f"Please complete your task as {role}."}]}
+                 for role in roles]
+        return make_completion(json.dumps({"steps": steps}), completion_tokens=30 * len(steps) + 10)
+
+    def _supervise(self, messages: List) -> ChatCompletion:
+        """
+        Answers as the supervisor: delegate to the next agent, or answer.
+        """
+        pending = self._pending(messages)
+        if pending:
+            decision = {"delegation": True, "agent_role": pending[0],
+                        "question": f"Please complete your task as {pending[0]}.",
+                        "answer": None, "stop": False}
+        else:
+            decision = {"delegation": False, "agent_role": None, "question": None,
+                        "answer": f"Final answer based on {len(self.roles)} agents.", "stop": True}
+        return make_completion(json.dumps(decision), completion_tokens=40)
+
+    def _work(self, messages: List, tools) -> ChatCompletion:
+        """
+        Answers as an agent: call the first tool once, then answer.
+        """
+        if tools and _role(messages[-1]) != "tool":
+            function = tools[0]["function"]
+            arguments = {param: "fake" for param in function["parameters"]["properties"]}
+            return make_completion(tool_calls=[{"name": function["name"], "arguments": arguments}], completion_tokens=20)
+        role = next((role for role in self.roles if f"role of {role} " in _content(messages[0])), "agent")
+        content = f"Output of {role}."
+        if self.output_bytes > len(content):
+            filler = " The clause was reviewed against the guidelines."
+            content += (filler * (self.output_bytes // len(filler) + 1))[:self.output_bytes - len(content)]
+        return make_completion(content, completion_tokens=max(60, len(content) // 4))
+
+
+class RecordingProvider(LLMProvider):
+    """
+    Wraps a provider and records a whole conversation into a cassette file:
+    the question, the team, every chat completion and every tool output, so
+    production runs can be replayed later as regression benchmarks.
+
+    Attributes:
+        provider (LLMProvider): The wrapped provider.
+        path (str): The cassette path, written by save().
+        agents (List[Agent]): The recorded team.
+        question (str): The recorded user question.
+        interactions (list): The recorded request keys and responses.
+        tool_outputs (dict): The tool outputs seen in the requests, by tool name.
+    """
+    def __init__(self, provider: LLMProvider, path: str, agents: List[Agent] = None, question: str = None):
+        self.provider = provider
+        self.path = path
+        self.agents = agents or []
+        self.question = question
+        self.model = provider.model
+        self.embedding_model = provider.embedding_model
+        self.interactions = []
+        self.tool_outputs = {}
+        self._lock = threading.Lock()
+
+    def embeddings(self, text: str, use_cache: bool = True) -> list:
+        return self.provider.embeddings(text, use_cache=use_cache)
+
+    def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                on_delta=None):
+        completion = self.provider.gptText(system, question, message=message, tools=tools,
+                                           tool_choice=tool_choice, _format=_format, use_cache=use_cache,
+                                           on_delta=on_delta)
+        request = completion_kwargs(build_messages(system, question, message), tools, tool_choice, _format, self.model)
+        with self._lock:
+            # Tool results are sent back right after they are computed, at the end of the request
+            results = []
+            for item in reversed(message or []):
+                if _role(item) != "tool":
+                    break
+                results.append(item)
+            for item in reversed(results):
+                self.tool_outputs.setdefault(item["name"], []).append(item["content"])
+            self.interactions.append({
+                "request": request_key("chat", request),
+                "format": _format,
+                "response": completion.model_dump(mode="json"),
+            })
+        return completion
+
+    def save(self):
+        """
+        Writes the recorded conversation to the cassette file.
+        """
+        team = []
+        for agent in self.agents:
+            team.append({
+                'agent_role': agent.agent_role,
+                'backstory': agent.backstory,
+                'tools': OpenaiFunctionCalling(agent.tools).generate_function_definitions() if agent.tools else None,
+                'resources': agent.resources,
+                'context': agent.context,
+                'task_description': agent.task_description,
+                'expected_output': agent.expected_output,
+            })
+        with self._lock, open(self.path, "w") as f:
+            json.dump({"model": self.model, "question": self.question, "agents": team,
+                       "interactions": self.interactions, "tool_outputs": self.tool_outputs}, f)
+
+
+class ReplayTool(BaseTool):
+    """
+    Stand-in for a recorded tool: same name and schema, returning the
+    recorded outputs in order instead of running the real function.
+    """
+    _types = {'integer': int, 'string': str, 'number': float, 'object': dict,
+              'array': list, 'boolean': bool, 'null': type(None)}
+
+    def __init__(self, definition: Dict, cassette: "CassetteProvider"):
+        function = definition["function"]
+        properties = function["parameters"]["properties"]
+        super().__init__(
+            name=function["name"],
+            description=function["description"],
+            params=list(properties),
+            param_type=[self._types.get(spec["type"]) for spec in properties.values()],
+            param_description=[spec["description"] for spec in properties.values()]
+        )
+        self.cassette = cassette
+        self.func = self.execution
+
+    def execution(self, *args, **kwargs):
+        return self.cassette.tool_output(self.name)
+
+
+class CassetteProvider(LLMProvider):
+    """
+    Replays a cassette recorded by RecordingProvider, in recording order.
+
+    Attributes:
+        path (str): The cassette path.
+        question (str): The recorded user question.
+        latency (float): Simulated latency of every call, in seconds.
+        strict (bool): Raise when a request differs from the recorded one,
+            instead of only logging a warning.
+        calls (int): Number of calls served.
+        prompt_bytes (int): Total size of the prompts received.
+        intervals (list): (start, end) times of every call.
+    """
+    embedding_model = None
+
+    def __init__(self, path: str, latency: float = 0.0, strict: bool = False):
+        with open(path, "r") as f:
+            cassette = json.load(f)
+        self.path = path
+        self.model = cassette["model"]
+        self.question = cassette.get("question")
+        self.latency = latency
+        self.strict = strict
+        self.interactions = cassette["interactions"]
+        self.team = cassette.get("agents") or []
+        self.tool_outputs = cassette.get("tool_outputs") or {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Rewinds the cassette and clears the call statistics.
+        """
+        with self._lock:
+            self._position = itertools.count()
+            self._tool_positions = {name: itertools.count() for name in self.tool_outputs}
+            self.calls = 0
+            self.prompt_bytes = 0
+            self.intervals = []
+
+    def agents(self) -> List[Agent]:
+        """
+        Rebuilds the recorded team, with ReplayTool in place of the real tools.
+
+        Returns:
+            List[Agent]: The agents.
+        """
+        agents = []
+        for features in self.team:
+            features = dict(features)
+            if features.get('tools'):
+                features['tools'] = [ReplayTool(definition, self) for definition in features['tools']]
+            agents.append(Agent(features))
+        return agents
+
+    def tool_output(self, name: str) -> str:
+        """
+        Returns the next recorded output of the named tool.
+        """
+        with self._lock:
+            outputs = self.tool_outputs.get(name, [])
+            position = next(self._tool_positions.setdefault(name, itertools.count()))
+        if position >= len(outputs):
+            raise RuntimeError(f"Cassette {self.path} has no more outputs for tool '{name}'")
+        return outputs[position]
+
+    def embeddings(self, text: str, use_cache: bool = True) -> list:
+        raise NotImplementedError("Cassettes only record chat completions")
+
+    def gptText(self, system: str, question: str = None, message: List = None, tools = None, tool_choice = None, _format: str = "text", use_cache: bool = True,
+                on_delta=None):
+        check_budget()
+        start = time.perf_counter()
+        request = completion_kwargs(build_messages(system, question, message), tools, tool_choice, _format, self.model)
+        size = len(json.dumps(request, default=lambda o: o.model_dump(exclude_none=True)))
+        with self._lock:
+            position = next(self._position)
+        if position >= len(self.interactions):
+            raise RuntimeError(f"Cassette {self.path} exhausted after {len(self.interactions)} interactions")
+        interaction = self.interactions[position]
+        if interaction["request"] != request_key("chat", request):
+            if self.strict:
+                raise RuntimeError(f"Request {position} differs from the one recorded in {self.path}")
+            logging.warning(f"Request {position} differs from the one recorded in {self.path}")
+        time.sleep(self.latency)
+
+        completion = ChatCompletion.model_validate(interaction["response"])
+        with self._lock:
+            self.calls += 1
+            self.prompt_bytes += size
+            self.intervals.append((start, time.perf_counter()))
+        record_completion(completion, time.perf_counter() - start)
+        if on_delta is not None:
+            replay_deltas(completion, on_delta)
+        return completion
+
+
+class FakeOpenAIServer:
+    """
+    A local OpenAI-compatible HTTP server backed by a provider such as
+    FakeLLM, to exercise localOpenaiApis and the HTTP stack fully offline.
+
+    Example:
+        server = FakeOpenAIServer(FakeLLM(roles)).start()
+        ai = localOpenaiApis(server.url, "fake")
+        ...
+        server.stop()
+
+    Rate limits can be simulated to exercise the client's retry policy:
+    fail_every answers every n-th request with a 429, max_rpm answers 429
+    to the requests beyond the limit in a sliding minute.
+
+    Attributes:
+        provider (LLMProvider): The provider answering the requests.
+        host (str): The bound host.
+        port (int): The bound port; 0 picks a free one.
+        fail_every (int): Answer every n-th request with a 429; 0 never does.
+        max_rpm (Optional[int]): Requests accepted per sliding minute.
+        retry_after (Optional[float]): The Retry-After sent with the 429s, in seconds.
+        requests (int): Number of requests received.
+        throttled (int): Number of 429s sent.
+    """
+    def __init__(self, provider: LLMProvider, host: str = "127.0.0.1", port: int = 0,
+                 fail_every: int = 0, max_rpm: Optional[int] = None, retry_after: Optional[float] = None):
+        self.provider = provider
+        self.host = host
+        self.port = port
+        self.fail_every = fail_every
+        self.max_rpm = max_rpm
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self._accepted = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        The base URL to pass to localOpenaiApis.
+        """
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        """
+        Starts serving in a background thread.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if server.throttle():
+                    data = json.dumps({"error": {"message": "Rate limit reached", "type": "requests",
+                                                 "code": "rate_limit_exceeded"}}).encode("utf-8")
+                    self.send_response(429)
+                    if server.retry_after is not None:
+                        self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                status, payload = server.handle(self.path, body)
+                if status == 200 and body.get("stream"):
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    for chunk in server.stream_chunks(payload):
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    return
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def throttle(self) -> bool:
+        """
+        Counts a request and decides whether it is rejected with a 429.
+        """
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            self._accepted = [t for t in self._accepted if now - t < 60.0]
+            rejected = (self.fail_every and self.requests % self.fail_every == 0) or \
+                (self.max_rpm is not None and len(self._accepted) >= self.max_rpm)
+            if rejected:
+                self.throttled += 1
+            else:
+                self._accepted.append(now)
+            return bool(rejected)
+
+    @staticmethod
+    def stream_chunks(completion: Dict) -> List[Dict]:
+        """
+        Splits a completion into the chunks of a streamed response.
+
+        Args:
+            completion (dict): The JSON completion.
+
+        Returns:
+            list: The chat.completion.chunk payloads, the last one carrying the usage.
+        """
+        header = {"id": completion["id"], "object": "chat.completion.chunk",
+                  "created": completion["created"], "model": completion["model"]}
+        choice = completion["choices"][0]
+        fragments = []
+        replay_deltas(ChatCompletion.model_validate(completion), fragments.append)
+        chunks = [{**header, "choices": [{"index": 0, "delta": {"role": "assistant", "content": fragment},
+                                          "finish_reason": None}]} for fragment in fragments]
+        chunks.append({**header, "choices": [{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}]})
+        chunks.append({**header, "choices": [], "usage": completion.get("usage")})
+        return chunks
+
+    def handle(self, path: str, body: Dict) -> (int, Dict):
+        """
+        Answers one request.
+
+        Args:
+            path (str): The request path.
+            body (dict): The JSON request body.
+
+        Returns:
+            tuple: The HTTP status and the JSON response body.
+        """
+        if path.endswith("/chat/completions"):
+            messages = body["messages"]
+            response_format = body.get("response_format") or {}
+            _format = {"json_object": "json", "json_schema": response_format.get("json_schema")}.get(
+                response_format.get("type"), "text")
+            completion = self.provider.gptText(
+                messages[0]["content"], message=messages[1:], tools=body.get("tools"),
+                tool_choice=body.get("tool_choice"), _format=_format
+            )
+            return 200, completion.model_dump(mode="json")
+        if path.endswith("/embeddings"):
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            data = [{"object": "embedding", "index": i, "embedding": self.provider.embeddings(text)}
+                    for i, text in enumerate(inputs)]
+            return 200, {"object": "list", "data": data, "model": body.get("model"),
+                         "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+        return 404, {"error": {"message": f"Unknown path {path}", "type": "invalid_request_error"}}
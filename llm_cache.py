@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache for LLM responses.
+
+Author: andreadesogus
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+def _jsonable(obj):
+    """
+    Converts objects that json cannot serialize, such as the assistant
+    messages returned by the OpenAI client, into plain values.
+    """
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    return str(obj)
+
+
+def request_key(kind: str, request: Dict) -> str:
+    """
+    Computes the cache key of a request.
+
+    Args:
+        kind (str): The kind of request, e.g. "chat" or "embeddings".
+        request (dict): The full request parameters (model, messages, tools, ...).
+
+    Returns:
+        str: The SHA-256 hex digest of the canonical request.
+    """
+    payload = json.dumps({"kind": kind, "request": request}, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheBackend:
+    """
+    Base class of the cache tiers. Values are JSON-serializable dictionaries.
+    """
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Returns the cached value for key, or None on a miss.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+    def set(self, key: str, value: Dict):
+        """
+        Stores value under key.
+        """
+        raise NotImplementedError("This method should be overridden by subclasses")
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-memory LRU cache.
+
+    Attributes:
+        max_entries (int): Maximum number of entries kept; the least recently used are evicted.
+        ttl (Optional[float]): Time to live of an entry in seconds, None for no expiry.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict, created: Optional[float] = None):
+        """
+        Stores value under key.
+
+        Args:
+            key (str): The cache key.
+            value (dict): The value.
+            created (float): When the value was first cached, time.time(), so that a
+                value promoted from another tier keeps its age; now by default.
+        """
+        with self._lock:
+            self._entries[key] = (created if created is not None else time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache stored in a SQLite database.
+
+    The cache counts its entries, so that the least recently used ones are
+    evicted, and expired ones purged, only when a write takes it over
+    max_entries. Expired entries are also dropped when read. The count is
+    per SQLiteCache: processes sharing a database each bound their own writes.
+
+    Attributes:
+        path (str): Path of the database file.
+        max_entries (int): Maximum number of entries kept; the least recently used are evicted.
+        ttl (Optional[float]): Time to live of an entry in seconds, None for no expiry.
+    """
+    def __init__(self, path: str, max_entries: int = 100000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self.entry(key)
+        return entry[0] if entry is not None else None
+
+    def entry(self, key: str) -> Optional[Tuple[Dict, float]]:
+        """
+        Returns the cached value for key and when it was cached, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            with self._conn:
+                if self.ttl is not None and now - created > self.ttl:
+                    self._size -= self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,)).rowcount
+                    return None
+                self._conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value), created
+
+    def set(self, key: str, value: Dict):
+        now = time.time()
+        with self._lock, self._conn:
+            exists = self._conn.execute("SELECT 1 FROM llm_cache WHERE key = ?", (key,)).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            if not exists:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """
+        Purges the expired entries, then the least recently used ones over max_entries.
+        """
+        if self.ttl is not None:
+            self._size -= self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)).rowcount
+        if self._size > self.max_entries:
+            self._size -= self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed ASC LIMIT ?)",
+                (self._size - self.max_entries,)
+            ).rowcount
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self._conn.close()
+
+
+class TieredCache(CacheBackend):
+    """
+    Two-tier cache: a fast in-memory LRU in front of a persistent SQLite store.
+    Disk hits are promoted to memory with their age, so that the memory TTL
+    counts from when they were first cached, not from the promotion.
+
+    Attributes:
+        memory (MemoryCache): The in-memory tier.
+        disk (Optional[SQLiteCache]): The on-disk tier.
+    """
+    def __init__(self, memory: Optional[MemoryCache] = None, disk: Optional[SQLiteCache] = None):
+        self.memory = memory if memory is not None else MemoryCache()
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            entry = self.disk.entry(key)
+            if entry is not None:
+                value, created = entry
+                self.memory.set(key, value, created)
+        return value
+
+    def set(self, key: str, value: Dict):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded conversation memory for the supervisor.
+
+Author: andreadesogus
+"""
+
+import json
+from typing import Callable, Dict, List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of a text (about four characters per token).
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated token count.
+    """
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def message_tokens(message) -> int:
+    """
+    Estimates the number of tokens of a chat message, including its overhead.
+
+    Args:
+        message: A chat message, either a dict or a client message object.
+
+    Returns:
+        int: The estimated token count.
+    """
+    if isinstance(message, dict):
+        content = message.get("content") or ""
+    else:
+        content = getattr(message, "content", None) or ""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return estimate_tokens(content) + 4
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """
+    Shortens a text to about max_tokens tokens, keeping its head and tail.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): The token budget.
+
+    Returns:
+        str: The text itself if it fits, otherwise its head and tail around an ellipsis.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    chars = max(max_tokens * 4, 8)
+    head = chars * 2 // 3
+    tail = chars - head
+    return f"{text[:head]} [...] {text[-tail:]}" if tail else f"{text[:head]} [...]"
+
+
+def extractive_summary(digest: str, messages: List[Dict], max_tokens: int = 800, line_tokens: int = 60) -> str:
+    """
+    Default summarizer: appends a shortened line per evicted message to the
+    digest and drops the oldest lines when the digest exceeds its budget.
+    It makes no LLM call.
+
+    Args:
+        digest (str): The current digest.
+        messages (list): The messages leaving the window, oldest first.
+        max_tokens (int): The digest budget.
+        line_tokens (int): The budget of each message line.
+
+    Returns:
+        str: The updated digest.
+    """
+    lines = digest.splitlines() if digest else []
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+        if content:
+            lines.append("- " + truncate(" ".join(str(content).split()), line_tokens))
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class LLMSummarizer:
+    """
+    Summarizer that asks the LLM to fold evicted turns into the rolling digest.
+
+    Attributes:
+        ai (LLMProvider): The LLM provider, typically a cheaper model than the supervisor's.
+        max_tokens (int): The digest budget.
+    """
+    def __init__(self, ai, max_tokens: int = 800):
+        self.ai = ai
+        self.max_tokens = max_tokens
+
+    def __call__(self, digest: str, messages: List[Dict]) -> str:
+        transcript = "\n".join(
+            (m.get("content") if isinstance(m, dict) else getattr(m, "content", None)) or "" for m in messages
+        )
+        system = (
+            "You maintain the running summary of a conversation between an AI manager and its team of agents. "
+            f"Merge the new turns into the existing summary in at most {self.max_tokens * 3 // 4} words. "
+            "Keep every decision, finding, figure and open issue; drop pleasantries and repetitions. "
+            "Answer with the summary only."
+        )
+        question = f"Existing summary:\n{digest or '(empty)'}\n\nNew turns:\n{transcript}"
+        response = self.ai.gptText(system=system, question=question)
+        return truncate(response.choices[0].message.content or "", self.max_tokens)
+
+
+SUMMARY_HEADER = "Summary of the earlier discussion:\n"
+
+
+class ConversationMemory:
+    """
+    Supervisor memory with a pinned user question, a rolling digest of older
+    turns and a token-aware sliding window of recent turns, so the supervisor
+    prompt stays roughly constant in size however long the run.
+
+    Attributes:
+        max_tokens (int): Budget of the rendered messages (question, digest and window).
+        keep_last (int): Minimum number of recent messages always kept; the longest are
+            shortened to a common size when together they do not fit the budget.
+        digest_tokens (int): Budget of the digest.
+        summarizer (Callable): Folds evicted messages into the digest,
+            called as summarizer(digest, messages).
+        render (Callable): Expands the references a message holds, e.g. to the agents'
+            outputs, see context_view.OutputStore; messages are sent, measured and
+            summarized as rendered.
+        question (Optional[str]): The pinned user question.
+        digest (str): Summary of the evicted turns.
+        status (str): Short state line sent with the digest, e.g. which agents already answered.
+        window (list): The recent messages, oldest first.
+    """
+    def __init__(self, max_tokens: int = 4000, keep_last: int = 4, digest_tokens: int = 800,
+                 summarizer: Optional[Callable[[str, List[Dict]], str]] = None,
+                 render: Optional[Callable[[str], str]] = None):
+        self.max_tokens = max_tokens
+        self.keep_last = keep_last
+        self.digest_tokens = digest_tokens
+        self.summarizer = summarizer or (lambda digest, messages: extractive_summary(digest, messages, digest_tokens))
+        self.render = render
+        self.question = None
+        self.digest = ""
+        self.status = ""
+        self.window = []
+
+    def pin(self, question: str):
+        """
+        Pins the user question, which is always sent first and never evicted.
+        """
+        self.question = question
+
+    def add(self, messages: List[Dict]):
+        """
+        Appends messages to the window, compacting older ones if over budget.
+        A single message larger than half the budget is shortened first.
+        """
+        for message in messages:
+            rendered = self._rendered(message)
+            content = rendered.get('content') if isinstance(rendered, dict) else None
+            if isinstance(content, str) and estimate_tokens(content) > self.max_tokens // 2:
+                message = {**rendered, 'content': truncate(content, self.max_tokens // 2)}
+            self.window.append(message)
+        self._compact()
+
+    def inline(self, reference: str):
+        """
+        Replaces reference with its current rendering in the window, before
+        what it refers to changes.
+        """
+        if self.render is None:
+            return
+        for i, message in enumerate(self.window):
+            content = message.get('content') if isinstance(message, dict) else None
+            if isinstance(content, str) and reference in content:
+                self.window[i] = {**message, 'content': content.replace(reference, self.render(reference))}
+
+    def _rendered(self, message):
+        """
+        Returns message with its references expanded.
+        """
+        content = message.get('content') if isinstance(message, dict) else None
+        if self.render is None or not isinstance(content, str):
+            return message
+        rendered = self.render(content)
+        return message if rendered == content else {**message, 'content': rendered}
+
+    def messages(self) -> List[Dict]:
+        """
+        Renders the memory as chat messages.
+
+        Returns:
+            list: The pinned question, the digest and the window.
+        """
+        rendered = []
+        if self.question:
+            rendered.append({'role': 'user', 'content': self.question})
+        if self.digest:
+            summary = f"{SUMMARY_HEADER}{self.digest}"
+            if self.status:
+                summary += f"\n{self.status}"
+            rendered.append({'role': 'assistant', 'content': summary})
+        return rendered + [self._rendered(m) for m in self.window]
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the state of the memory, JSON-serializable, e.g. for a checkpoint.
+        The window keeps its references; the summarizer and render are not included.
+        """
+        return {
+            "max_tokens": self.max_tokens,
+            "keep_last": self.keep_last,
+            "digest_tokens": self.digest_tokens,
+            "question": self.question,
+            "digest": self.digest,
+            "status": self.status,
+            "window": [m if isinstance(m, dict) else m.model_dump(exclude_none=True) for m in self.window],
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict, summarizer: Optional[Callable[[str, List[Dict]], str]] = None,
+                  render: Optional[Callable[[str], str]] = None) -> "ConversationMemory":
+        """
+        Rebuilds a memory saved with to_dict.
+
+        Args:
+            state (dict): The saved state.
+            summarizer (Callable): The summarizer, see ConversationMemory.
+            render (Callable): Expands the references of the messages, see ConversationMemory.
+
+        Returns:
+            ConversationMemory: The memory.
+        """
+        memory = cls(max_tokens=state["max_tokens"], keep_last=state["keep_last"],
+                     digest_tokens=state["digest_tokens"], summarizer=summarizer, render=render)
+        memory.question = state["question"]
+        memory.digest = state["digest"]
+        memory.status = state["status"]
+        memory.window = list(state["window"])
+        return memory
+
+    def tokens(self) -> int:
+        """
+        Returns the estimated size of the rendered messages.
+        """
+        return sum(message_tokens(m) for m in self.messages())
+
+    def _compact(self):
+        """
+        Moves the oldest messages into the digest until the memory fits its
+        budget, then shortens the kept messages if they still do not fit.
+        """
+        evicted = []
+        # Reserve room for the digest message, whose digest grows up to digest_tokens
+        fixed = (message_tokens({'content': self.question}) + message_tokens({'content': SUMMARY_HEADER + "\n"})
+                 + estimate_tokens(self.status) + self.digest_tokens)
+        window_tokens = sum(message_tokens(self._rendered(m)) for m in self.window)
+        while len(self.window) > self.keep_last and fixed + window_tokens > self.max_tokens:
+            message = self._rendered(self.window.pop(0))
+            window_tokens -= message_tokens(message)
+            evicted.append(message)
+        if evicted:
+            self.digest = self.summarizer(self.digest, evicted)
+        if fixed + window_tokens > self.max_tokens:
+            self._shorten(self.max_tokens - fixed)
+
+    def _shorten(self, budget: int):
+        """
+        Shortens the longest messages of the window to a common size, so
+        that the window fits budget tokens. A shortened message keeps its
+        rendering, not its references.
+        """
+        window = [self._rendered(m) for m in self.window]
+        positions = [i for i, m in enumerate(window) if isinstance(m, dict) and isinstance(m.get('content'), str)]
+        budget -= sum(message_tokens(m) for i, m in enumerate(window) if i not in positions)
+        sizes = sorted(message_tokens(window[i]) for i in positions)
+        for count, size in enumerate(sizes):
+            cap = budget // (len(sizes) - count)
+            if size > cap:
+                break
+            budget -= size
+        else:
+            return
+        for i in positions:
+            message = window[i]
+            if message_tokens(message) > cap:
+                # A message costs four tokens more than its content, truncate keeps two more for the ellipsis
+                self.window[i] = {**message, 'content': truncate(message['content'], max(cap - 6, 0))}
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Token and latency accounting for supervision runs, with per-run budgets.
+
+Author: andreadesogus
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+# The tracker of the run in progress and the tags of the current call site.
+# Context variables follow asyncio tasks and contextvars.copy_context(), so
+# concurrent runs and thread-pool fan-outs are accounted separately.
+_current_tracker = ContextVar("usage_tracker", default=None)
+_current_scope = ContextVar("usage_scope", default={})
+
+
+class RunBudget(BaseModel):
+    """
+    Hard limits for a single supervision run. None means unlimited.
+
+    Attributes:
+        max_tokens (Optional[int]): Maximum prompt + completion tokens.
+        max_calls (Optional[int]): Maximum number of LLM calls; cache hits are free.
+        max_wall_time (Optional[float]): Maximum run duration, in seconds.
+    """
+    max_tokens: Optional[int] = None
+    max_calls: Optional[int] = None
+    max_wall_time: Optional[float] = None
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised before an LLM call when the run has exhausted its budget.
+    """
+    pass
+
+
+class CallRecord(BaseModel):
+    """
+    Usage of a single LLM call.
+
+    Attributes:
+        role (str): The agent role, or "supervisor".
+        iteration (Optional[int]): The supervisor iteration.
+        retry (int): The validation retry of the supervisor call.
+        prompt_tokens (int): Prompt tokens reported by the provider.
+        completion_tokens (int): Completion tokens reported by the provider.
+        latency (float): Call duration, in seconds.
+        cached (bool): Whether the response came from the response cache.
+        speculation (Optional[int]): The iteration whose speculative agent call made
+            this call, see Supervisor.speculative.
+    """
+    role: Optional[str] = None
+    iteration: Optional[int] = None
+    retry: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    cached: bool = False
+    speculation: Optional[int] = None
+
+
+class UsageTracker:
+    """
+    Collects the CallRecords of one run and enforces its RunBudget.
+
+    Attributes:
+        budget (RunBudget): The limits of the run.
+        records (List[CallRecord]): The calls made so far.
+        started (float): The run start time, from time.perf_counter().
+        stopped_reason (Optional[str]): Why the run was stopped early, if it was.
+        speculations (Dict[int, bool]): Whether the speculative agent call of each
+            iteration was committed (True) or discarded (False).
+    """
+    def __init__(self, budget: Optional[RunBudget] = None):
+        self.budget = budget or RunBudget()
+        self.records = []
+        self.started = time.perf_counter()
+        self.stopped_reason = None
+        self.speculations = {}
+        self._lock = threading.Lock()
+
+    def record(self, record: CallRecord):
+        """
+        Adds a call to the run.
+        """
+        with self._lock:
+            self.records.append(record)
+
+    def record_speculation(self, speculation: int, hit: bool):
+        """
+        Records whether the speculative agent call of an iteration was committed.
+        """
+        with self._lock:
+            self.speculations[speculation] = hit
+
+    def check(self):
+        """
+        Raises BudgetExceeded if the run has used up any of its limits.
+        """
+        budget = self.budget
+        reason = None
+        with self._lock:
+            calls = sum(1 for r in self.records if not r.cached)
+            tokens = sum(r.prompt_tokens + r.completion_tokens for r in self.records if not r.cached)
+        if budget.max_calls is not None and calls >= budget.max_calls:
+            reason = f"call budget of {budget.max_calls} exhausted"
+        elif budget.max_tokens is not None and tokens >= budget.max_tokens:
+            reason = f"token budget of {budget.max_tokens} exhausted"
+        elif budget.max_wall_time is not None and time.perf_counter() - self.started >= budget.max_wall_time:
+            reason = f"wall time budget of {budget.max_wall_time}s exhausted"
+        if reason:
+            self.stopped_reason = reason
+            raise BudgetExceeded(reason)
+
+    def report(self) -> Dict:
+        """
+        Summarises the run.
+
+        Returns:
+            dict: Totals, plus tokens, calls and latency grouped by role,
+            by iteration and by validation retry, and the speculation hit rate
+            with the tokens spent on discarded speculative calls.
+        """
+        with self._lock:
+            records = list(self.records)
+            speculations = dict(self.speculations)
+
+        def group(key):
+            groups = {}
+            for r in records:
+                g = groups.setdefault(getattr(r, key), {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency": 0.0})
+                g["calls"] += 1
+                g["prompt_tokens"] += r.prompt_tokens
+                g["completion_tokens"] += r.completion_tokens
+                g["latency"] += r.latency
+            return groups
+
+        return {
+            "calls": len(records),
+            "cached_calls": sum(1 for r in records if r.cached),
+            "prompt_tokens": sum(r.prompt_tokens for r in records),
+            "completion_tokens": sum(r.completion_tokens for r in records),
+            "llm_latency": sum(r.latency for r in records),
+            "wall_time": time.perf_counter() - self.started,
+            "stopped_reason": self.stopped_reason,
+            "by_role": group("role"),
+            "by_iteration": group("iteration"),
+            "by_retry": group("retry"),
+            "speculation": self._speculation_report(records, speculations),
+        }
+
+    @staticmethod
+    def _speculation_report(records: List[CallRecord], speculations: Dict[int, bool]) -> Dict:
+        """
+        Hit rate of the speculative agent calls and the calls they wasted. A
+        speculation left unresolved by an early stop counts as discarded.
+        """
+        hits = sum(1 for hit in speculations.values() if hit)
+        wasted = [r for r in records if r.speculation is not None and not speculations.get(r.speculation, False)]
+        return {
+            "attempts": len(speculations),
+            "hits": hits,
+            "hit_rate": hits / len(speculations) if speculations else None,
+            "wasted_calls": sum(1 for r in wasted if not r.cached),
+            "wasted_tokens": sum(r.prompt_tokens + r.completion_tokens for r in wasted if not r.cached),
+        }
+
+
+@contextmanager
+def track_usage(tracker: UsageTracker):
+    """
+    Makes tracker the accounting target of the LLM calls made in this context.
+    """
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+@contextmanager
+def usage_scope(**tags):
+    """
+    Tags the LLM calls made in this context, e.g. usage_scope(role="supervisor", retry=1).
+    """
+    token = _current_scope.set({**_current_scope.get(), **tags})
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
+
+
+def current_scope() -> Dict:
+    """
+    Returns the tags of the current context, see usage_scope.
+    """
+    return _current_scope.get()
+
+
+def check_budget():
+    """
+    Raises BudgetExceeded if the current run has used up its budget.
+    Providers call this before every request.
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.check()
+
+
+def record_completion(completion, latency: float, cached: bool = False):
+    """
+    Records a completion against the current run, tagged with the current scope.
+
+    Args:
+        completion: The ChatCompletion returned by the provider.
+        latency (float): Call duration, in seconds.
+        cached (bool): Whether the response came from the response cache.
+    """
+    tracker = _current_tracker.get()
+    if tracker is None:
+        return
+    usage = getattr(completion, "usage", None)
+    scope = _current_scope.get()
+    tracker.record(CallRecord(
+        role=scope.get("role"),
+        iteration=scope.get("iteration"),
+        retry=scope.get("retry", 0),
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        latency=latency,
+        cached=cached,
+        speculation=scope.get("speculation"),
+    ))
+
+
+def record_speculation(speculation: int, hit: bool):
+    """
+    Records against the current run whether the speculative agent call of an
+    iteration was committed or discarded.
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.record_speculation(speculation, hit)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Content-hash cache for derived texts, e.g. the shortened agent outputs of
+context_view.ContextViews.
+
+Author: andreadesogus
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+def content_hash(*parts) -> str:
+    """
+    Hashes the given JSON-serializable parts.
+
+    Returns:
+        str: The SHA-256 hex digest of the canonical JSON encoding.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    Bounded cache of derived artifacts. Entries are keyed by a hash of their
+    inputs, so a change to an input yields a new entry instead of a stale one.
+
+    Attributes:
+        max_entries (int): Maximum number of entries kept.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that built a new entry.
+    """
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, namespace: str, key: str, build: Callable[[], Any]) -> Any:
+        """
+        Returns the entry for (namespace, key), building it on a miss.
+
+        Args:
+            namespace (str): The kind of artifact, e.g. "context_view".
+            key (str): The content hash of the artifact's inputs.
+            build (Callable): Builds the artifact.
+
+        Returns:
+            Any: The cached or newly built artifact. Callers must not mutate it.
+        """
+        entry_key = (namespace, key)
+        with self._lock:
+            if entry_key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(entry_key)
+                return self._entries[entry_key]
+        value = build()
+        with self._lock:
+            self.misses += 1
+            self._entries[entry_key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """
+        Removes every entry and resets the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Client-side rate limiting, backoff and circuit breaking for LLM calls, shared
+by every supervision of the process.
+
+Author: andreadesogus
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most
+    capacity tokens (a minute's worth by default).
+
+    Attributes:
+        rate_per_minute (float): The refill rate.
+        capacity (float): The bucket size, i.e. the largest burst.
+    """
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_minute / 60.0)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes amount tokens, going into debt if needed.
+
+        Args:
+            amount (float): The tokens needed; more than capacity is clipped to capacity.
+
+        Returns:
+            float: How long the caller must wait before using the tokens, in seconds.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60.0 / self.rate_per_minute
+
+    def refund(self, amount: float):
+        """
+        Gives back tokens, e.g. when a call used fewer tokens than estimated.
+        A negative amount takes more.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits shared by concurrent
+    callers, plus a common pause set when the server answers 429, so callers
+    stop together instead of each discovering the limit on its own.
+
+    Attributes:
+        requests (Optional[TokenBucket]): The RPM bucket; None means unlimited.
+        tokens (Optional[TokenBucket]): The TPM bucket; None means unlimited.
+    """
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, burst_seconds: float = 60.0):
+        self.requests = None
+        self.tokens = None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.configure(rpm, tpm, burst_seconds)
+
+    def configure(self, rpm: Optional[float] = None, tpm: Optional[float] = None, burst_seconds: float = 60.0):
+        """
+        Sets the limits, e.g. to the ones of the organisation's tier.
+
+        Args:
+            rpm (Optional[float]): Requests per minute; None means unlimited.
+            tpm (Optional[float]): Tokens per minute; None means unlimited.
+            burst_seconds (float): How many seconds of quota may be spent at once;
+                lower values spread the requests more evenly.
+        """
+        self.requests = TokenBucket(rpm, rpm * burst_seconds / 60.0) if rpm else None
+        self.tokens = TokenBucket(tpm, tpm * burst_seconds / 60.0) if tpm else None
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self._lock:
+            return max(wait, self._paused_until - time.monotonic())
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Blocks until a request of about tokens tokens may be sent.
+
+        Returns:
+            float: The time waited, in seconds.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """
+        Awaits until a request of about tokens tokens may be sent.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return max(wait, 0.0)
+
+    def settle(self, estimated: int, actual: int):
+        """
+        Corrects the TPM bucket once the real usage of a call is known.
+        """
+        if self.tokens is not None and actual:
+            self.tokens.refund(estimated - actual)
+
+    def refund(self, tokens: int):
+        """
+        Gives back the TPM reservation of a request that failed before any
+        usage was known, e.g. a 429, so that its retry does not pay twice.
+        """
+        if self.tokens is not None and tokens:
+            self.tokens.refund(tokens)
+
+    def pause(self, seconds: float):
+        """
+        Holds every caller for seconds, e.g. after a 429 with Retry-After.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class Backoff:
+    """
+    Exponential backoff with full jitter: attempt n waits a random time
+    between 0 and min(max_delay, base * factor ** n), or the server's
+    Retry-After when it gives one.
+
+    Attributes:
+        base (float): The first delay bound, in seconds.
+        factor (float): The growth of the bound per attempt.
+        max_delay (float): The largest delay.
+    """
+    def __init__(self, base: float = 0.5, factor: float = 2.0, max_delay: float = 30.0):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Returns how long to wait before retry number attempt (0-based).
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base * self.factor ** attempt))
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a backend that keeps failing.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a backend after failure_threshold consecutive failures,
+    then lets a single trial call through after reset_timeout seconds: its
+    success closes the circuit, its failure opens it again.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Time before a trial call, in seconds.
+        state (str): "closed", "open" or "half-open".
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError if calls are currently refused.
+        """
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened < self.reset_timeout:
+                    raise CircuitOpenError(f"Circuit open after {self._failures} consecutive failures")
+                self.state = "half-open"
+            elif self.state == "half-open":
+                raise CircuitOpenError("Circuit half-open, a trial call is in progress")
+
+    def admits(self) -> bool:
+        """
+        Whether before_call would let a call through now, without taking the
+        trial call of a half-open circuit.
+        """
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self._opened >= self.reset_timeout
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def release(self):
+        """
+        Reopens a half-open circuit whose trial call ended without an answer,
+        e.g. cancelled, so that another trial is let through after reset_timeout.
+        """
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+                self._opened = time.monotonic()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logging.warning(f"Opening circuit after {self._failures} consecutive failures")
+                self.state = "open"
+                self._opened = time.monotonic()
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Reads the Retry-After (or retry-after-ms) header of an API error.
+
+    Returns:
+        Optional[float]: The requested delay in seconds, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def is_api_error(error: Exception, *names: str) -> bool:
+    """
+    Whether error is one of the named openai exceptions. openai is looked up
+    in sys.modules, not imported: if no client has loaded it, no call raised one.
+    """
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, tuple(getattr(openai, name) for name in names))
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """
+    Whether an API error is a 429.
+    """
+    return is_api_error(error, "RateLimitError")
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether an API error is transient: rate limits, timeouts, connection errors and 5xx.
+    """
+    return is_api_error(error, "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError")
+
+
+class RetryPolicy:
+    """
+    Wraps provider calls with the shared rate limiter, retries of transient
+    errors with backoff, and a circuit breaker.
+
+    Attributes:
+        limiter (RateLimiter): The limits shared with the other providers.
+        backoff (Backoff): The delays between attempts.
+        breaker (CircuitBreaker): The circuit of the backend.
+        max_retries (int): Retries after the first attempt.
+        retries (int): Number of retries made so far.
+        throttled (int): Number of 429 responses received so far.
+    """
+    def __init__(self, limiter: Optional[RateLimiter] = None, backoff: Optional[Backoff] = None,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = 5):
+        self.limiter = limiter if limiter is not None else shared_limiter
+        self.backoff = backoff or Backoff()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.retries = 0
+        self.throttled = 0
+
+    def _failed(self, error: Exception, attempt: int) -> float:
+        """
+        Records a failed attempt and returns the delay before the next one,
+        re-raising the error when it should not be retried.
+        """
+        if not is_retryable(error):
+            # The backend answered, e.g. with a 400: it is up, the request is at fault
+            self.breaker.record_success()
+            raise error
+        if is_rate_limit(error):
+            # Throttling is a quota matter and a live answer, not a sign the backend is down
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        requested = retry_after(error)
+        delay = self.backoff.delay(attempt, requested)
+        if is_rate_limit(error):
+            self.throttled += 1
+            # Everyone sharing the quota waits, not only this caller
+            self.limiter.pause(delay)
+        self.retries += 1
+        logging.warning(f"Retrying in {delay:.2f}s after {type(error).__name__} ({attempt + 1}/{self.max_retries})")
+        return delay
+
+    def call(self, send: Callable, tokens: int = 0, usage: Callable = None):
+        """
+        Sends a request through the policy.
+
+        Args:
+            send (Callable): Makes the request.
+            tokens (int): The estimated tokens of the request, for the TPM bucket.
+            usage (Callable): Returns the actual tokens used, from the response.
+
+        Returns:
+            Any: The response.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            reserved = False
+            try:
+                self.limiter.acquire(tokens)
+                reserved = True
+                response = send()
+            except Exception as e:
+                if reserved:
+                    self.limiter.refund(tokens)
+                time.sleep(self._failed(e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # Interrupted: free the trial slot of a half-open circuit
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            if usage is not None:
+                self.limiter.settle(tokens, usage(response))
+            return response
+
+    async def acall(self, send: Callable, tokens: int = 0, usage: Callable = None):
+        """
+        Awaitable counterpart of call; send returns an awaitable.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            reserved = False
+            try:
+                await self.limiter.aacquire(tokens)
+                reserved = True
+                response = await send()
+            except Exception as e:
+                if reserved:
+                    self.limiter.refund(tokens)
+                await asyncio.sleep(self._failed(e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled: free the trial slot of a half-open circuit
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            if usage is not None:
+                self.limiter.settle(tokens, usage(response))
+            return response
+
+
+# Process-wide limits, unlimited until configured, e.g. shared_limiter.configure(rpm=500, tpm=30000)
+shared_limiter = RateLimiter()
+
+# Backoff for retries that do not involve the API, such as invalid outputs or failing tools
+default_backoff = Backoff(base=0.25, max_delay=4.0)
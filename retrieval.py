@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked embedding index over documents, so agents receive the relevant
+passages of a file instead of the whole file.
+
+Author: andreadesogus
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from basetool import CustomTool
+from baseLLM import LLMProvider
+from memory import estimate_tokens
+from tool_cache import file_fingerprint
+from vector_store import EmbeddingStore, text_hash
+
+
+def chunk_text(text: str, chunk_tokens: int = 300, overlap_tokens: int = 40) -> List[str]:
+    """
+    Splits a text into chunks of about chunk_tokens tokens. Paragraphs are
+    kept whole when they fit, so clauses are rarely cut; longer paragraphs
+    are split on whitespace with overlap_tokens tokens of overlap.
+
+    Args:
+        text (str): The text.
+        chunk_tokens (int): The target chunk size.
+        overlap_tokens (int): The overlap between the pieces of a long paragraph.
+
+    Returns:
+        list: The chunks, in document order.
+    """
+    chunk_chars = max(chunk_tokens * 4, 16)
+    overlap_chars = min(overlap_tokens * 4, chunk_chars // 2)
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        start = 0
+        while len(paragraph) - start > chunk_chars:
+            end = paragraph.rfind(" ", start + chunk_chars // 2, start + chunk_chars)
+            end = end if end > start else start + chunk_chars
+            pieces.append(paragraph[start:end].strip())
+            start = max(end - overlap_chars, start + 1)
+        pieces.append(paragraph[start:].strip())
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and estimate_tokens(current) + estimate_tokens(piece) > chunk_tokens:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class DocumentIndex:
+    """
+    Embedding index of document chunks. Vectors live in an EmbeddingStore
+    under directory, memory-mapped for search, so the index survives restarts,
+    identical chunks are embedded once and large corpora need not fit in
+    memory. A file is re-indexed only when its path, modification time or
+    size change. The chunks of its previous version are then superseded, and
+    dropped, with their vectors, once they outnumber the current chunks.
+
+    Attributes:
+        ai (LLMProvider): The provider computing the embeddings.
+        directory (str): Where the vectors and the metadata are stored.
+        chunk_tokens (int): The target chunk size.
+        overlap_tokens (int): The overlap between the pieces of a long paragraph.
+        batch_size (int): Number of chunks per embeddings request.
+        max_workers (int): Number of embeddings requests in flight.
+        store (EmbeddingStore): The chunk vectors.
+        chunks (list): Text, source and store row of every chunk.
+        documents (dict): Fingerprint and chunks of every indexed source.
+    """
+    META_FILE = "index.json"
+
+    def __init__(self, ai: LLMProvider, directory: str, chunk_tokens: int = 300, overlap_tokens: int = 40,
+                 batch_size: int = 256, max_workers: int = 4):
+        self.ai = ai
+        self.directory = directory
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.chunks = []
+        self.documents = {}
+        # Keys being embedded by add_text, which compaction must keep
+        self._pending = Counter()
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self.store = EmbeddingStore(os.path.join(directory, "embeddings"), model=ai.embedding_model,
+                                    dimensions=ai.dimensions)
+        self._load()
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, self.META_FILE)
+
+    def _load(self):
+        """
+        Reads the metadata written by a previous session, if any.
+        """
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        # Rows are looked up by text, as a compaction may have moved them since the metadata was written
+        chunks = [chunk for chunk in meta["chunks"] if chunk["source"] is not None]
+        rows = self.store.rows(text_hash(chunk["text"]) for chunk in chunks)
+        if len(rows) < len({text_hash(chunk["text"]) for chunk in chunks}):
+            logging.warning(f"Index in {self.directory} refers to missing vectors, rebuilding it.")
+            return
+        for chunk in chunks:
+            chunk["row"] = rows[text_hash(chunk["text"])]
+        self.chunks = meta["chunks"]
+        self.documents = meta["documents"]
+
+    def _save(self):
+        """
+        Writes the metadata; the vectors are already on disk.
+        """
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"chunks": self.chunks, "documents": self.documents}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def add_text(self, text: str, source: str, fingerprint: Optional[List] = None) -> int:
+        """
+        Chunks, embeds and adds a text, replacing a previous version of the same source.
+
+        Args:
+            text (str): The document text.
+            source (str): The document identifier, e.g. its path.
+            fingerprint (list): The version of the source, see tool_cache.file_fingerprint.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        chunks = chunk_text(text, self.chunk_tokens, self.overlap_tokens)
+        keys = [text_hash(chunk) for chunk in chunks]
+        with self._lock:
+            self._pending.update(keys)
+        try:
+            # Chunks already embedded, e.g. unchanged passages of a new version, are not sent again
+            self.ai.embed_many(chunks, batch_size=self.batch_size, max_workers=self.max_workers, store=self.store)
+            with self._lock:
+                rows = self.store.rows(keys)
+                # Chunks of a previous version no longer belong to the source
+                for position in self.documents.get(source, {}).get("chunks", []):
+                    self.chunks[position]["source"] = None
+                start = len(self.chunks)
+                self.chunks.extend({"source": source, "text": chunk, "row": rows[key]} for chunk, key in zip(chunks, keys))
+                self.documents[source] = {"fingerprint": fingerprint, "chunks": list(range(start, len(self.chunks)))}
+                current = sum(len(document["chunks"]) for document in self.documents.values())
+                if len(self.chunks) - current > current:
+                    self.compact()
+                else:
+                    self._save()
+        finally:
+            with self._lock:
+                self._pending.subtract(keys)
+                self._pending = +self._pending
+        logging.info(f"Indexed {len(chunks)} chunks of {source}")
+        return len(chunks)
+
+    def compact(self) -> int:
+        """
+        Drops the superseded chunks, and their vectors unless a current chunk
+        or a text being indexed shares them.
+
+        Returns:
+            int: The number of vectors dropped from the store.
+        """
+        with self._lock:
+            chunks = [chunk for chunk in self.chunks if chunk["source"] is not None]
+            keys = [text_hash(chunk["text"]) for chunk in chunks]
+            dropped = self.store.compact(set(keys) | set(self._pending))
+            rows = self.store.rows(keys)
+            positions = {}
+            for position, (chunk, key) in enumerate(zip(chunks, keys)):
+                chunk["row"] = rows[key]
+                positions.setdefault(chunk["source"], []).append(position)
+            self.chunks = chunks
+            for source, document in self.documents.items():
+                document["chunks"] = positions.get(source, [])
+            self._save()
+            return dropped
+
+    def add_file(self, path: str) -> int:
+        """
+        Indexes a text file unless its current version is already indexed.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            int: The number of chunks added, 0 if the file was up to date.
+        """
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            raise FileNotFoundError(path)
+        source = fingerprint[0]
+        with self._lock:
+            known = self.documents.get(source)
+            if known is not None and known["fingerprint"] == list(fingerprint):
+                return 0
+        with open(path, "r") as f:
+            text = f.read()
+        return self.add_text(text, source, list(fingerprint))
+
+    def search(self, query: str, k: int = 5, source: Optional[str] = None) -> List[Dict]:
+        """
+        Returns the chunks most similar to a query.
+
+        Args:
+            query (str): The query.
+            k (int): The number of chunks.
+            source (str): Restrict the search to one source.
+
+        Returns:
+            list: Dicts with text, source and cosine score, best first.
+        """
+        with self._lock:
+            chunks = [chunk for chunk in self.chunks
+                      if chunk["source"] is not None and (source is None or chunk["source"] == source)]
+            if not chunks:
+                return []
+            # Copied under the lock, as a compaction moves the rows
+            vectors = self.store.vectors()[[chunk["row"] for chunk in chunks]]
+        query_vector = self.ai.embed_many([query])[0]
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        scores = (vectors @ query_vector) / np.where(norms == 0, 1, norms)
+        k = min(k, len(chunks))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [{"text": chunks[i]["text"], "source": chunks[i]["source"], "score": float(scores[i])} for i in best]
+
+    def as_tool(self, k: int = 5) -> CustomTool:
+        """
+        Wraps the index in a tool that agents call instead of reading whole files.
+
+        Args:
+            k (int): The number of passages returned per query.
+
+        Returns:
+            CustomTool: The document_search tool.
+        """
+        index = self
+
+        def document_search(filepath: str, query: str) -> str:
+            """
+            Returns the passages of a document most relevant to a query, instead of the whole document.
+
+            :param filepath: A file's path
+            :param query: What to look for in the document, e.g. "fallback clause on benchmark cessation"
+            """
+            index.add_file(filepath)
+            source = file_fingerprint(filepath)[0]
+            results = index.search(query, k=k, source=source)
+            return "\n\n".join(f"[Passage {n}, score {r['score']:.2f}]\n{r['text']}" for n, r in enumerate(results, 1))
+
+        return CustomTool(document_search)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Structured, non-blocking logging of supervision runs.
+
+Log records are put on a queue by the calling thread and formatted and
+written by a background listener, so the supervision loop never waits on
+the disk. log_event records an event name plus fields such as durations and
+sizes; the run id, agent role and iteration of the current usage_scope are
+added to every record. Bulky payloads (questions, answers, tool details)
+are only logged for the runs sampled by the payload rate.
+
+Author: andreadesogus
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from metrics import current_scope, usage_scope
+
+# Whether the current run logs its payloads
+_payloads = ContextVar("log_payloads", default=None)
+
+_listener = None
+_queue_handler = None
+_payload_rate = 0.0
+
+# Scope tags copied to the records
+SCOPE_FIELDS = ("run_id", "role", "iteration", "retry", "speculation")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: time, level, event (the
+    message) and the record's structured fields.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", None) or {})
+        return json.dumps(data, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats a record as a text line followed by its fields as key=value pairs.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        line = super().format(record)
+        return line + "".join(f" {key}={value}" for key, value in fields.items())
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler keeping the structured fields apart from the message, so
+    the listener's formatter decides the output format.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.fields = dict(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            record.fields["exc"] = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+class ScopeFilter(logging.Filter):
+    """
+    Copies the run id, role and iteration of the emitting context onto the
+    record, before it leaves the thread for the queue.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        scope = current_scope()
+        fields = {key: scope[key] for key in SCOPE_FIELDS if scope.get(key) is not None}
+        fields.update(getattr(record, "fields", None) or {})
+        record.fields = fields
+        return True
+
+
+def start_queue_logging(handler: logging.Handler, level: int = logging.INFO, payload_rate: float = 0.0):
+    """
+    Routes the root logger through a queue to handler, written by a
+    background thread. Calling it again replaces the previous handler.
+
+    Args:
+        handler (logging.Handler): Where the records end up, e.g. a FileHandler.
+        level (int): The root log level.
+        payload_rate (float): Fraction of the runs whose payloads are logged, from 0 to 1.
+    """
+    global _listener, _queue_handler, _payload_rate
+    stop_queue_logging()
+    records = queue.SimpleQueue()
+    _queue_handler = _QueueHandler(records)
+    _queue_handler.addFilter(ScopeFilter())
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    _payload_rate = payload_rate
+
+
+def stop_queue_logging():
+    """
+    Writes the queued records and stops the listener, if running.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+
+
+atexit.register(stop_queue_logging)
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def run_scope(run_id: Optional[str] = None):
+    """
+    Tags the logs and LLM calls of this context with a run id and decides,
+    once for the whole run, whether its payloads are logged.
+
+    Args:
+        run_id (str): The id to use; a new one by default.
+
+    Yields:
+        str: The run id.
+    """
+    run_id = run_id or new_run_id()
+    token = _payloads.set(_payload_rate >= 1.0 or (_payload_rate > 0.0 and random.random() < _payload_rate))
+    try:
+        with usage_scope(run_id=run_id):
+            yield run_id
+    finally:
+        _payloads.reset(token)
+
+
+def payloads_enabled() -> bool:
+    """
+    Whether the current run logs its payloads.
+    """
+    sampled = _payloads.get()
+    return _payload_rate >= 1.0 if sampled is None else sampled
+
+
+def log_event(event: str, level: int = logging.INFO, payload: Optional[Dict] = None, **fields):
+    """
+    Logs a structured event, e.g. log_event("agent_answered", duration=1.2, chars=830).
+
+    Nothing is built when the level is disabled, and payload is dropped unless
+    the run is sampled, so events are cheap to leave in the hot loop.
+
+    Args:
+        event (str): The event name.
+        level (int): The log level.
+        payload (dict): Bulky fields, such as full questions or answers.
+        **fields: Small fields, such as durations, sizes and counts.
+    """
+    if not logging.getLogger().isEnabledFor(level):
+        return
+    if payload and payloads_enabled():
+        fields.update(payload)
+    logging.log(level, event, extra={"fields": fields})
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Structured JSON replies: strict JSON schemas derived from pydantic models,
+for the providers' structured-output mode, and cheap local repair of the
+replies that still do not validate, so that a stray code fence or a "true"
+string does not cost another LLM round-trip.
+
+Author: andreadesogus
+"""
+
+import copy
+import difflib
+import json
+import re
+import typing
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL)
+
+_TRUE = {"true", "yes", "y", "1"}
+_FALSE = {"false", "no", "n", "0", "none", "null", ""}
+
+
+def _strict(node: Any):
+    """
+    Makes every object of a JSON schema strict, in place: all properties
+    required, no additional properties and no defaults. Model docstrings,
+    written for developers, are dropped from the prompt.
+    """
+    if isinstance(node, dict):
+        node.pop("default", None)
+        if node.get("type") == "object" and "properties" in node:
+            node.pop("description", None)
+            node["required"] = list(node["properties"])
+            node["additionalProperties"] = False
+        for value in node.values():
+            _strict(value)
+    elif isinstance(node, list):
+        for value in node:
+            _strict(value)
+
+
+def json_schema_format(model: Type[BaseModel], name: Optional[str] = None) -> Dict:
+    """
+    Returns the strict JSON schema of a model, as the json_schema of a
+    structured-output response_format (see baseLLM.completion_kwargs).
+
+    Optional fields stay nullable but become required, since strict mode
+    requires every property.
+
+    Args:
+        model (Type[BaseModel]): The model the replies must validate against.
+        name (str): The schema name; the model name by default.
+
+    Returns:
+        dict: {"name": ..., "strict": True, "schema": ...}.
+    """
+    schema = copy.deepcopy(model.model_json_schema())
+    _strict(schema)
+    return {"name": name or model.__name__, "strict": True, "schema": schema}
+
+
+def extract_json(text: str) -> Any:
+    """
+    Parses a JSON reply, stripping the code fences and the prose around the
+    outermost object that models sometimes add.
+
+    Raises:
+        json.JSONDecodeError: If no JSON object can be found.
+    """
+    text = (text or "").strip()
+    fenced = _FENCE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(text[start:end + 1])
+
+
+def _nullable(annotation) -> bool:
+    return type(None) in typing.get_args(annotation)
+
+
+def _model_of(annotation) -> Optional[Type[BaseModel]]:
+    """
+    Returns the model of a field such as Delegation, Optional[Delegation]
+    or List[Delegation], if any.
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        model = _model_of(arg)
+        if model is not None:
+            return model
+    return None
+
+
+def _is_bool(annotation) -> bool:
+    return annotation is bool or bool in typing.get_args(annotation)
+
+
+def coerce_to_model(data: Dict, model: Type[BaseModel], fixes: List[str], path: str = "") -> Dict:
+    """
+    Repairs the common deviations of a JSON object from a model, recursively:
+    booleans sent as strings or numbers, missing required nullable keys and nested
+    objects with the same defects.
+
+    Args:
+        data (dict): The parsed reply.
+        model (Type[BaseModel]): The model to validate against.
+        fixes (list): Receives a description of every fix made.
+        path (str): The position of data in the reply, for the fixes.
+
+    Returns:
+        dict: The repaired copy of data.
+    """
+    data = dict(data)
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if name not in data:
+            if field.is_required() and _nullable(annotation):
+                data[name] = None
+                fixes.append(f"filled {path}{name}")
+            continue
+        value = data[name]
+        if _is_bool(annotation) and not isinstance(value, bool) and isinstance(value, (str, int, float)):
+            text = str(value).strip().lower()
+            if text in _TRUE or text in _FALSE:
+                data[name] = text in _TRUE
+                fixes.append(f"coerced {path}{name}")
+        nested = _model_of(annotation)
+        if nested is not None:
+            if isinstance(value, dict):
+                data[name] = coerce_to_model(value, nested, fixes, f"{path}{name}.")
+            elif isinstance(value, list):
+                data[name] = [coerce_to_model(item, nested, fixes, f"{path}{name}[{i}].") if isinstance(item, dict) else item
+                              for i, item in enumerate(value)]
+    return data
+
+
+def closest_match(value: str, choices: List[str], cutoff: float = 0.6) -> Optional[str]:
+    """
+    Returns the choice value stands for: itself, a case or whitespace
+    variant, or the closest choice by similarity above cutoff.
+    """
+    if value in choices:
+        return value
+    normalized = {" ".join(choice.lower().split()): choice for choice in choices}
+    key = " ".join(str(value).lower().split())
+    if key in normalized:
+        return normalized[key]
+    matches = difflib.get_close_matches(key, list(normalized), n=1, cutoff=cutoff)
+    return normalized[matches[0]] if matches else None
+
+
+def repair_reply(text: str, model: Type[BaseModel]) -> Tuple[Dict, List[str]]:
+    """
+    Parses a reply and coerces it towards model, see extract_json and coerce_to_model.
+
+    Returns:
+        tuple: The repaired object and the fixes made.
+
+    Raises:
+        json.JSONDecodeError: If the reply holds no JSON object.
+        ValueError: If the reply is JSON but not an object.
+    """
+    fixes = []
+    try:
+        data = json.loads(text or "")
+    except json.JSONDecodeError:
+        data = extract_json(text)
+        fixes.append("extracted the JSON object")
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    return coerce_to_model(data, model, fixes), fixes
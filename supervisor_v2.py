@@ -5,16 +5,30 @@ Created on Fri Jun 14 15:54:44 2024
 Author: andreadesogus
 """
 
-import json
 import time
+import asyncio
+import contextvars
 import logging
-import os
-from typing import Union, List, Dict, Optional
+import queue
+import threading
+from functools import partial
+from typing import AsyncIterator, Callable, Generator, Iterator, Union, List, Dict, Optional, Tuple
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 from pydantic import BaseModel, ValidationError
-from baseLLM import openaiApis
+from baseLLM import LLMProvider, AsyncLLMProvider
 from agents_ini import SupervisorSystem, DefaultAgentSystem
 from agents import Team
-from basetool import OpenaiFunctionCalling, ToolResponseHandler
+from basetool import OpenaiFunctionCalling, ToolResponseHandler, AsyncToolResponseHandler
+from metrics import RunBudget, BudgetExceeded, UsageTracker, record_speculation, track_usage, usage_scope
+from rate_limit import CircuitOpenError, default_backoff
+from memory import ConversationMemory, estimate_tokens
+from context_view import ContextViews, DEFAULT_CONTEXT_TOKENS, OutputStore
+from events import (Event, AgentOutputEvent, AgentTokenEvent, DelegationEvent, FinalAnswerEvent,
+                    emit, listen, listening)
+from run_log import log_event, new_run_id, run_scope
+from checkpoint import Checkpoint, CheckpointStore
+from tracing import span, trace_run
+from structured_output import closest_match, json_schema_format, repair_reply
 
 # ANSI escape sequences for colored output
 WHITE_NORMAL = "\033[0m"
@@ -23,21 +37,36 @@ GREEN_BOLD = "\033[1;32m"
 RED_BOLD = "\033[1;31m"
 BLUE_BOLD = "\033[1;34m"
 
-# Define the log path
-LOG_DIR = "/Users/andreadesogus/Downloads/TeamWork/"
-LOG_FILE = "supervision.log"
-LOG_PATH = os.path.join(LOG_DIR, LOG_FILE)
+# Logging is configured by the application, see config.configure_logging
 
-# Ensure the log directory exists
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+EXECUTION_MODES = ("supervised", "dag", "plan")
 
-# Configure logging
-logging.basicConfig(
-    filename=LOG_PATH,
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Supervisor and AsyncSupervisor share the logic of a run, written once as
+# generators that yield the blocking calls to make, as callables without
+# arguments, and receive their results: Supervisor._drive calls them and
+# AsyncSupervisor._drive awaits them.
+Steps = Generator[Callable[[], object], object, object]
+
+def _traced(call_span, completion):
+    """
+    Records the token usage of a completion on its llm_call span and returns it.
+    """
+    usage = getattr(completion, "usage", None)
+    if usage is not None:
+        call_span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    return completion
+
+
+class Delegation(BaseModel):
+    """
+    A single question delegated to an agent.
+
+    Attributes:
+        agent_role (str): The role of the agent to delegate the question.
+        question (str): The question to be answered by the agent.
+    """
+    agent_role: str
+    question: str
 
 class SupervisionValidation(BaseModel):
     """
@@ -49,33 +78,186 @@ class SupervisionValidation(BaseModel):
         question (Union[None, str]): The question to be answered by the agent.
         answer (Union[None, str]): The answer to the question.
         stop (bool): Whether to stop the supervision process.
+        delegations (Optional[List[Delegation]]): Independent delegations to run in parallel.
     """
     delegation: bool
     agent_role: Union[None, str]
     question: Union[None, str]
     answer: Union[None, str]
     stop: bool
+    delegations: Optional[List[Delegation]] = None
+
+    def delegation_list(self) -> List[Tuple[str, str]]:
+        """
+        Returns the delegations of this turn as (agent_role, question) pairs.
+
+        The "delegations" list takes precedence over the single
+        agent_role/question pair when both are present.
+
+        Returns:
+            list: The delegations in the order chosen by the supervisor.
+        """
+        if not self.delegation:
+            return []
+        if self.delegations:
+            return [(d.agent_role, d.question) for d in self.delegations]
+        return [(self.agent_role, self.question)]
+
+
+class PlanStep(BaseModel):
+    """
+    A step of an execution plan, whose delegations run in parallel.
+
+    Attributes:
+        delegations (List[Delegation]): The questions asked in this step.
+    """
+    delegations: List[Delegation]
+
+    def delegation_list(self) -> List[Tuple[str, str]]:
+        return [(d.agent_role, d.question) for d in self.delegations]
+
+
+class ExecutionPlan(BaseModel):
+    """
+    The complete plan of a run in the "plan" execution mode.
+
+    Attributes:
+        steps (List[PlanStep]): The steps, run in order.
+    """
+    steps: List[PlanStep]
+
+
+def _satisfactory(agent_role: str, output: Optional[str]) -> bool:
+    """
+    The default check of the agents' outputs in the "plan" mode: any non-empty output.
+    """
+    return bool(output and output.strip())
+
+
+def _normalized(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+# What models write in agent_role when they do not delegate
+_NO_ROLE = {"", "none", "null", "n/a", "na", "-"}
+
+
+class Speculation:
+    """
+    An agent call started while the supervisor is still deciding, see
+    Supervisor.speculative.
+
+    Attributes:
+        iteration (int): The iteration it was started for.
+        agent_role (str): The predicted agent.
+        question (str): The predicted question.
+        result: The Future (or asyncio Task) of the agent's answer.
+        index (Optional[int]): The delegation it answers, once committed.
+        stop (Optional[threading.Event]): Set to stop a call running in a thread, see cancel.
+    """
+    def __init__(self, iteration: int, agent_role: str, question: str, result,
+                 stop: Optional[threading.Event] = None):
+        self.iteration = iteration
+        self.agent_role = agent_role
+        self.question = question
+        self.result = result
+        self.index = None
+        self.stop = stop
+
+    def cancel(self):
+        """
+        Discards the call. A task is cancelled at once; a call running in a
+        thread cannot be interrupted, so it stops before its next LLM or tool
+        call, and the LLM call in flight completes and counts as wasted.
+        """
+        self.result.cancel()
+        if self.stop is not None:
+            self.stop.set()
+
 
 class Supervisor:
     """
-    A class to manage the supervision of agents using OpenAI's API.
+    A class to manage the supervision of agents through an LLM provider.
 
     Attributes:
-        ai (openaiApis): An instance of the OpenAI API client.
+        ai (LLMProvider): The LLM provider, e.g. openaiApis or localOpenaiApis.
         agents (list): A list of agents to supervise.
+        supervisor_system (SupervisorSystem): The supervisor's prompts, compiled once for the team.
+        agent_systems (dict): The system message builder of each agent, by role.
+        functions (dict): The tool definitions of each agent with tools, by role.
+        last_report (dict): Token and latency report of the last run finished by the instance,
+            see UsageTracker.report; concurrent runs get their own with return_report.
+        checkpoints (Optional[CheckpointStore]): Where the state of the runs is saved after every step.
     """
     
-    def __init__(self, agents: List[Team], ai: openaiApis):
+    def __init__(self, agents: List[Team], ai: LLMProvider, max_workers: int = 4, budget: RunBudget = None,
+                 memory_tokens: int = 4000, summarizer = None, max_tool_steps: int = 5,
+                 checkpoints: CheckpointStore = None, speculative: bool = False, speculation_match: str = "role",
+                 structured_output: bool = True, accept_output: Callable[[str, str], bool] = None,
+                 max_replans: int = 2, context_tokens: Optional[int] = DEFAULT_CONTEXT_TOKENS, context_summarizer = None):
         """
-        Initializes the Supervisor with a list of agents and an OpenAI API client.
+        Initializes the Supervisor with a list of agents and an LLM provider.
 
         Args:
             agents (list): A list of agents to supervise.
-            ai (openaiApis): An instance of the OpenAI API client.
+            ai (LLMProvider): The LLM provider.
+            max_workers (int): Maximum number of agents asked concurrently in one turn.
+            budget (RunBudget): Token, call and wall time limits applied to every run.
+            memory_tokens (int): Budget of the conversation sent to the supervisor.
+            summarizer (Callable): Folds older turns into the rolling digest, e.g.
+                memory.LLMSummarizer; defaults to a local extractive summary.
+            max_tool_steps (int): Maximum number of tool rounds of an agent before
+                it is asked to answer with what it has.
+            checkpoints (CheckpointStore): Saves every run after each step, so that
+                resume can finish an interrupted run, e.g. a FileCheckpointStore.
+            speculative (bool): Asks the likely next agent while the supervisor is
+                still deciding, and keeps the answer if the supervisor delegates
+                the same call; see report["speculation"] of the run report for the hit rate.
+            speculation_match (str): "role" keeps a speculative answer when the
+                supervisor delegates the same role, whatever the question; "question"
+                only when it also asks the same question. The speculative call asks
+                the user's question and the supervisor writes its own, so "question"
+                rarely commits.
+            structured_output (bool): Constrains the supervisor's replies to the strict
+                JSON schema of SupervisionValidation; False falls back to JSON mode,
+                for servers without structured outputs.
+            accept_output (Callable): In the "plan" mode, tells whether an agent's
+                output, given its role and output, is satisfactory; a flagged output
+                makes the supervisor plan the work left again. By default any
+                non-empty output is accepted.
+            max_replans (int): Maximum number of replanning calls of a "plan" run.
+            context_tokens (int): Budget of the dependencies' outputs in an agent's
+                prompt, unless the agent sets its own context_budget; None sends
+                them in full. It also caps each output in the supervisor memory,
+                which refers to the outputs kept once in the run's OutputStore.
+            context_summarizer (Callable): Shortens the outputs over budget, e.g.
+                context_view.LLMContextSummarizer; defaults to keeping head and tail.
         """
+        if speculation_match not in ("question", "role"):
+            raise ValueError(f"Unknown speculation match: {speculation_match}")
         self.ai = ai
         self.agents = agents
-        logging.info("Supervisor initialized with agents and OpenAI API client.")
+        self.max_workers = max_workers
+        self.budget = budget
+        self.memory_tokens = memory_tokens
+        self.summarizer = summarizer
+        self.max_tool_steps = max_tool_steps
+        self.checkpoints = checkpoints
+        self.speculative = speculative
+        self.speculation_match = speculation_match
+        self.response_format = json_schema_format(SupervisionValidation, "supervision") if structured_output else 'json'
+        self.plan_format = json_schema_format(ExecutionPlan, "execution_plan") if structured_output else 'json'
+        self.accept_output = accept_output or _satisfactory
+        self.max_replans = max_replans
+        self.context_views = ContextViews(context_tokens, context_summarizer)
+        self.team = Team(agents)
+        # Compiled once: the prompts and tool schemas do not change between runs
+        self.supervisor_system = SupervisorSystem(self.team)
+        self.agent_systems = {agent.agent_role: DefaultAgentSystem(agent) for agent in agents}
+        self.functions = {agent.agent_role: OpenaiFunctionCalling(agent.tools).generate_function_definitions()
+                          for agent in agents if agent.tools}
+        self.last_report = None
+        logging.debug("Supervisor initialized with agents and LLM provider.")
 
     def ask_agent(self, question: str, agent_role: str, context: Dict) -> str:
         """
@@ -89,46 +271,148 @@ class Supervisor:
         Returns:
             str: The response from the agent.
         """
+        with usage_scope(role=agent_role), span("ask_agent", role=agent_role):
+            return self._drive(self._ask_agent(question, agent_role, context))
+
+    def _drive(self, steps: Steps, stop: Optional[threading.Event] = None):
+        """
+        Runs steps, making the calls it yields and sending it their results,
+        or throwing it their errors.
+
+        Args:
+            steps (Generator): One of the shared steps of a run, e.g. _run.
+            stop (threading.Event): Once set, the next call is not made and
+                CancelledError is raised instead.
+
+        Returns:
+            The value steps returns.
+        """
+        result, error = None, None
+        while True:
+            try:
+                call = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            if stop is not None and stop.is_set():
+                steps.close()
+                raise CancelledError()
+            try:
+                result, error = call(), None
+            except BaseException as e:
+                result, error = None, e
+
+    def _sleep(self, delay: float):
+        time.sleep(delay)
+
+    def _wait(self, result) -> str:
+        """
+        Returns the answer of a speculative call, see _speculate.
+        """
+        return result.result()
+
+    def _tool_handler(self, response, agent) -> ToolResponseHandler:
+        return ToolResponseHandler(response, agent, self.ai, self.max_workers)
+
+    def _ask_agent(self, question: str, agent_role: str, context: Dict) -> Steps:
+        """
+        Implementation of ask_agent, run inside the agent's usage scope.
+        """
         for agent in self.agents:
             if agent.agent_role == agent_role:
-                logging.info(f"Asking {agent_role} the question: {question}")
-
+                start = time.perf_counter()
                 # Generate the previous context response for the agent
                 prev_resp = self._generate_context_response(agent, context)
+                log_event("agent_asked", question_chars=len(question), context_tokens=estimate_tokens(prev_resp),
+                          payload={"question": question})
                 
                 # Set up the function call parameters for the agent
                 functions, function_call = self._setup_function_call(agent)
                 
+                # The system message is built once and reused for every step
+                system = self.agent_systems[agent_role].system(prev_resp)
+                messages = [{'role': 'user', 'content': question}]
+                stream = self._stream_kwargs(agent_role)
+
                 # Get response from the agent
-                response = self.ai.gptText(
-                    system=DefaultAgentSystem(agent).system(prev_resp),
-                    question=question,
-                    tools=functions,
-                    tool_choice=function_call
-                )
-
-                # Process the response if the agent uses tools
-                if agent.tools:
-                    tool_response_handler = ToolResponseHandler(response, agent, self.ai)
-                    messages = tool_response_handler.process_tool_response()
-                    # for msg in messages:
-                    #     logging.info(f"Tool Response: {msg}")
-                    iteration = 0
-                    stop = False
-                    
-                    while not stop and iteration < 3:
-                        try:
-                            response = self.ai.gptText(
-                                system=DefaultAgentSystem(agent).system(prev_resp),
-                                message=messages)
-                            stop = True
-                        except Exception as e:
-                            iteration +=1
-                return response.choices[0].message.content
+                response = yield from self._agent_call(system, messages, functions, function_call, stream)
+
+                # Run the requested tools and call the agent again, until it answers
+                step = 0
+                while agent.tools and response.choices[0].message.tool_calls:
+                    if step >= self.max_tool_steps:
+                        logging.warning(f"{agent_role} reached {self.max_tool_steps} tool steps, asking for an answer.")
+                        response = yield from self._agent_call(system, messages, functions, 'none', stream)
+                        break
+                    tool_response_handler = self._tool_handler(response, agent)
+                    messages = messages + (yield tool_response_handler.process_tool_response)
+                    step += 1
+                    response = yield from self._agent_call(system, messages, functions, function_call, stream)
+                return self._agent_answered(response, start, step)
+
+    def _agent_call(self, system: str, messages: List[Dict], functions, function_call, stream: Dict,
+                    retries: int = 3) -> Steps:
+        """
+        Calls the model for an agent, retrying failed calls.
+
+        Args:
+            system (str): The agent's system message.
+            messages (list): The conversation so far, from the question on.
+            functions: The agent's tool definitions, if any.
+            function_call: The tool choice strategy, if any.
+            stream (dict): Extra gptText arguments, see _stream_kwargs.
+            retries (int): Number of attempts.
+
+        Returns:
+            ChatCompletion: The agent's response.
+        """
+        for attempt in range(retries):
+            try:
+                with span("llm_call", kind="agent", attempt=attempt) as call_span:
+                    return _traced(call_span, (yield partial(self.ai.gptText, system=system, message=messages,
+                                                             tools=functions, tool_choice=function_call, **stream)))
+            except (BudgetExceeded, CircuitOpenError):
+                raise
+            except Exception as e:
+                logging.error(f"Agent call failed ({attempt + 1}/{retries}): {e}")
+                if attempt == retries - 1:
+                    raise
+                yield partial(self._sleep, default_backoff.delay(attempt))
+
+    def _agent_answered(self, response, start: float, tool_steps: int) -> str:
+        """
+        Logs an agent's answer and returns its content.
+        """
+        output = response.choices[0].message.content
+        log_event("agent_answered", duration=round(time.perf_counter() - start, 4), tool_steps=tool_steps,
+                  chars=len(output or ""), payload={"answer": output})
+        return output
+
+    def _stream_kwargs(self, agent_role: str) -> Dict:
+        """
+        Returns the gptText arguments streaming an agent's answer as
+        AgentTokenEvents, or none when nobody listens to the run's events.
+
+        Args:
+            agent_role (str): The role of the answering agent.
+
+        Returns:
+            dict: The extra gptText keyword arguments.
+        """
+        if not listening():
+            return {}
+        return {'on_delta': lambda delta: emit(AgentTokenEvent(agent_role=agent_role, delta=delta))}
+
+    def _emit_delegations(self, iteration: int, delegations: List[Tuple[str, str]]):
+        """
+        Emits a DelegationEvent for every (agent_role, question) pair.
+        """
+        for agent_role, question in delegations:
+            emit(DelegationEvent(iteration=iteration, agent_role=agent_role, question=question))
 
     def _generate_context_response(self, agent, context: Dict) -> str:
         """
-        Generates a context response for the agent.
+        Generates a context response for the agent: the outputs of the agents
+        it depends on, cut to its context budget, see ContextViews.
 
         Args:
             agent: The agent instance.
@@ -137,18 +421,7 @@ class Supervisor:
         Returns:
             str: The context response string.
         """
-        prev_resp = ""
-        if agent.context:
-            # Display the context in yellow bold
-            #print(f"{YELLOW_BOLD}\n\n\nCONTEXT\n\n\n{WHITE_NORMAL}")
-            for agent_context in agent.context:
-                if agent_context in context:
-                    # Append context information to the response
-                    prev_resp += f"- {agent_context} said: {context[agent_context]}\n"
-        # else:
-        #     # Display "NO CONTEXT" in red bold if no context is provided
-        #     print(f"{RED_BOLD}\n\n\nNO CONTEXT\n\n\n{WHITE_NORMAL}")
-        return prev_resp
+        return self.context_views.view(agent, context)
 
     def _setup_function_call(self, agent):
         """
@@ -164,7 +437,7 @@ class Supervisor:
         function_call = None
         if agent.tools:
             # Generate function definitions for the agent's tools
-            functions = OpenaiFunctionCalling(agent.tools).generate_function_definitions()
+            functions = self.functions[agent.agent_role]
             function_call = 'auto'
         return functions, function_call
 
@@ -181,91 +454,914 @@ class Supervisor:
         #logging.info(f"Adding memory: {output}")
         return [{'role': 'assistant', 'content': output}]
 
-    def execution(self, question: str) -> List[Dict]:
+    def ask_agents(self, delegations: List[Tuple[str, str]], context: Dict) -> List[str]:
+        """
+        Asks several agents their delegated questions concurrently.
+
+        Every agent sees the context as it was before this turn, since the
+        supervisor only groups agents whose tasks are independent.
+
+        Args:
+            delegations (list): (agent_role, question) pairs.
+            context (dict): Contextual information for the agents.
+
+        Returns:
+            list: The agents' responses, in the same order as delegations.
+        """
+        if len(delegations) == 1:
+            agent_role, question = delegations[0]
+            return [self.ask_agent(question, agent_role, context)]
+
+        snapshot = dict(context)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(delegations))) as executor:
+            # Each worker runs in a copy of the caller's context, to keep usage accounting per run
+            futures = [executor.submit(contextvars.copy_context().run, self.ask_agent, question, agent_role, snapshot)
+                       for agent_role, question in delegations]
+            return [future.result() for future in futures]
+
+    def _new_outputs(self, state: Checkpoint) -> OutputStore:
+        """
+        Returns the output store of a run, with the outputs saved in its checkpoint if any.
+        In the supervisor memory, each output is cut to the context budget, and to
+        an eighth of memory_tokens so that the last turns fit without being copied.
+        """
+        max_tokens = self.memory_tokens // 8
+        if self.context_views.max_tokens is not None:
+            max_tokens = min(max_tokens, self.context_views.max_tokens)
+        return OutputStore(state.context, self.context_views, max_tokens)
+
+    def _new_memory(self, question: str, outputs: OutputStore) -> ConversationMemory:
+        """
+        Creates the supervisor memory of a run, with the user question pinned.
+
+        Args:
+            question (str): The user's question.
+            outputs (OutputStore): The outputs of the run, which the memory refers to.
+
+        Returns:
+            ConversationMemory: The memory.
+        """
+        memory = ConversationMemory(max_tokens=self.memory_tokens, summarizer=self.summarizer, render=outputs.render)
+        memory.pin(question)
+        return memory
+
+    def _restore_memory(self, state: Checkpoint, outputs: OutputStore) -> ConversationMemory:
+        """
+        Returns the supervisor memory of a run, as saved in its checkpoint if any.
+        """
+        if not state.memory:
+            return self._new_memory(state.question, outputs)
+        return ConversationMemory.from_dict(state.memory, summarizer=self.summarizer, render=outputs.render)
+
+    def _save_checkpoint(self, state: Checkpoint, memory: ConversationMemory, context: Dict, iteration: int,
+                         output: Optional[str], pending: Union[SupervisionValidation, ExecutionPlan, None] = None):
+        """
+        Records a completed step of the run in state and saves it, if runs are checkpointed.
+
+        Args:
+            state (Checkpoint): The checkpoint of the run, updated in place.
+            memory (ConversationMemory): The supervisor memory.
+            context (dict): The agents' answers so far.
+            iteration (int): The next iteration to run.
+            output (str): The last output.
+            pending (Union[SupervisionValidation, ExecutionPlan]): The supervisor's decision whose
+                delegations are under way, or the steps of the plan left to run.
+        """
+        if self.checkpoints is None:
+            return
+        state.memory = memory.to_dict()
+        state.context = dict(context)
+        state.iteration = iteration
+        state.output = output
+        state.pending = pending.model_dump() if pending is not None else None
+        self.checkpoints.save(state)
+
+    def _end_checkpoint(self, state: Checkpoint, output: Optional[str] = None, error: Optional[Exception] = None):
+        """
+        Marks a checkpointed run as completed, or as failed with its last completed step kept.
+        """
+        if self.checkpoints is None:
+            return
+        if error is not None:
+            state.status, state.error = "failed", f"{type(error).__name__}: {error}"
+        else:
+            state.status, state.output, state.pending = "completed", output, None
+        self.checkpoints.save(state)
+
+    def _load_checkpoint(self, run_id: str) -> Checkpoint:
+        """
+        Returns the checkpoint of a run to resume.
+
+        Raises:
+            ValueError: Without a checkpoint store, or if the run is unknown.
+        """
+        if self.checkpoints is None:
+            raise ValueError("Resuming a run needs a checkpoint store, see the checkpoints argument.")
+        state = self.checkpoints.load(run_id)
+        if state is None:
+            raise ValueError(f"No checkpoint for run {run_id}")
+        return state
+
+    def _predict_delegation(self, question: str, context: Dict) -> Optional[Tuple[str, str]]:
+        """
+        Guesses the supervisor's next delegation: the first agent yet to answer
+        whose context dependencies have all answered, asked the user's question.
+
+        Agents with tools that are not pure (cacheable) are never guessed,
+        since a discarded answer must leave no side effects behind.
+
+        Returns:
+            tuple: The (agent_role, question) pair, or None.
+        """
+        roles = {agent.agent_role for agent in self.agents}
+        for agent in self.agents:
+            if agent.agent_role in context or not (set(agent.context or []) & roles) <= set(context):
+                continue
+            if any(not getattr(tool, "cacheable", False) for tool in agent.tools or []):
+                return None
+            return agent.agent_role, question
+        return None
+
+    def _speculate(self, question: str, context: Dict, iteration: int) -> Optional[Speculation]:
+        """
+        Starts the predicted agent call in a background thread, if speculative.
+        It emits no events and its LLM calls are tagged with the iteration, so
+        discarded calls show up as wasted in the report. A discarded call stops
+        before its next LLM or tool call, see Speculation.cancel.
+        """
+        prediction = self._predict_delegation(question, context) if self.speculative else None
+        if prediction is None:
+            return None
+        agent_role, agent_question = prediction
+        snapshot = dict(context)
+        stop = threading.Event()
+
+        def run():
+            with listen(None), usage_scope(speculation=iteration), span("speculation", role=agent_role):
+                with usage_scope(role=agent_role), span("ask_agent", role=agent_role):
+                    return self._drive(self._ask_agent(agent_question, agent_role, snapshot), stop)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(contextvars.copy_context().run, run)
+        # A discarded call is not waited for
+        executor.shutdown(wait=False)
+        log_event("speculation_started", speculated_role=agent_role)
+        return Speculation(iteration, agent_role, agent_question, future, stop)
+
+    def _resolve_speculation(self, speculation: Optional[Speculation],
+                             validated_resp: Union[SupervisionValidation, None]) -> Optional[Speculation]:
+        """
+        Commits speculation if the supervisor delegated the same call, otherwise
+        discards it, see Speculation.cancel.
+
+        Returns:
+            Speculation: The committed speculation, or None.
+        """
+        if speculation is None:
+            return None
+        delegations = validated_resp.delegation_list() if validated_resp else []
+        for index, (agent_role, question) in enumerate(delegations):
+            if agent_role == speculation.agent_role and (
+                    self.speculation_match == "role" or _normalized(question) == _normalized(speculation.question)):
+                speculation.index = index
+                break
+        hit = speculation.index is not None
+        if not hit:
+            speculation.cancel()
+        record_speculation(speculation.iteration, hit)
+        log_event("speculation_resolved", speculated_role=speculation.agent_role, hit=hit)
+        return speculation if hit else None
+
+    def _ask_delegations(self, delegations: List[Tuple[str, str]], context: Dict,
+                         speculation: Optional[Speculation]) -> Steps:
+        """
+        ask_agents, taking the answer of the delegation matched by a committed
+        speculation from it. A failed speculative call is made again.
+        """
+        if speculation is None:
+            return (yield partial(self.ask_agents, delegations, context))
+        others = delegations[:speculation.index] + delegations[speculation.index + 1:]
+        outputs = (yield partial(self.ask_agents, others, context)) if others else []
+        try:
+            output = yield partial(self._wait, speculation.result)
+        except Exception as e:
+            logging.warning(f"Speculative call of {speculation.agent_role} failed, asking again: {e}")
+            agent_role, question = delegations[speculation.index]
+            output = yield partial(self.ask_agent, question, agent_role, context)
+        outputs.insert(speculation.index, output)
+        return outputs
+
+    def _merge_outputs(self, delegations: List[Tuple[str, str]], outputs: List[str], context: Dict, memory: ConversationMemory) -> str:
+        """
+        Merges the agents' responses into context and memory in delegation order.
+
+        Args:
+            delegations (list): (agent_role, question) pairs.
+            outputs (list): The agents' responses, in delegation order.
+            context (OutputStore): The outputs of the run, updated in place.
+            memory (ConversationMemory): The supervisor memory, updated in place.
+
+        Returns:
+            str: The last agent response.
+        """
+        output = None
+        for (agent_role, question), output in zip(delegations, outputs):
+            # The memory keeps the answer this one supersedes, and refers to the new one
+            memory.inline(OutputStore.reference(agent_role))
+            context[agent_role] = output
+
+            # Log and store memory messages
+            memory.add(self.add_memory(f"I'll ask {agent_role} to answer the following question: {question}"))
+            memory.add(self.add_memory(f"The {agent_role} says: {OutputStore.reference(agent_role)}"))
+            emit(AgentOutputEvent(agent_role=agent_role, output=output))
+        memory.status = f"Agents who have already answered: {'; '.join(context)}"
+        return output
+
+    def execution(self, question: str, mode: str = "supervised",
+                  return_report: bool = False) -> Union[str, Tuple[str, Dict]]:
         """
         Executes the supervision process for the given question.
 
         Args:
             question (str): The initial question to start the supervision process.
+            mode (str): "supervised" lets the supervisor choose every delegation;
+                "dag" runs the agents in dependency order and only calls the
+                supervisor to compose the final answer; "plan" has the supervisor
+                plan every delegation in one call, runs the plan and calls it
+                again only to replan after a flagged output, and to compose.
+            return_report (bool): Also return the run's report, which last_report
+                only holds until another run of the instance finishes.
 
         Returns:
-            list: A list of messages generated during the supervision process.
+            str: The final output of the supervision process, or the output and
+            the report with return_report.
+
+        Raises:
+            Exception: Any error of the run, with the run's report as its run_report attribute.
         """
-        messages = []
-        stop = False
-        iteration = 0
-        context = {}
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {mode}")
+        output, report = self._drive(self._run(Checkpoint(run_id=new_run_id(), question=question, mode=mode)))
+        return (output, report) if return_report else output
+
+    def resume(self, run_id: str, return_report: bool = False) -> Union[str, Tuple[str, Dict]]:
+        """
+        Finishes a checkpointed run from its last completed step: the
+        supervisor calls and agent answers saved before the interruption are
+        not made again. A completed run just returns its answer.
+
+        Args:
+            run_id (str): The run id, see report["run_id"] of the run report or checkpoints.runs("running").
+            return_report (bool): Also return the report of the resumed part of
+                the run, None for a completed run, see execution.
+
+        Returns:
+            str: The final output, or the output and the report with return_report.
+        """
+        state = self._load_checkpoint(run_id)
+        if state.status == "completed":
+            output, report = state.output, None
+        else:
+            output, report = self._drive(self._run(state))
+        return (output, report) if return_report else output
+
+    def _run(self, state: Checkpoint) -> Steps:
+        """
+        Runs, or resumes, the run described by state.
+
+        Returns:
+            tuple: The final output and the run's report.
+        """
+        tracker = UsageTracker(self.budget)
+        with run_scope(state.run_id) as run_id, track_usage(tracker), trace_run(run_id, mode=state.mode) as run_span:
+            self._run_started(state)
+            try:
+                if state.mode == "dag":
+                    output = yield from self._execute_dag(state)
+                elif state.mode == "plan":
+                    output = yield from self._execute_plan(state)
+                else:
+                    output = yield from self._execute_supervised(state)
+            except BaseException as e:
+                report = self.last_report = self._run_finished(tracker, run_id, run_span)
+                if isinstance(e, Exception):
+                    self._end_checkpoint(state, error=e)
+                    # A failed run returns nothing: its report travels with the error
+                    e.run_report = report
+                raise
+            report = self.last_report = self._run_finished(tracker, run_id, run_span)
+        self._end_checkpoint(state, output)
+        emit(FinalAnswerEvent(answer=output, report=report))
+        return output, report
+
+    def _run_started(self, state: Checkpoint):
+        log_event("run_started", mode=state.mode, agents=len(self.agents), question_chars=len(state.question),
+                  resumed_at=state.iteration if state.memory else None, payload={"question": state.question})
+
+    def _run_finished(self, tracker: UsageTracker, run_id: str, run_span) -> Dict:
+        """
+        Logs and traces the totals of a run and returns its report, tagged with the run id.
+        """
+        report = {**tracker.report(), "run_id": run_id}
+        run_span.set(calls=report["calls"], prompt_tokens=report["prompt_tokens"],
+                     completion_tokens=report["completion_tokens"])
+        log_event("run_finished", duration=round(report["wall_time"], 4), calls=report["calls"],
+                  prompt_tokens=report["prompt_tokens"], completion_tokens=report["completion_tokens"])
+        return report
+
+    def stream_execution(self, question: str, mode: str = "supervised") -> Iterator[Event]:
+        """
+        Runs execution in a background thread and yields its events as they
+        happen: delegations, tool calls, agent answer tokens, agent outputs
+        and, last, the FinalAnswerEvent.
+
+        Example:
+            for event in supervisor.stream_execution(question):
+                if event.type == "agent_token":
+                    print(event.delta, end="")
+
+        The run is not interrupted if the consumer stops iterating early; it
+        completes in the background.
+
+        Args:
+            question (str): The user's question.
+            mode (str): "supervised", "dag" or "plan", as in execution.
+
+        Yields:
+            Event: The events of the run, in emission order.
+
+        Raises:
+            Exception: Any error raised by the run, once its earlier events are yielded.
+        """
+        events = queue.Queue()
+        done = object()
+
+        def run():
+            try:
+                with listen(events.put):
+                    self.execution(question, mode)
+            except BaseException as e:
+                events.put(e)
+            finally:
+                events.put(done)
+
+        # The run gets a copy of the caller's context, like the agents' worker threads
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True)
+        worker.start()
+        while True:
+            event = events.get()
+            if event is done:
+                break
+            if isinstance(event, BaseException):
+                raise event
+            yield event
+        worker.join()
+
+    def _execute_supervised(self, state: Checkpoint) -> Steps:
+        """
+        Runs the supervision loop in which the supervisor chooses every delegation.
+
+        Args:
+            state (Checkpoint): The run, new or resumed; saved after every step.
 
-        logging.info(f"Starting execution with question: {question}")
+        Returns:
+            str: The final output.
+        """
+        context = self._new_outputs(state)
+        memory = self._restore_memory(state, context)
+        stop = False
+        iteration = state.iteration
+        output = state.output or "No valid response."
+        pending = state.pending
 
         while not stop and iteration < len(self.agents) * 2:
-            # Get a valid response from the supervisor system
-            success, validated_resp = self._get_valid_response(question, messages)
-            
-            if validated_resp and validated_resp.delegation:
-                agent_role = validated_resp.agent_role
-                question = validated_resp.question
-                # Ask the agent the delegated question
-                output = self.ask_agent(question, agent_role, context)
-
-                # Update context with the agent's response
-                context[agent_role] = output
-
-                # Log and store memory messages
-                messages += self.add_memory(f"I'll ask {agent_role} to answer the following question: {question}")
-                messages += self.add_memory(f"The {agent_role} says: {output}")
-                logging.info(f"{YELLOW_BOLD}{agent_role}: {GREEN_BOLD}{output}{WHITE_NORMAL}")
-            else:
-                output = validated_resp.answer if validated_resp else "No valid response."
-                messages += self.add_memory(output)
-                logging.info(f"{YELLOW_BOLD}SUPERVISOR: {GREEN_BOLD}{output}{WHITE_NORMAL}")
-            
+            start = time.perf_counter()
+            try:
+                with usage_scope(iteration=iteration), span("iteration", iteration=iteration):
+                    if pending is not None:
+                        # Decided before an interruption, its delegations were not answered
+                        validated_resp, pending = SupervisionValidation.model_validate(pending), None
+                        speculation = None
+                    else:
+                        # The likely next agent works while the supervisor decides
+                        speculation = self._speculate(state.question, context, iteration)
+                        validated_resp = None
+                        try:
+                            # Get a valid response from the supervisor system
+                            success, validated_resp = yield from self._get_valid_response(None, memory.messages())
+                        finally:
+                            speculation = self._resolve_speculation(speculation, validated_resp)
+
+                    if validated_resp and validated_resp.delegation:
+                        delegations = validated_resp.delegation_list()
+                        self._save_checkpoint(state, memory, context, iteration, output, pending=validated_resp)
+                        self._emit_delegations(iteration, delegations)
+                        # Ask the agents the delegated questions, concurrently when there are several
+                        outputs = yield from self._ask_delegations(delegations, context, speculation)
+                        output = self._merge_outputs(delegations, outputs, context, memory)
+                    else:
+                        output = validated_resp.answer if validated_resp else "No valid response."
+                        memory.add(self.add_memory(output))
+                        log_event("supervisor_answered", chars=len(output), payload={"answer": output})
+            except BudgetExceeded as e:
+                logging.warning(f"Stopping execution early: {e}")
+                break
+
             stop = validated_resp.stop if validated_resp else True
+            log_event("iteration_finished", iteration=iteration, duration=round(time.perf_counter() - start, 4),
+                      delegations=len(validated_resp.delegation_list()) if validated_resp and validated_resp.delegation else 0)
             iteration += 1
-            
-            
-            logging.info(f"Iteration number: {iteration}")
+            self._save_checkpoint(state, memory, context, iteration, output)
+
+        return output
+
+    def _execute_dag(self, state: Checkpoint) -> Steps:
+        """
+        Runs the team level by level following the agents' context dependencies.
+
+        Agents of the same level are asked the user's question concurrently;
+        the supervisor is called once at the end to compose the answer.
+
+        Args:
+            state (Checkpoint): The run, new or resumed; saved after every level.
+
+        Returns:
+            str: The final answer.
+        """
+        context = self._new_outputs(state)
+        memory = self._restore_memory(state, context)
+        output = state.output
+        question = state.question
+
+        iteration = -1
+        try:
+            for iteration, level in enumerate(self.team.dependency_levels()):
+                if iteration < state.iteration:
+                    # Answered before an interruption
+                    continue
+                with usage_scope(iteration=iteration), span("iteration", iteration=iteration):
+                    delegations = [(agent.agent_role, question) for agent in level]
+                    self._emit_delegations(iteration, delegations)
+                    outputs = yield partial(self.ask_agents, delegations, context)
+                    output = self._merge_outputs(delegations, outputs, context, memory)
+                self._save_checkpoint(state, memory, context, iteration + 1, output)
+
+            memory.add(self._compose_messages())
+            with usage_scope(iteration=iteration + 1), span("iteration", iteration=iteration + 1, compose=True):
+                success, validated_resp = yield from self._get_valid_response(None, memory.messages())
+            output = self._composed_answer(validated_resp, output)
+        except BudgetExceeded as e:
+            logging.warning(f"Stopping execution early: {e}")
+
+        log_event("supervisor_answered", chars=len(output or ""), payload={"answer": output})
+        return output
+
+    def _execute_plan(self, state: Checkpoint) -> Steps:
+        """
+        Runs the team following an execution plan written by the supervisor in
+        a single call. The supervisor is called again only to replan the work
+        left when an agent output is flagged by accept_output, and to compose
+        the final answer.
+
+        Args:
+            state (Checkpoint): The run, new or resumed; saved after every step.
+
+        Returns:
+            str: The final answer.
+        """
+        context = self._new_outputs(state)
+        memory = self._restore_memory(state, context)
+        output = state.output
+        iteration = state.iteration
+        replans = 0
+
+        try:
+            if state.pending is not None:
+                # Planned before an interruption
+                steps = ExecutionPlan.model_validate(state.pending).steps
+            else:
+                steps = yield from self._plan(memory, iteration, self.supervisor_system.plan(),
+                                              state.question)
+                self._save_checkpoint(state, memory, context, iteration, output, pending=ExecutionPlan(steps=steps))
+
+            while steps:
+                delegations = steps.pop(0).delegation_list()
+                with usage_scope(iteration=iteration), span("iteration", iteration=iteration):
+                    self._emit_delegations(iteration, delegations)
+                    outputs = yield partial(self.ask_agents, delegations, context)
+                    output = self._merge_outputs(delegations, outputs, context, memory)
+                iteration += 1
+                flagged = self._flagged_outputs(delegations, outputs, context, memory)
+                if flagged and replans < self.max_replans:
+                    replans += 1
+                    steps = yield from self._plan(memory, iteration, self.supervisor_system.replan(flagged),
+                                                  state.question, steps)
+                elif flagged:
+                    logging.warning(f"Outputs of {flagged} flagged after {replans} replans, going on with the plan.")
+                self._save_checkpoint(state, memory, context, iteration, output, pending=ExecutionPlan(steps=steps))
 
-            # Clear the question for the next iteration
-            question = ""
+            memory.add(self._compose_messages())
+            with usage_scope(iteration=iteration), span("iteration", iteration=iteration, compose=True):
+                success, validated_resp = yield from self._get_valid_response(None, memory.messages())
+            output = self._composed_answer(validated_resp, output)
+        except BudgetExceeded as e:
+            logging.warning(f"Stopping execution early: {e}")
 
-        logging.info("Execution completed.")
+        log_event("supervisor_answered", chars=len(output or ""), payload={"answer": output})
         return output
 
-    def _get_valid_response(self, question: str, messages: List[Dict]) -> (bool, Union[SupervisionValidation, None]):
+    def _plan(self, memory: ConversationMemory, iteration: int, instruction: str, question: str,
+              fallback: Optional[List[PlanStep]] = None) -> Steps:
+        """
+        Asks the supervisor for the execution plan, or a new plan of the work left.
+
+        Args:
+            memory (ConversationMemory): The supervisor memory, which records the plan.
+            iteration (int): The iteration tag of the planning call.
+            instruction (str): The plan or replan instruction.
+            question (str): The user's question, for the fallback plan.
+            fallback (list): The steps to keep if the supervisor fails to plan; by
+                default the agents in dependency order, asked the user's question.
+
+        Returns:
+            list: The steps of the plan.
+        """
+        memory.add([{'role': 'user', 'content': instruction}])
+        with usage_scope(iteration=iteration), span("iteration", iteration=iteration, plan=True):
+            success, plan = yield from self._get_valid_response(None, memory.messages(), planning=True)
+        return self._planned_steps(memory, plan, question, fallback)
+
+    def _planned_steps(self, memory: ConversationMemory, plan: Optional[ExecutionPlan], question: str,
+                       fallback: Optional[List[PlanStep]]) -> List[PlanStep]:
+        """
+        Records the plan in memory and returns its steps, or the fallback steps.
+        """
+        if plan is None:
+            logging.warning("Supervisor did not return a valid plan, falling back to the dependency order.")
+            if fallback is None:
+                fallback = [PlanStep(delegations=[Delegation(agent_role=agent.agent_role, question=question)
+                                                  for agent in level])
+                            for level in self.team.dependency_levels()]
+            plan = ExecutionPlan(steps=fallback)
+        memory.add(self.add_memory(f"Execution plan: {plan.model_dump_json()}"))
+        log_event("plan_ready", steps=len(plan.steps), delegations=sum(len(step.delegations) for step in plan.steps))
+        return list(plan.steps)
+
+    def _flagged_outputs(self, delegations: List[Tuple[str, str]], outputs: List[str], context: Dict,
+                         memory: ConversationMemory) -> List[str]:
+        """
+        Returns the roles whose outputs accept_output rejects, and removes
+        those outputs from the context, so the agents answer again afresh.
+        The supervisor memory keeps them.
+        """
+        flagged = [agent_role for (agent_role, question), output in zip(delegations, outputs)
+                   if not self.accept_output(agent_role, output)]
+        for agent_role in flagged:
+            memory.inline(OutputStore.reference(agent_role))
+            context.pop(agent_role, None)
+        if flagged:
+            log_event("outputs_flagged", roles=flagged)
+        return flagged
+
+    def _compose_messages(self) -> List[Dict]:
+        """
+        Returns the message asking the supervisor to compose the final answer.
+
+        Returns:
+            list: A list containing the instruction message.
+        """
+        return [{'role': 'user', 'content': self.supervisor_system.compose()}]
+
+    def _composed_answer(self, validated_resp: Union[SupervisionValidation, None], fallback: str) -> str:
+        """
+        Extracts the final answer composed by the supervisor.
+
+        Args:
+            validated_resp (SupervisionValidation): The supervisor response.
+            fallback (str): The answer to use if the supervisor did not answer.
+
+        Returns:
+            str: The final answer.
+        """
+        if validated_resp and validated_resp.answer:
+            return validated_resp.answer
+        logging.warning("Supervisor did not compose an answer, returning the last agent output.")
+        return fallback
+
+    def _parse_decision(self, content: str, call_span) -> SupervisionValidation:
+        """
+        Validates a supervisor reply after cheap local repairs: code fences and
+        prose around the JSON, booleans sent as strings, missing nullable keys,
+        a missing delegation or stop flag, placeholder roles such as "N/A", and
+        the agent roles of a delegation misspelt or in the wrong case, which are
+        matched against the team.
+
+        Args:
+            content (str): The reply.
+            call_span: The supervisor_call span, which records the repairs.
+
+        Returns:
+            SupervisionValidation: The decision.
+
+        Raises:
+            ValueError: If the reply cannot be repaired, e.g. it delegates to an
+                unknown role (json.JSONDecodeError and ValidationError included).
+        """
+        data, fixes = repair_reply(content, SupervisionValidation)
+        if isinstance(data.get("agent_role"), str) and _normalized(data["agent_role"]) in _NO_ROLE:
+            data["agent_role"] = None
+            fixes.append("cleared agent_role")
+        if not isinstance(data.get("delegation"), bool):
+            data["delegation"] = bool(data.get("agent_role") or data.get("delegations"))
+            fixes.append("inferred delegation")
+        if not isinstance(data.get("stop"), bool):
+            data["stop"] = not data["delegation"]
+            fixes.append("inferred stop")
+
+        if data["delegation"]:
+            # The roles of a reply that does not delegate are never used
+            self._match_roles([data] + list(data.get("delegations") or []), fixes)
+        return self._repaired(SupervisionValidation.model_validate(data), fixes, call_span)
+
+    def _parse_plan(self, content: str, call_span) -> ExecutionPlan:
+        """
+        Validates an execution plan after the local repairs of _parse_decision.
+
+        Raises:
+            ValueError: If the plan cannot be repaired, e.g. it delegates to an unknown role.
+        """
+        data, fixes = repair_reply(content, ExecutionPlan)
+        steps = data.get("steps") if isinstance(data.get("steps"), list) else []
+        self._match_roles([d for step in steps if isinstance(step, dict) for d in step.get("delegations") or []], fixes)
+        return self._repaired(ExecutionPlan.model_validate(data), fixes, call_span)
+
+    def _match_roles(self, targets: List, fixes: List[str]):
+        """
+        Replaces in place the agent_role of every target dict with the team
+        role it stands for, see structured_output.closest_match.
+
+        Raises:
+            ValueError: If a role matches no agent of the team.
+        """
+        roles = [agent.agent_role for agent in self.agents]
+        for target in targets:
+            if not isinstance(target, dict) or target.get("agent_role") is None:
+                continue
+            role = closest_match(target["agent_role"], roles)
+            if role is None:
+                raise ValueError(f"Unknown agent role: {target['agent_role']}")
+            if role != target["agent_role"]:
+                fixes.append(f"matched role {target['agent_role']!r} to {role!r}")
+                target["agent_role"] = role
+
+    def _repaired(self, validated: BaseModel, fixes: List[str], call_span) -> BaseModel:
+        if fixes:
+            call_span.set(repairs=fixes)
+            log_event("supervisor_reply_repaired", level=logging.DEBUG, fixes=fixes)
+        return validated
+
+    def _get_valid_response(self, question: str, messages: List[Dict], planning: bool = False) -> Steps:
         """
         Attempts to get a valid response from the supervisor system.
 
         Args:
             question (str): The question to be asked.
             messages (list): The list of messages exchanged.
+            planning (bool): Ask for an ExecutionPlan instead of a decision.
 
         Returns:
             tuple: A tuple containing success status and validated response.
         """
+        with span("supervisor_call", planning=planning) as call_span:
+            return (yield from self._validate_responses(question, messages, call_span, planning))
+
+    def _validate_responses(self, question: str, messages: List[Dict], call_span, planning: bool = False) -> Steps:
+        """
+        Implementation of _get_valid_response, run inside its supervisor_call span.
+        """
         max_retries = 3
         retry_count = 0
 
         while retry_count < max_retries:
             # Get response from the supervisor system
-            response = self.ai.gptText(
-                SupervisorSystem(Team(self.agents)).system(),
-                question,
-                message=messages,
-                _format='json'
-            ).choices[0].message.content
+            with usage_scope(role="supervisor", retry=retry_count), \
+                    span("llm_call", kind="supervisor", retry=retry_count) as llm_span:
+                response = _traced(llm_span, (yield partial(
+                    self.ai.gptText,
+                    self.supervisor_system.planner() if planning else self.supervisor_system.system(),
+                    question,
+                    message=messages,
+                    _format=self.plan_format if planning else self.response_format,
+                    # A cached invalid response would fail again
+                    use_cache=retry_count == 0
+                ))).choices[0].message.content
             try:
-                # Validate the response
-                validated_resp = SupervisionValidation.parse_obj(json.loads(response))
-                #logging.info(f"Validated response: {validated_resp}")
+                # Validate the response, repairing it locally if needed
+                validated_resp = (self._parse_plan(response, call_span) if planning
+                                  else self._parse_decision(response, call_span))
+                call_span.set(retries=retry_count, valid=True)
                 return True, validated_resp
-            except ValidationError as e:
+            except (ValidationError, ValueError) as e:
                 logging.error(f"Validation error: {e}")
                 retry_count += 1
                 if retry_count < max_retries:
+                    # An invalid reply is not a transient error, so there is no backoff
                     logging.warning(f"Retrying... ({retry_count}/{max_retries})")
-                    time.sleep(1)  # Wait before retrying
                 else:
                     logging.critical("Maximum retries reached. Exiting...")
                     break
+        call_span.set(retries=retry_count, valid=False)
         return False, None
+
+
+class AsyncSupervisor(Supervisor):
+    """
+    Asynchronous counterpart of Supervisor, backed by an AsyncLLMProvider.
+
+    The runs are Supervisor's own steps, see Steps: only the calls they yield
+    are made differently. Every LLM call is awaited, so many supervisions can
+    run on one event loop, e.g.
+    ``await asyncio.gather(*(supervisor.execution(q, return_report=True) for q in questions))``,
+    which returns the output and the report of every run.
+    """
+
+    def __init__(self, agents: List[Team], ai: AsyncLLMProvider, max_workers: int = 4, budget: RunBudget = None,
+                 memory_tokens: int = 4000, summarizer = None, max_tool_steps: int = 5,
+                 checkpoints: CheckpointStore = None, speculative: bool = False, speculation_match: str = "role",
+                 structured_output: bool = True, accept_output: Callable[[str, str], bool] = None,
+                 max_replans: int = 2, context_tokens: Optional[int] = DEFAULT_CONTEXT_TOKENS, context_summarizer = None):
+        """
+        Initializes the AsyncSupervisor with a list of agents and an async LLM provider.
+
+        Args:
+            agents (list): A list of agents to supervise.
+            ai (AsyncLLMProvider): The async LLM provider.
+            max_workers (int): Maximum number of agents asked concurrently in one turn.
+            budget (RunBudget): Token, call and wall time limits applied to every run.
+            memory_tokens (int): Budget of the conversation sent to the supervisor.
+            summarizer (Callable): A synchronous summarizer, see Supervisor; an
+                LLMSummarizer must be given a synchronous provider.
+            max_tool_steps (int): Maximum number of tool rounds of an agent.
+            checkpoints (CheckpointStore): Saves every run after each step, see Supervisor.
+            speculative (bool): Asks the likely next agent while the supervisor is deciding, see Supervisor.
+            speculation_match (str): "question" or "role", see Supervisor.
+            structured_output (bool): Constrains the supervisor's replies to a strict JSON schema, see Supervisor.
+            accept_output (Callable): Checks the agents' outputs in the "plan" mode, see Supervisor.
+            max_replans (int): Maximum number of replanning calls of a "plan" run.
+            context_tokens (int): Budget of the dependencies' outputs in an agent's prompt, see Supervisor.
+            context_summarizer (Callable): A synchronous summarizer of the outputs over budget, see Supervisor.
+        """
+        super().__init__(agents, ai, max_workers, budget, memory_tokens, summarizer, max_tool_steps, checkpoints,
+                         speculative, speculation_match, structured_output, accept_output, max_replans,
+                         context_tokens, context_summarizer)
+
+    async def ask_agents(self, delegations: List[Tuple[str, str]], context: Dict) -> List[str]:
+        """
+        Asks several agents their delegated questions concurrently.
+
+        Args:
+            delegations (list): (agent_role, question) pairs.
+            context (dict): Contextual information for the agents.
+
+        Returns:
+            list: The agents' responses, in the same order as delegations.
+        """
+        snapshot = dict(context)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def ask(agent_role, question):
+            async with semaphore:
+                return await self.ask_agent(question, agent_role, snapshot)
+
+        return list(await asyncio.gather(*(ask(agent_role, question) for agent_role, question in delegations)))
+
+    async def ask_agent(self, question: str, agent_role: str, context: Dict) -> str:
+        """
+        Asks a specific agent a question based on their role.
+
+        Args:
+            question (str): The question to be asked.
+            agent_role (str): The role of the agent to ask the question.
+            context (dict): Contextual information for the agent.
+
+        Returns:
+            str: The response from the agent.
+        """
+        with usage_scope(role=agent_role), span("ask_agent", role=agent_role):
+            return await self._drive(self._ask_agent(question, agent_role, context))
+
+    async def _drive(self, steps: Steps):
+        """
+        Runs steps, awaiting the calls it yields, see Supervisor._drive.
+        """
+        result, error = None, None
+        while True:
+            try:
+                call = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            try:
+                result, error = await call(), None
+            except BaseException as e:
+                result, error = None, e
+
+    async def _sleep(self, delay: float):
+        await asyncio.sleep(delay)
+
+    async def _wait(self, result) -> str:
+        return await result
+
+    def _tool_handler(self, response, agent) -> AsyncToolResponseHandler:
+        return AsyncToolResponseHandler(response, agent, self.ai, self.max_workers)
+
+    def _speculate(self, question: str, context: Dict, iteration: int) -> Optional[Speculation]:
+        """
+        Starts the predicted agent call in a task, see Supervisor._speculate.
+        """
+        prediction = self._predict_delegation(question, context) if self.speculative else None
+        if prediction is None:
+            return None
+        agent_role, agent_question = prediction
+        snapshot = dict(context)
+
+        async def run():
+            with listen(None), usage_scope(speculation=iteration), span("speculation", role=agent_role):
+                return await self.ask_agent(agent_question, agent_role, snapshot)
+
+        task = asyncio.create_task(run())
+        # A discarded task is cancelled and never awaited
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        log_event("speculation_started", speculated_role=agent_role)
+        return Speculation(iteration, agent_role, agent_question, task)
+
+    async def execution(self, question: str, mode: str = "supervised",
+                        return_report: bool = False) -> Union[str, Tuple[str, Dict]]:
+        """
+        Executes the supervision process for the given question.
+
+        Args:
+            question (str): The initial question to start the supervision process.
+            mode (str): "supervised", "dag" or "plan", as in Supervisor.execution.
+            return_report (bool): Also return the run's report, see Supervisor.execution.
+
+        Returns:
+            str: The final output of the supervision process, or the output and
+            the report with return_report.
+        """
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {mode}")
+        output, report = await self._drive(self._run(Checkpoint(run_id=new_run_id(), question=question, mode=mode)))
+        return (output, report) if return_report else output
+
+    async def resume(self, run_id: str, return_report: bool = False) -> Union[str, Tuple[str, Dict]]:
+        """
+        Finishes a checkpointed run from its last completed step, see Supervisor.resume.
+        """
+        state = self._load_checkpoint(run_id)
+        if state.status == "completed":
+            output, report = state.output, None
+        else:
+            output, report = await self._drive(self._run(state))
+        return (output, report) if return_report else output
+
+    async def stream_execution(self, question: str, mode: str = "supervised") -> AsyncIterator[Event]:
+        """
+        Runs execution in a task and yields its events as they happen, as
+        Supervisor.stream_execution does. The run is cancelled if the consumer
+        stops iterating early.
+
+        Example:
+            async for event in supervisor.stream_execution(question):
+                ...
+
+        Args:
+            question (str): The user's question.
+            mode (str): "supervised", "dag" or "plan", as in execution.
+
+        Yields:
+            Event: The events of the run, in emission order.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        done = object()
+
+        def publish(event):
+            # Tool functions run in worker threads, so events may come from outside the loop
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        async def run():
+            with listen(publish):
+                await self.execution(question, mode)
+
+        task = asyncio.create_task(run())
+        task.add_done_callback(lambda _: loop.call_soon(events.put_nowait, done))
+        try:
+            while True:
+                event = await events.get()
+                if event is done:
+                    break
+                yield event
+            task.result()
+        finally:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Test configuration: the modules live at the repository root.
+
+Author: andreadesogus
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
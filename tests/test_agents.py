@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the team's dependency ordering.
+
+Author: andreadesogus
+"""
+
+import pytest
+
+from agents import Agent, Team
+
+
+def agent(role, context=None):
+    return Agent({'agent_role': role, 'context': context})
+
+
+def roles(levels):
+    return [[a.agent_role for a in level] for level in levels]
+
+
+def test_dependency_levels_of_a_diamond():
+    team = Team([agent("Report", ["Check", "Extract"]), agent("Extract"), agent("Check", ["Extract"]),
+                 agent("Glossary", None)])
+    assert roles(team.dependency_levels()) == [["Extract", "Glossary"], ["Check"], ["Report"]]
+
+
+def test_dependencies_outside_the_team_are_ignored(caplog):
+    team = Team([agent("Check", ["Legal department"]), agent("Report", ["Check"])])
+    assert roles(team.dependency_levels()) == [["Check"], ["Report"]]
+    assert "Legal department" in caplog.text
+
+
+@pytest.mark.parametrize("agents", [
+    [agent("A", ["B"]), agent("B", ["A"]), agent("C")],
+    [agent("A", ["A"])],
+])
+def test_cycles_are_rejected(agents):
+    with pytest.raises(ValueError, match="Circular"):
+        Team(agents).dependency_levels()
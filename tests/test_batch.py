@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the batch runner.
+
+Author: andreadesogus
+"""
+
+import json
+import logging
+
+import batch
+from batch import BatchRunner, load_items
+from benchmark import make_team
+from fake_llm import FakeLLM
+from supervisor_v2 import Supervisor
+
+
+def make_supervisor():
+    team = make_team(2)
+    return Supervisor(team, FakeLLM([agent.agent_role for agent in team]))
+
+
+def test_items_from_a_directory(tmp_path):
+    for name, text in [("b.txt", "second"), ("a.txt", "first"), (".hidden", "skipped")]:
+        (tmp_path / name).write_text(text)
+    items = load_items(str(tmp_path), "Check {name}: {text}")
+    assert [item.question for item in items] == ["Check a.txt: first", "Check b.txt: second"]
+    assert items[0].id == str(tmp_path / "a.txt")
+
+
+def test_worker_setup_does_not_mute_the_calling_process():
+    batch._init_worker(make_supervisor)
+    try:
+        assert logging.getLogger().manager.disable < logging.INFO
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def test_thread_batch_resumes(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    items = load_items([f"Question {i}?" for i in range(4)])
+    first = BatchRunner(make_supervisor, output, workers=2, backend="thread").run(items[:2])
+    assert first["completed"] == 2 and first["failed"] == 0
+    second = BatchRunner(make_supervisor, output, workers=2, backend="thread").run(items)
+    assert second["skipped"] == 2 and second["completed"] == 2
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record["id"] for record in records) == sorted(item.id for item in items)
+
+
+def test_question_ids_do_not_depend_on_the_order_of_the_inputs():
+    questions = [f"Question {i}?" for i in range(3)]
+    ids = {item.question: item.id for item in load_items(questions)}
+    reordered = load_items(["Question 9?"] + questions[::-1] + questions[:1])
+    assert len(reordered) == 4
+    assert all(ids[item.question] == item.id for item in reordered if item.question in ids)
+
+
+def test_resume_after_inserting_questions(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    BatchRunner(make_supervisor, output, workers=1, backend="thread").run(load_items(["Question 1?"]))
+    summary = BatchRunner(make_supervisor, output, workers=1, backend="thread").run(
+        load_items(["Question 0?", "Question 1?"]))
+    assert summary["skipped"] == 1 and summary["completed"] == 1
+
+
+def test_failed_items_record_their_usage(tmp_path, monkeypatch):
+    monkeypatch.setattr("supervisor_v2.default_backoff.delay", lambda attempt: 0)
+
+    class Down(FakeLLM):
+        def gptText(self, *args, **kwargs):
+            if self.calls >= 1:
+                raise ConnectionError("backend down")
+            return super().gptText(*args, **kwargs)
+
+    team = make_team(2)
+    output = str(tmp_path / "results.jsonl")
+    summary = BatchRunner(lambda: Supervisor(team, Down([agent.agent_role for agent in team])), output,
+                          workers=1, backend="thread").run(load_items(["Question?"]))
+    assert summary["failed"] == 1 and summary["calls"] == 1
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the checkpoint stores.
+
+Author: andreadesogus
+"""
+
+import pytest
+
+from checkpoint import Checkpoint, FileCheckpointStore, SQLiteCheckpointStore
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "file":
+        return FileCheckpointStore(str(tmp_path / "runs"))
+    return SQLiteCheckpointStore(str(tmp_path / "runs.db"))
+
+
+def test_round_trip_with_an_agent_without_output(store):
+    checkpoint = Checkpoint(run_id="run-1", question="Q?", iteration=2,
+                            context={"Analyst 1": "Clause 7 is void", "Analyst 2": None},
+                            pending={"delegation": True, "agent_role": "Analyst 3"})
+    store.save(checkpoint)
+    loaded = store.load("run-1")
+    assert loaded == checkpoint
+    assert loaded.context["Analyst 2"] is None
+
+
+def test_runs_by_status(store):
+    store.save(Checkpoint(run_id="done", question="Q?", status="completed"))
+    store.save(Checkpoint(run_id="crashed", question="Q?"))
+    assert store.runs("running") == ["crashed"]
+    assert sorted(store.runs()) == ["crashed", "done"]
+    store.delete("crashed")
+    assert store.load("crashed") is None
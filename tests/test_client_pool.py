@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the routing and failover of the provider pools.
+
+Author: andreadesogus
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from baseLLM import LLMProvider
+from client_pool import ProviderPool
+from fake_llm import make_completion
+from rate_limit import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class StreamingProvider(LLMProvider):
+    """
+    Streams a fixed answer, failing with error after the first fragments.
+    """
+    model = "fake"
+    embedding_model = "fake-embedding"
+
+    def __init__(self, answer, fail_after=None, error=None):
+        self.answer = answer
+        self.fail_after = fail_after
+        self.error = error or CircuitOpenError("endpoint down")
+        self.retry = RetryPolicy(breaker=CircuitBreaker())
+        self.calls = 0
+
+    def gptText(self, system, question=None, message=None, tools=None, tool_choice=None, _format="text",
+                use_cache=True, on_delta=None):
+        self.calls += 1
+        for i, word in enumerate(self.answer.split()):
+            if i == self.fail_after:
+                raise self.error
+            if on_delta is not None:
+                on_delta(word + " ")
+        return make_completion(self.answer)
+
+
+def test_fails_over_before_the_first_fragment():
+    down = StreamingProvider("never sent", fail_after=0)
+    up = StreamingProvider("second endpoint answer")
+    pool = ProviderPool([down, up])
+    deltas = []
+    pool.endpoints[1].outstanding = 1  # Route to the failing endpoint first
+    completion = pool.gptText("system", "question", on_delta=deltas.append)
+    assert completion.choices[0].message.content == "second endpoint answer"
+    assert down.calls == 1
+    assert "".join(deltas) == "second endpoint answer "
+
+
+def test_does_not_fail_over_mid_stream():
+    broken = StreamingProvider("partial answer then failure", fail_after=2)
+    other = StreamingProvider("other answer")
+    pool = ProviderPool([broken, other])
+    pool.endpoints[1].outstanding = 1
+    deltas = []
+    with pytest.raises(CircuitOpenError):
+        pool.gptText("system", "question", on_delta=deltas.append)
+    assert "".join(deltas) == "partial answer "
+    assert other.calls == 0
+
+
+def test_half_open_trial_in_flight_is_not_healthy():
+    provider = StreamingProvider("answer")
+    breaker = provider.retry.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    endpoint = ProviderPool([provider]).endpoints[0]
+    breaker.record_failure()
+    assert endpoint.healthy(0.0)  # Open past its timeout: ready for a trial
+    breaker.before_call()
+    assert breaker.state == "half-open" and not endpoint.healthy(0.0)
+    breaker.record_success()
+    assert endpoint.healthy(0.0)
+
+
+def test_provider_without_breaker_is_healthy():
+    endpoint = ProviderPool([SimpleNamespace(model="m", embedding_model="e")]).endpoints[0]
+    assert endpoint.healthy(0.0)
+
+
+def test_empty_pools_are_rejected():
+    with pytest.raises(ValueError):
+        ProviderPool([])
+    pool = ProviderPool([StreamingProvider("answer")])
+    pool.endpoints.clear()
+    with pytest.raises(RuntimeError, match="No endpoint available"):
+        pool.gptText("system", "question")
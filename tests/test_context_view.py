@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the budgeted views of the agents' outputs.
+
+Author: andreadesogus
+"""
+
+import json
+
+from agents import Agent
+from benchmark import make_team
+from checkpoint import FileCheckpointStore
+from context_view import DEFAULT_CONTEXT_TOKENS, ContextViews, OutputStore
+from fake_llm import FakeLLM
+from memory import ConversationMemory, estimate_tokens
+from supervisor_v2 import Supervisor
+
+CONTEXT = {"short": "x" * 40, "long": "y" * 4000, "medium": "z" * 800}
+
+
+def test_short_outputs_give_their_share_to_the_long_ones():
+    shares = ContextViews(100).allocate(list(CONTEXT.items()), 100)
+    assert shares["short"] == estimate_tokens(CONTEXT["short"])
+    assert sum(shares.values()) <= 100
+    assert shares["long"] >= shares["medium"] > shares["short"]
+
+
+def test_view_is_cut_to_the_budget_of_the_agent():
+    agent = Agent({"agent_role": "reader", "context": ["short", "long", "medium", "absent"]})
+    full = ContextViews().view(agent, CONTEXT)
+    assert CONTEXT["long"] in full and "absent" not in full
+    agent.context_budget = 100
+    assert estimate_tokens(ContextViews().view(agent, CONTEXT)) < estimate_tokens(full) // 10
+
+
+def test_outputs_are_cut_to_the_default_budget():
+    team = make_team(4)
+    roles = [agent.agent_role for agent in team]
+    context = {agent.agent_role: "w" * 40000 for agent in team}
+    supervisor = Supervisor(team, FakeLLM(roles))
+    assert supervisor.context_views.max_tokens == DEFAULT_CONTEXT_TOKENS
+    assert estimate_tokens(supervisor.context_views.view(team[-1], context)) <= DEFAULT_CONTEXT_TOKENS + 20
+    full = Supervisor(team, FakeLLM(roles), context_tokens=None)
+    assert full.context_views.view(team[-1], context).count("w") == 40000 * len(team[-1].context or [])
+
+
+def test_summaries_are_cached_per_summarizer():
+    calls = []
+
+    def summarize(text, max_tokens):
+        calls.append(text)
+        return "first"
+    views = ContextViews(10, summarize)
+    text = "v" * 4000
+    assert views.shorten(text, 10) == views.shorten(text, 10) == "first" and len(calls) == 1
+    assert ContextViews(10, lambda text, max_tokens: "second").shorten(text, 10) == "second"
+
+
+def test_memory_refers_to_the_outputs_kept_once():
+    team = make_team(2)
+    supervisor = Supervisor(team, FakeLLM([agent.agent_role for agent in team]))
+    outputs = OutputStore(max_tokens=100)
+    memory = ConversationMemory(render=outputs.render)
+    supervisor._merge_outputs([("a", "Q?")], ["y" * 4000], outputs, memory)
+    assert "yyy" not in json.dumps(memory.to_dict()) and outputs["a"] == "y" * 4000
+    said = memory.messages()[-1]["content"]
+    assert said.startswith("The a says: yyy") and estimate_tokens(said) <= 110
+
+    # A new answer of the same role keeps the superseded one in the memory
+    supervisor._merge_outputs([("a", "Again?")], ["z" * 40], outputs, memory)
+    contents = [message["content"] for message in memory.messages()]
+    assert contents[-1] == "The a says: " + "z" * 40 and "yyy" in contents[-3]
+    assert outputs == {"a": "z" * 40}
+
+
+def test_checkpoints_save_each_output_once(tmp_path):
+    team = make_team(3)
+    store = FileCheckpointStore(str(tmp_path))
+    Supervisor(team, FakeLLM([agent.agent_role for agent in team], output_bytes=20000),
+               checkpoints=store).execution("Q?", mode="dag")
+    state = store.load(store.runs("completed")[0])
+    # The memory refers to the outputs of the context, and its digest only keeps a line of each
+    said = [m["content"] for m in state.memory["window"] if " says: " in m["content"]]
+    assert said and all(content.endswith(OutputStore.reference(content.split(" says: ")[0][4:])) for content in said)
+    assert len(json.dumps(state.memory)) < min(len(output) for output in state.context.values())
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that importing the package is cheap and has no side effects, see
+benchmark.import_time.
+
+Author: andreadesogus
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import benchmark
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# base_v2 is an example script; benchmark and fake_llm are test tools built on openai
+MODULES = ["agents", "agents_ini", "baseLLM", "basetool", "batch", "checkpoint", "client_pool", "config",
+           "context_view", "error_handling", "events", "llm_cache", "memory", "metrics", "prompt_cache",
+           "rate_limit", "retrieval", "run_log", "structured_output", "supervisor_v2", "tool_cache",
+           "tracing", "vector_store"]
+
+PROBE = """
+import json, logging, sys
+for module in sys.argv[1:]:
+    __import__(module)
+import baseLLM
+baseLLM.openaiApis()
+print(json.dumps({
+    "loaded": sorted({name.split(".")[0] for name in sys.modules}),
+    "handlers": len(logging.getLogger().handlers),
+}))
+"""
+
+
+@pytest.fixture(scope="module")
+def imported():
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("TEAMWORK_", "OPENAI_"))}
+    result = subprocess.run([sys.executable, "-c", PROBE, *MODULES], capture_output=True, text=True,
+                            cwd=ROOT, env=env, check=True)
+    return json.loads(result.stdout)
+
+
+# Generous: importing takes a few tenths of a second, a regression such as an eager openai import doubles it
+IMPORT_BUDGET = 2.0
+
+
+def test_no_http_client_is_loaded_at_import(imported):
+    assert not {"openai", "httpx"} & set(imported["loaded"])
+
+
+def test_import_time_is_within_budget():
+    result = benchmark.import_time(runs=3)
+    assert result["side_effects"] == []
+    assert result["import_s"] <= IMPORT_BUDGET
+
+
+def test_providers_do_not_load_numpy_at_import():
+    probe = "import sys, baseLLM, client_pool, supervisor_v2, batch; print('numpy' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, cwd=ROOT, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_logging_is_not_configured_at_import(imported):
+    assert imported["handlers"] == 0
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the LLM response cache tiers.
+
+Author: andreadesogus
+"""
+
+import sqlite3
+import time
+
+from llm_cache import MemoryCache, SQLiteCache, TieredCache
+
+
+def _rows(cache):
+    return sqlite3.connect(cache.path).execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=3)
+    for i in range(3):
+        cache.set(f"k{i}", {"i": i})
+    assert cache.get("k0") == {"i": 0}
+    cache.set("k0", {"i": 0})  # Replacing an entry does not grow the cache
+    cache.set("k3", {"i": 3})
+    assert _rows(cache) == 3
+    assert cache.get("k1") is None
+    assert [cache.get(f"k{i}") for i in (0, 2, 3)] == [{"i": 0}, {"i": 2}, {"i": 3}]
+
+
+def test_size_is_counted_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = SQLiteCache(path, max_entries=4)
+    for i in range(4):
+        first.set(f"k{i}", {"i": i})
+    first.close()
+    second = SQLiteCache(path, max_entries=4)
+    second.set("k4", {"i": 4})
+    assert _rows(second) == 4
+
+
+def test_expired_entries_are_purged_when_full(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=2, ttl=60)
+    cache.set("old", {"i": 0})
+    cache._conn.execute("UPDATE llm_cache SET created = created - 120, accessed = accessed + 10")
+    cache.set("k1", {"i": 1})
+    cache.set("k2", {"i": 2})
+    assert _rows(cache) == 2
+    assert cache.get("k1") == {"i": 1} and cache.get("k2") == {"i": 2}
+
+
+def test_promotion_keeps_the_age_of_the_entry(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"))
+    disk.set("k", {"answer": 42})
+    disk._conn.execute("UPDATE llm_cache SET created = ?", (time.time() - 50,))
+    cache = TieredCache(MemoryCache(ttl=30), disk)
+    assert cache.get("k") == {"answer": 42}
+    # Promoted 50 s after it was cached: already past the 30 s of the memory tier
+    assert cache.memory.get("k") is None
+    fresh = TieredCache(MemoryCache(ttl=60), disk)
+    assert fresh.get("k") == {"answer": 42} and fresh.memory.get("k") == {"answer": 42}
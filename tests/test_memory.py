@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the supervisor's conversation memory.
+
+Author: andreadesogus
+"""
+
+from memory import ConversationMemory
+
+
+def turn(n: int, tokens: int = 250) -> dict:
+    return {"role": "user" if n % 2 else "assistant", "content": f"Turn {n}: " + "clause " * (tokens * 4 // 7)}
+
+
+def test_compaction_keeps_the_memory_within_its_budget():
+    memory = ConversationMemory(max_tokens=600, keep_last=4, digest_tokens=100)
+    memory.pin("Can you verify the presence and robustness of the fallback clause?")
+    for n in range(10):
+        memory.add([turn(n)])
+        assert memory.tokens() <= memory.max_tokens
+
+    assert memory.digest.startswith("- Turn")
+    assert [m["content"].split(":")[0] for m in memory.window] == ["Turn 6", "Turn 7", "Turn 8", "Turn 9"]
+
+
+def test_small_turns_are_kept_verbatim():
+    memory = ConversationMemory(max_tokens=600, keep_last=4, digest_tokens=100)
+    turns = [turn(n, tokens=20) for n in range(4)]
+    memory.add(turns)
+    assert memory.window == turns and not memory.digest
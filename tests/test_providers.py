@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the LLM providers against the fake OpenAI-compatible server.
+
+Author: andreadesogus
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from baseLLM import asyncLocalOpenaiApis, localOpenaiApis
+from fake_llm import FakeLLM, FakeOpenAIServer
+from vector_store import EmbeddingStore
+
+
+@pytest.fixture
+def server():
+    server = FakeOpenAIServer(FakeLLM(["Analyst 1"])).start()
+    yield server
+    server.stop()
+
+
+def test_local_provider_embeds_with_the_served_model_by_default(server):
+    ai = localOpenaiApis(server.url, "local-model")
+    assert ai.embedding_model == "local-model"
+    vectors = ai.embed_many(["clause one", "clause two"])
+    assert vectors.shape == (2, 8)
+
+
+def test_async_local_provider_embeds_with_the_served_model_by_default(server):
+    ai = asyncLocalOpenaiApis(server.url, "local-model")
+    assert ai.embedding_model == "local-model"
+    vectors = asyncio.run(ai.embed_many(["clause one", "clause two"]))
+    assert vectors.shape == (2, 8)
+
+
+class CountingEmbedder(FakeLLM):
+    """
+    A FakeLLM recording the batches sent for embedding.
+    """
+    def __init__(self):
+        super().__init__([])
+        self.batches = []
+
+    def _embed_batch(self, texts):
+        self.batches.append(list(texts))
+        return super()._embed_batch(texts)
+
+
+def test_embed_many_sends_each_text_once(tmp_path):
+    ai = CountingEmbedder()
+    store = EmbeddingStore(str(tmp_path), model=ai.embedding_model)
+    texts = ["clause one", "clause two", "clause one", "clause three", "clause two"]
+    vectors = ai.embed_many(texts, batch_size=2, store=store)
+    assert sorted(text for batch in ai.batches for text in batch) == ["clause one", "clause three", "clause two"]
+    assert all(len(batch) <= 2 for batch in ai.batches)
+    assert vectors.shape == (5, 8)
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    np.testing.assert_array_equal(vectors[1], vectors[4])
+    np.testing.assert_array_equal(vectors[3], np.float32(ai.embeddings("clause three")))
+
+    # Texts already in the store are not sent again
+    ai.batches.clear()
+    again = ai.embed_many(["clause two", "clause four"], store=store)
+    assert ai.batches == [["clause four"]]
+    np.testing.assert_array_equal(again[0], vectors[1])
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the retry policy and circuit breaker.
+
+Author: andreadesogus
+"""
+
+import asyncio
+
+import openai
+import pytest
+
+from rate_limit import Backoff, CircuitBreaker, CircuitOpenError, RateLimiter, RetryPolicy
+
+
+def _api_error(cls, status):
+    # Only the exception type matters to the policy, no HTTP response is needed
+    error = cls.__new__(cls, "error")
+    error.status_code = status
+    return error
+
+
+def _policy(max_retries=0):
+    return RetryPolicy(limiter=RateLimiter(), backoff=Backoff(base=0.0, max_delay=0.0),
+                       breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.0), max_retries=max_retries)
+
+
+def _raise(error):
+    def send():
+        raise error
+    return send
+
+
+def test_rate_limited_trial_call_does_not_wedge_the_circuit():
+    policy = _policy()
+    with pytest.raises(openai.InternalServerError):
+        policy.call(_raise(_api_error(openai.InternalServerError, 500)))
+    assert policy.breaker.state == "open"
+    # The trial call is throttled: the backend is up, the circuit must not stay half-open
+    with pytest.raises(openai.RateLimitError):
+        policy.call(_raise(_api_error(openai.RateLimitError, 429)))
+    assert policy.breaker.state != "half-open"
+    assert policy.call(lambda: "ok") == "ok"
+    assert policy.breaker.state == "closed"
+
+
+def test_failed_trial_call_reopens_the_circuit():
+    policy = _policy()
+    policy.breaker.reset_timeout = 60.0
+    with pytest.raises(openai.InternalServerError):
+        policy.call(_raise(_api_error(openai.InternalServerError, 500)))
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda: "ok")
+
+
+def test_cancelled_trial_call_releases_the_slot():
+    policy = _policy()
+    with pytest.raises(openai.InternalServerError):
+        policy.call(_raise(_api_error(openai.InternalServerError, 500)))
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(policy.acall(cancelled))
+    assert policy.breaker.state == "open"
+    assert asyncio.run(policy.acall(lambda: asyncio.sleep(0, "ok"))) == "ok"
+
+
+def test_interrupted_trial_call_releases_the_slot():
+    policy = _policy()
+    with pytest.raises(openai.InternalServerError):
+        policy.call(_raise(_api_error(openai.InternalServerError, 500)))
+    with pytest.raises(KeyboardInterrupt):
+        policy.call(_raise(KeyboardInterrupt()))
+    assert policy.call(lambda: "ok") == "ok"
+
+
+def test_throttled_attempts_refund_their_token_reservation():
+    limiter = RateLimiter(tpm=1000)
+    policy = RetryPolicy(limiter=limiter, backoff=Backoff(base=0.0, max_delay=0.0), max_retries=3)
+    responses = [_api_error(openai.RateLimitError, 429)] * 3 + ["ok"]
+
+    def send():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert policy.call(send, tokens=200) == "ok"
+    # Only the attempt that went through holds its reservation
+    assert 790 <= limiter.tokens._tokens <= 810
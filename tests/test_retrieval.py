@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the document index and its embedding store.
+
+Author: andreadesogus
+"""
+
+import numpy as np
+
+from fake_llm import FakeLLM
+from retrieval import DocumentIndex
+from vector_store import EmbeddingStore, text_hash
+
+
+def version(n: int) -> str:
+    return "\n\n".join(f"Clause {i} of version {n}: the benchmark fallback applies." for i in range(4))
+
+
+def test_reindexing_drops_superseded_chunks(tmp_path):
+    index = DocumentIndex(FakeLLM([]), str(tmp_path), chunk_tokens=20)
+    index.add_text("Unrelated memo about the fee schedule.", "memo.txt")
+    for n in range(6):
+        index.add_text(version(n), "contract.txt")
+        current = sum(len(document["chunks"]) for document in index.documents.values())
+        assert len(index.chunks) <= 2 * current
+        assert len(index.store) <= len(index.chunks)
+
+    index.compact()
+    assert all(chunk["source"] is not None for chunk in index.chunks)
+    assert len(index.store) == len({text_hash(chunk["text"]) for chunk in index.chunks})
+    results = index.search("benchmark fallback", k=10, source="contract.txt")
+    assert results and all("version 5" in result["text"] for result in results)
+
+    reopened = DocumentIndex(FakeLLM([]), str(tmp_path), chunk_tokens=20)
+    assert reopened.documents == index.documents
+    assert [chunk["text"] for chunk in reopened.search("fee", k=10)] == [chunk["text"] for chunk in index.search("fee", k=10)]
+
+
+def test_compaction_keeps_the_kept_vectors(tmp_path):
+    store = EmbeddingStore(str(tmp_path), model="m")
+    keys = [text_hash(str(i)) for i in range(5)]
+    vectors = np.arange(15, dtype=np.float32).reshape(5, 3)
+    store.add(keys, vectors)
+
+    assert store.compact([keys[1], keys[3]]) == 3
+    assert len(store) == 2
+    np.testing.assert_array_equal(store.get([keys[3], keys[1]]), vectors[[3, 1]])
+
+    reopened = EmbeddingStore(str(tmp_path), model="m")
+    np.testing.assert_array_equal(reopened.get([keys[1], keys[3]]), vectors[[1, 3]])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["keys.1.txt", "meta.json", "vectors.1.f32"]
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the supervision runs, with Supervisor and AsyncSupervisor held to
+the same behaviour.
+
+Author: andreadesogus
+"""
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from agents import Team
+from agents_ini import DefaultAgentSystem
+from basetool import CustomTool, OpenaiFunctionCalling
+from benchmark import make_team
+from checkpoint import FileCheckpointStore
+from fake_llm import FakeLLM, make_completion
+from supervisor_v2 import EXECUTION_MODES, AsyncSupervisor, Supervisor
+from tool_cache import ToolResultCache
+
+
+class AsyncFakeLLM:
+    """
+    Serves the FakeLLM conversation to an AsyncSupervisor.
+    """
+    def __init__(self, fake: FakeLLM):
+        self.fake = fake
+
+    def __getattr__(self, name):
+        return getattr(self.fake, name)
+
+    async def gptText(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return self.fake.gptText(*args, **kwargs)
+
+
+class FailingAfter(FakeLLM):
+    """
+    A FakeLLM whose calls fail once the first calls have been served.
+    """
+    def __init__(self, roles, served: int):
+        super().__init__(roles)
+        self.served = served
+
+    def gptText(self, *args, **kwargs):
+        if self.calls >= self.served:
+            raise ConnectionError("backend down")
+        return super().gptText(*args, **kwargs)
+
+
+class ToolHungryLLM(FakeLLM):
+    """
+    A FakeLLM whose agents keep requesting their first tool until told not to.
+    """
+    def __init__(self, roles):
+        super().__init__(roles)
+        self.tool_choices = []
+
+    def gptText(self, system, question=None, message=None, tools=None, tool_choice=None, *args, **kwargs):
+        if tools:
+            self.tool_choices.append(tool_choice)
+        if tools and tool_choice != "none":
+            function = tools[0]["function"]
+            with self._lock:
+                self.calls += 1
+            return make_completion(tool_calls=[{"name": function["name"], "arguments": {"key": "clause 7"}}])
+        return super().gptText(system, question, message, tools, tool_choice, *args, **kwargs)
+
+
+def _team(size=4):
+    team = make_team(size)
+    return team, [agent.agent_role for agent in team]
+
+
+def _run(supervisor_class, mode, **kwargs):
+    team, roles = _team()
+    fake = FakeLLM(roles)
+    if supervisor_class is Supervisor:
+        supervisor = Supervisor(team, fake, **kwargs)
+        events = list(supervisor.stream_execution("Q?", mode=mode))
+    else:
+        supervisor = AsyncSupervisor(team, AsyncFakeLLM(fake), **kwargs)
+
+        async def collect():
+            return [event async for event in supervisor.stream_execution("Q?", mode=mode)]
+        events = asyncio.run(collect())
+    return events, fake.calls, supervisor.last_report
+
+
+@pytest.mark.parametrize("mode", EXECUTION_MODES)
+def test_sync_and_async_runs_agree(mode):
+    sync_events, sync_calls, sync_report = _run(Supervisor, mode)
+    async_events, async_calls, async_report = _run(AsyncSupervisor, mode)
+    assert sync_events[-1].type == "final_answer"
+    assert sync_events[-1].answer == async_events[-1].answer == "Final answer based on 4 agents."
+    assert sync_calls == async_calls
+    assert [event.type for event in sync_events] == [event.type for event in async_events]
+    outputs = [(event.agent_role, event.output) for event in sync_events if event.type == "agent_output"]
+    assert outputs == [(event.agent_role, event.output) for event in async_events if event.type == "agent_output"]
+    assert [role for role, output in outputs] == [f"Analyst {i}" for i in range(1, 5)]
+    assert sync_report["calls"] == async_report["calls"] == sync_calls
+
+
+@pytest.mark.parametrize("supervisor_class", [Supervisor, AsyncSupervisor])
+def test_speculation_hits(supervisor_class):
+    events, calls, report = _run(supervisor_class, "supervised", speculative=True, speculation_match="role")
+    assert events[-1].answer == "Final answer based on 4 agents."
+    # The agents with a lookup tool, which is not cacheable, are never speculated
+    assert report["speculation"]["attempts"] == report["speculation"]["hits"] == 2
+
+
+def test_supervisor_calls_per_mode():
+    calls = {mode: _run(Supervisor, mode)[1] for mode in EXECUTION_MODES}
+    agent_calls = 4 + 2  # two agents call a tool first
+    assert calls == {"supervised": agent_calls + 5, "dag": agent_calls + 1, "plan": agent_calls + 2}
+
+
+def test_invalid_replies_are_retried():
+    team, roles = _team(2)
+    fake = FakeLLM(roles)
+    replies = iter(["not json", "still not json"])
+    supervise = fake._supervise
+    fake._supervise = lambda messages: make_completion(next(replies, None)) if fake.calls < 2 else supervise(messages)
+    assert Supervisor(team, fake).execution("Q?") == "Final answer based on 2 agents."
+
+
+@pytest.mark.parametrize("supervisor_class", [Supervisor, AsyncSupervisor])
+@pytest.mark.parametrize("mode", EXECUTION_MODES)
+def test_interrupted_run_resumes(tmp_path, monkeypatch, supervisor_class, mode):
+    monkeypatch.setattr("supervisor_v2.default_backoff.delay", lambda attempt: 0)
+    team, roles = _team()
+    store = FileCheckpointStore(str(tmp_path))
+    failing = FailingAfter(roles, served=4)
+    resumed = FakeLLM(roles)
+    if supervisor_class is Supervisor:
+        with pytest.raises(ConnectionError):
+            Supervisor(team, failing, checkpoints=store).execution("Q?", mode=mode)
+        run_id = store.runs("failed")[0]
+        output = Supervisor(team, resumed, checkpoints=store).resume(run_id)
+    else:
+        with pytest.raises(ConnectionError):
+            asyncio.run(AsyncSupervisor(team, AsyncFakeLLM(failing), checkpoints=store).execution("Q?", mode=mode))
+        run_id = store.runs("failed")[0]
+        output = asyncio.run(AsyncSupervisor(team, AsyncFakeLLM(resumed), checkpoints=store).resume(run_id))
+    assert output == "Final answer based on 4 agents."
+    assert store.load(run_id).status == "completed"
+    assert resumed.calls < _run(Supervisor, mode)[1]
+
+
+@pytest.mark.parametrize("supervisor_class", [Supervisor, AsyncSupervisor])
+def test_tool_rounds_are_capped(supervisor_class):
+    team = make_team(1, tools_every=1)
+    fake = ToolHungryLLM([team[0].agent_role])
+    if supervisor_class is Supervisor:
+        output = Supervisor(team, fake, max_tool_steps=2).ask_agent("Q?", "Analyst 1", {})
+    else:
+        output = asyncio.run(AsyncSupervisor(team, AsyncFakeLLM(fake), max_tool_steps=2).ask_agent("Q?", "Analyst 1", {}))
+    # Two tool rounds, then a last call that may not use tools
+    assert fake.tool_choices == ["auto", "auto", "auto", "none"]
+    assert output == "Output of Analyst 1."
+
+
+def _planning_run(accept_output, max_replans=2):
+    team = make_team(3, tools_every=0)
+    fake = FakeLLM([agent.agent_role for agent in team])
+    plans = []
+    plan = fake._plan
+    fake._plan = lambda messages: plans.append(messages[-1]["content"]) or plan(messages)
+    supervisor = Supervisor(team, fake, accept_output=accept_output, max_replans=max_replans)
+    events = list(supervisor.stream_execution("Q?", mode="plan"))
+    return events, plans
+
+
+def test_flagged_outputs_are_replanned():
+    rejected = []
+
+    def accept_output(agent_role, output):
+        # The first answer of Analyst 2 is unsatisfactory
+        if agent_role == "Analyst 2" and not rejected:
+            rejected.append(output)
+            return False
+        return True
+
+    events, plans = _planning_run(accept_output)
+    assert len(plans) == 2 and "Analyst 2 were flagged" in plans[1]
+    answered = [event.agent_role for event in events if event.type == "agent_output"]
+    assert answered == ["Analyst 1", "Analyst 2", "Analyst 2", "Analyst 3"]
+    assert events[-1].answer == "Final answer based on 3 agents."
+
+
+def test_replans_are_capped():
+    events, plans = _planning_run(lambda agent_role, output: agent_role != "Analyst 2", max_replans=1)
+    assert len(plans) == 2
+    answered = [event.agent_role for event in events if event.type == "agent_output"]
+    assert answered.count("Analyst 2") == 2 and answered[-1] == "Analyst 3"
+    assert events[-1].type == "final_answer"
+
+
+def test_concurrent_runs_get_their_own_reports():
+    team, roles = _team(2)
+    fake = FakeLLM(roles)
+    supervisor = AsyncSupervisor(team, AsyncFakeLLM(fake))
+
+    async def run_all():
+        return await asyncio.gather(supervisor.execution("Q?", mode="dag", return_report=True),
+                                    supervisor.execution("Q?", mode="supervised", return_report=True))
+
+    (dag_answer, dag_report), (supervised_answer, supervised_report) = asyncio.run(run_all())
+    assert dag_answer == supervised_answer == "Final answer based on 2 agents."
+    assert dag_report["run_id"] != supervised_report["run_id"]
+    assert (dag_report["calls"], supervised_report["calls"]) == (2 + 1 + 1, 2 + 1 + 3)
+    assert dag_report["calls"] + supervised_report["calls"] == fake.calls
+
+
+def test_failed_runs_carry_their_report(monkeypatch):
+    monkeypatch.setattr("supervisor_v2.default_backoff.delay", lambda attempt: 0)
+    team, roles = _team(2)
+    with pytest.raises(ConnectionError) as failure:
+        Supervisor(team, FailingAfter(roles, served=2)).execution("Q?")
+    assert failure.value.run_report["calls"] == 2
+
+
+def test_discarded_speculation_stops_before_its_next_call():
+    reads = []
+
+    def read_clause(key: str):
+        """
+        Reads a clause.
+
+        :param key: The clause.
+        """
+        reads.append(key)
+        return "Clause 7"
+
+    team = make_team(1)
+    team[0].tools = [CustomTool(read_clause, cacheable=True, cache=ToolResultCache())]
+    fake = FakeLLM([team[0].agent_role])
+    started, release = threading.Event(), threading.Event()
+    work = fake._work
+
+    def blocking_work(messages, tools):
+        started.set()
+        release.wait(5)
+        return work(messages, tools)
+
+    fake._work = blocking_work
+    speculation = Supervisor(team, fake, speculative=True)._speculate("Q?", {}, iteration=0)
+    assert speculation is not None and started.wait(5)
+    speculation.cancel()
+    release.set()
+    with pytest.raises(CancelledError):
+        speculation.result.result(timeout=5)
+    # The call in flight, a tool request, completed; the tool and the next call were not made
+    assert fake.calls == 1 and reads == []
+
+
+def test_prompts_and_tool_schemas_are_compiled_once(monkeypatch):
+    built = []
+    for cls, name in [(Team, "agent_mapping"), (DefaultAgentSystem, "_build_prefix"),
+                      (OpenaiFunctionCalling, "_build_function_definitions")]:
+        original = getattr(cls, name)
+
+        def counting(self, original=original, name=name):
+            built.append(name)
+            return original(self)
+        monkeypatch.setattr(cls, name, counting)
+
+    team, roles = _team()
+    supervisor = Supervisor(team, FakeLLM(roles))
+    for mode in ("supervised", "plan", "supervised"):
+        supervisor.execution("Q?", mode=mode)
+    # Two agents have tools; the supervisor and planner prompts map the team once each
+    assert sorted(built) == sorted(["_build_function_definitions"] * 2 + ["_build_prefix"] * 4
+                                   + ["agent_mapping"] * 2)
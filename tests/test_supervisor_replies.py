@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the validation and local repair of the supervisor's replies.
+
+Author: andreadesogus
+"""
+
+import json
+
+import pytest
+
+from benchmark import make_team
+from fake_llm import FakeLLM
+from supervisor_v2 import Supervisor
+from tracing import span
+
+
+@pytest.fixture
+def supervisor():
+    team = make_team(3)
+    return Supervisor(team, FakeLLM([agent.agent_role for agent in team]))
+
+
+def _parse(supervisor, reply):
+    with span("supervisor_call") as call_span:
+        return supervisor._parse_decision(json.dumps(reply), call_span)
+
+
+@pytest.mark.parametrize("agent_role", ["", "N/A", "none", "Nobody"])
+def test_final_answer_with_a_placeholder_role(supervisor, agent_role):
+    decision = _parse(supervisor, {"delegation": False, "agent_role": agent_role, "answer": "done", "stop": True})
+    assert not decision.delegation and decision.stop
+    assert decision.answer == "done"
+
+
+def test_placeholder_role_does_not_imply_a_delegation(supervisor):
+    decision = _parse(supervisor, {"agent_role": "N/A", "question": None, "answer": "done"})
+    assert decision.agent_role is None
+    assert not decision.delegation and decision.stop
+
+
+def test_misspelt_role_is_matched(supervisor):
+    decision = _parse(supervisor, {"delegation": True, "agent_role": "analyst  2", "question": "q",
+                                   "answer": None, "stop": False})
+    assert decision.agent_role == "Analyst 2"
+
+
+def test_unknown_role_is_rejected(supervisor):
+    with pytest.raises(ValueError, match="Unknown agent role"):
+        _parse(supervisor, {"delegation": True, "agent_role": "Lawyer", "question": "q", "answer": None, "stop": False})
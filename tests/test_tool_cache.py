@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the tool result cache and its invalidation when files change.
+
+Author: andreadesogus
+"""
+
+import json
+import os
+from types import SimpleNamespace
+
+from basetool import CustomTool, ToolResponseHandler
+from tool_cache import ToolResultCache
+
+reads = []
+
+
+def read_file(filepath: str) -> str:
+    """
+    Reads a file.
+
+    :param filepath: A file's path
+    """
+    reads.append(filepath)
+    with open(filepath, "r") as f:
+        return f.read()
+
+
+def tool_call(arguments):
+    function = SimpleNamespace(name="read_file", arguments=json.dumps(arguments))
+    return SimpleNamespace(id=f"call_{len(reads)}", function=function)
+
+
+def test_file_results_are_reused_until_the_file_changes(tmp_path, monkeypatch):
+    reads.clear()
+    cache = ToolResultCache()
+    tool = CustomTool(read_file, cacheable=True, file_params=["filepath"], cache=cache)
+    handler = ToolResponseHandler(None, SimpleNamespace(agent_role="Lawyer"), None)
+    path = tmp_path / "contract.txt"
+    path.write_text("Clause 7: fallback.")
+    monkeypatch.chdir(tmp_path)
+
+    first = handler._run_tool_call(tool_call({"filepath": str(path)}), {"read_file": tool})
+    # A relative path to the same file is the same call
+    second = handler._run_tool_call(tool_call({"filepath": "contract.txt"}), {"read_file": tool})
+    assert first["content"] == second["content"] == "Clause 7: fallback."
+    assert len(reads) == 1 and cache.hits == 1
+
+    path.write_text("Clause 7: fallback, amended.")
+    os.utime(path, ns=(0, 0))
+    third = handler._run_tool_call(tool_call({"filepath": str(path)}), {"read_file": tool})
+    assert third["content"] == "Clause 7: fallback, amended."
+    assert len(reads) == 2 and cache.invalidations == 1
+
+
+def test_deleted_files_invalidate_their_entries(tmp_path):
+    cache = ToolResultCache()
+    tool = CustomTool(read_file, cacheable=True, file_params=["filepath"], cache=cache)
+    path = tmp_path / "contract.txt"
+    path.write_text("Clause 7")
+    cache.store(tool, {"filepath": str(path)}, "Clause 7")
+    assert cache.lookup(tool, {"filepath": str(path)}) == (True, "Clause 7")
+    path.unlink()
+    assert cache.lookup(tool, {"filepath": str(path)}) == (False, None)
+    assert cache.stats()["entries"] == 0
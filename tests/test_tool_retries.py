@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the tool retries and the repair of failing tool inputs.
+
+Author: andreadesogus
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import basetool
+from basetool import ToolResponseHandler
+
+
+class RepairLLM:
+    """
+    Answers every input repair request with the same reply.
+    """
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    def gptText(self, system, question, _format=None):
+        self.calls += 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def lookup(clause: str) -> str:
+    """
+    Looks a clause up.
+
+    Args:
+        clause (str): The clause number.
+    """
+    if clause != "7":
+        raise KeyError(f"No clause {clause}")
+    return "Clause 7"
+
+
+@pytest.fixture
+def handler_for(monkeypatch):
+    monkeypatch.setattr(basetool.time, "sleep", lambda delay: None)
+    agent = SimpleNamespace(agent_role="Lawyer", task_description="Reads contracts", resources="")
+    return lambda ai: ToolResponseHandler(None, agent, ai)
+
+
+def test_inputs_are_not_repaired_after_the_last_attempt(handler_for):
+    ai = RepairLLM('{"clause": "8"}')
+    with pytest.raises(KeyError):
+        handler_for(ai).call_function_dynamically(lookup, {"clause": "1"}, retries=3)
+    assert ai.calls == 2
+
+
+def test_repaired_inputs_are_used(handler_for):
+    ai = RepairLLM('{"clause": "7"}')
+    assert handler_for(ai).call_function_dynamically(lookup, {"clause": "1"}, retries=3) == "Clause 7"
+    assert ai.calls == 1
+
+
+def test_unparsable_repair_keeps_the_tool_error(handler_for):
+    ai = RepairLLM("Sorry, I cannot help with that.")
+    with pytest.raises(KeyError, match="No clause 1"):
+        handler_for(ai).call_function_dynamically(lookup, {"clause": "1"}, retries=2)
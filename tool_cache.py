@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Result cache for pure tools, with invalidation of file-backed entries.
+
+Author: andreadesogus
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def file_fingerprint(path: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Identifies the current version of a file.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        tuple: The absolute path, modification time (ns) and size, or None if
+        the file cannot be read.
+    """
+    path = os.path.abspath(os.path.expanduser(str(path)))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class ToolResultCache:
+    """
+    Bounded LRU cache of tool results, keyed by tool name and normalized
+    arguments. Entries of tools reading files (see CustomTool.file_params)
+    also store the fingerprint of every file argument and are dropped as soon
+    as one of the files changes.
+
+    Attributes:
+        max_entries (int): Maximum number of entries kept.
+        ttl (Optional[float]): Lifetime of an entry, in seconds; None keeps it until evicted.
+        hits (int): Number of calls served from the cache.
+        misses (int): Number of calls that ran the tool.
+        invalidations (int): Number of entries dropped because a file changed or expired.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool, arguments: Dict) -> str:
+        """
+        Normalizes a call: file arguments become absolute paths and the
+        arguments are encoded in key order.
+
+        Args:
+            tool (CustomTool): The tool.
+            arguments (dict): The call arguments.
+
+        Returns:
+            str: The cache key.
+        """
+        file_params = getattr(tool, "file_params", None) or []
+        normalized = {name: os.path.abspath(os.path.expanduser(str(value))) if name in file_params else value
+                      for name, value in arguments.items()}
+        return json.dumps([tool.name, normalized], sort_keys=True, default=str)
+
+    @staticmethod
+    def fingerprints(tool, arguments: Dict) -> List:
+        """
+        Returns the fingerprints of the files a call reads.
+        """
+        file_params = getattr(tool, "file_params", None) or []
+        return [file_fingerprint(arguments[name]) for name in file_params if name in arguments]
+
+    def lookup(self, tool, arguments: Dict) -> Tuple[bool, Any]:
+        """
+        Looks a call up.
+
+        Args:
+            tool (CustomTool): The tool.
+            arguments (dict): The call arguments.
+
+        Returns:
+            tuple: (True, result) on a hit, (False, None) otherwise.
+        """
+        key = self.key(tool, arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            result, fingerprints, stored = entry
+            expired = self.ttl is not None and time.time() - stored > self.ttl
+            if not expired and fingerprints == self.fingerprints(tool, arguments):
+                with self._lock:
+                    self.hits += 1
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                return True, result
+            with self._lock:
+                self.invalidations += 1
+                self._entries.pop(key, None)
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def store(self, tool, arguments: Dict, result: Any, fingerprints: List = None):
+        """
+        Stores the result of a call.
+
+        Args:
+            tool (CustomTool): The tool.
+            arguments (dict): The call arguments.
+            result (Any): The tool result.
+            fingerprints (list): The file fingerprints taken before the call ran,
+                so a file modified during the call invalidates the entry.
+        """
+        if fingerprints is None:
+            fingerprints = self.fingerprints(tool, arguments)
+        with self._lock:
+            self._entries[self.key(tool, arguments)] = (result, fingerprints, time.time())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        """
+        Returns the share of lookups served from the cache.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict:
+        """
+        Returns the cache statistics.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hit_rate(),
+            }
+
+    def clear(self):
+        """
+        Removes every entry and resets the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+
+# Process-wide cache used by the cacheable tools that do not bring their own
+tool_cache = ToolResultCache()
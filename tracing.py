@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Hierarchical tracing of supervision runs:
+run -> iteration -> supervisor call or ask_agent -> LLM call or tool call.
+
+Spans follow the context like usage scopes and events, so the spans of
+agents asked concurrently, in threads or tasks, land under the right
+parent. Finished runs are handed to the configured exporter; the
+ChromeTraceExporter writes the Trace Event format read by chrome://tracing
+and https://ui.perfetto.dev, where each run shows as a timeline.
+
+Example:
+    configure_tracing(ChromeTraceExporter("traces/"))
+    supervisor.execution(question)   # writes traces/trace-<run_id>.json
+
+Tracing is off until an exporter is configured; until then a span costs
+a context variable lookup.
+
+Author: andreadesogus
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+_current_trace = ContextVar("trace", default=None)
+_current_span = ContextVar("span", default=None)
+
+# Receives every finished Trace; None disables tracing
+_exporter = None
+
+
+def _execution_unit():
+    """
+    Identifies the thread, and the asyncio task if any, running the caller:
+    spans of different units may overlap, so they get different lanes.
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return threading.get_ident(), id(task) if task is not None else None
+
+
+class Span:
+    """
+    A timed operation of a run.
+
+    Attributes:
+        name (str): What the span measures, e.g. "ask_agent" or "tool_call".
+        attributes (dict): Details such as the agent role, tokens or the tool name.
+        parent (Optional[Span]): The enclosing span.
+        start (int): Start time, in nanoseconds from the start of the trace.
+        end (Optional[int]): End time, None while running.
+        lane (int): The timeline row of the span; concurrent spans get different rows.
+    """
+    __slots__ = ("trace", "name", "attributes", "parent", "start", "end", "lane", "_unit", "_token")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: Dict):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start = 0
+        self.end = None
+        self._unit = _execution_unit()
+        self.lane = parent.lane if parent is not None and parent._unit == self._unit else trace.new_lane()
+        self._token = None
+
+    @property
+    def duration(self) -> float:
+        """
+        The duration in seconds, so far if still running.
+        """
+        end = self.end if self.end is not None else time.perf_counter_ns() - self.trace.started
+        return (end - self.start) / 1e9
+
+    def set(self, **attributes):
+        """
+        Adds attributes to the span.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter_ns() - self.trace.started
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter_ns() - self.trace.started
+        if exc is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.trace.add(self)
+        return False
+
+
+class _NoSpan:
+    """
+    Stands for a span when tracing is off.
+    """
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """
+    The finished spans of one run.
+
+    Attributes:
+        run_id (str): The run id, see run_log.run_scope.
+        spans (list): The finished spans, in end order.
+        started (int): perf_counter_ns() at the start of the run.
+        wall_start (float): time.time() at the start of the run.
+    """
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.spans = []
+        self.started = time.perf_counter_ns()
+        self.wall_start = time.time()
+        self._lanes = 0
+        self._lock = threading.Lock()
+
+    def new_lane(self) -> int:
+        with self._lock:
+            self._lanes += 1
+            return self._lanes
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> Dict[str, Dict]:
+        """
+        Returns the count, total and self time (total minus child spans) of
+        every span name, in seconds, to see at a glance where a run's time went.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        children = {}
+        for span in spans:
+            if span.parent is not None:
+                children[id(span.parent)] = children.get(id(span.parent), 0.0) + span.duration
+        summary = {}
+        for span in spans:
+            entry = summary.setdefault(span.name, {"count": 0, "total": 0.0, "self": 0.0})
+            entry["count"] += 1
+            entry["total"] += span.duration
+            entry["self"] += max(0.0, span.duration - children.get(id(span), 0.0))
+        return summary
+
+    def to_chrome(self) -> Dict:
+        """
+        Returns the trace in the Chrome Trace Event format, one complete ("X")
+        event per span and one timeline row per lane.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        origin = self.wall_start * 1e6
+        events = []
+        lanes = {}
+        for span in spans:
+            lanes.setdefault(span.lane, span.attributes.get("role") or span.name)
+            role = span.attributes.get("role")
+            events.append({
+                "name": f"{span.name} {role}" if span.name == "ask_agent" and role else span.name,
+                "cat": "teamwork",
+                "ph": "X",
+                "ts": origin + span.start / 1e3,
+                "dur": (span.end - span.start) / 1e3,
+                "pid": 1,
+                "tid": span.lane,
+                "args": span.attributes,
+            })
+        events.extend({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": name}}
+                      for lane, name in lanes.items())
+        events.append({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"run {self.run_id}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"run_id": self.run_id, "breakdown": self.breakdown()}}
+
+
+class ChromeTraceExporter:
+    """
+    Writes every finished run to directory/trace-<run_id>.json.
+
+    Attributes:
+        directory (str): Where the traces are written.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"trace-{run_id}.json")
+
+    def __call__(self, trace: Trace):
+        with open(self.path(trace.run_id), "w") as f:
+            json.dump(trace.to_chrome(), f, default=str)
+
+
+def configure_tracing(exporter: Optional[Callable[[Trace], None]] = None):
+    """
+    Sets the process-wide exporter of finished runs, e.g. a ChromeTraceExporter
+    or list.append; None turns tracing off.
+    """
+    global _exporter
+    _exporter = exporter
+
+
+class trace_run:
+    """
+    Traces a run under a root "run" span and exports it when the run ends.
+    Does nothing when tracing is off or a run is already being traced.
+
+    Args:
+        run_id (str): The run id.
+        **attributes: Attributes of the root span.
+    """
+    def __init__(self, run_id: str, **attributes):
+        self.run_id = run_id
+        self.attributes = attributes
+        self.exporter = _exporter
+        self.trace = None
+
+    def __enter__(self):
+        if self.exporter is None or _current_trace.get() is not None:
+            return _NO_SPAN
+        self.trace = Trace(self.run_id)
+        self._token = _current_trace.set(self.trace)
+        self._root = Span(self.trace, "run", None, self.attributes).__enter__()
+        return self._root
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is None:
+            return False
+        self._root.__exit__(exc_type, exc, tb)
+        _current_trace.reset(self._token)
+        self.exporter(self.trace)
+        return False
+
+
+def span(name: str, **attributes):
+    """
+    Returns a span of the current run, to use as a context manager, e.g.
+    with span("tool_call", tool=name) as s: ...; s.set(cached=True).
+    Outside a traced run, a span that does nothing.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return Span(trace, name, _current_span.get(), attributes)
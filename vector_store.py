@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only, memory-mappable store of embeddings keyed by text hash.
+
+Author: andreadesogus
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the key of a text in an EmbeddingStore.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Embeddings of one model and size, stored as packed float32 rows in a raw
+    file that is only ever appended to and read through np.memmap, with the
+    text hash of every row in a companion file. A vector takes 4 bytes per
+    dimension on disk and no memory until it is read. compact() drops the
+    rows no longer needed by rewriting both files as a new generation, which
+    meta.json switches to in a single step.
+
+    Attributes:
+        directory (str): Where the files are stored.
+        model (Optional[str]): The embedding model; a store refuses vectors of another model.
+        dimensions (Optional[int]): The vector size, known after the first vector.
+    """
+    VECTORS_FILE = "vectors.f32"
+    KEYS_FILE = "keys.txt"
+    META_FILE = "meta.json"
+
+    def __init__(self, directory: str, model: Optional[str] = None, dimensions: Optional[int] = None):
+        self.directory = directory
+        self.model = model
+        self.dimensions = dimensions
+        self._rows = {}
+        self._count = 0
+        self._memmap = None
+        self._generation = 0
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        """
+        Returns the path of VECTORS_FILE or KEYS_FILE in a generation, the current one by default.
+        """
+        generation = self._generation if generation is None else generation
+        if generation:
+            base, extension = os.path.splitext(name)
+            name = f"{base}.{generation}{extension}"
+        return self._path(name)
+
+    def _write_meta(self):
+        tmp_path = self._path(self.META_FILE) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"model": self.model, "dimensions": self.dimensions, "generation": self._generation}, f)
+        os.replace(tmp_path, self._path(self.META_FILE))
+
+    def _load(self):
+        """
+        Reads the store written by a previous session, if any, dropping the
+        rows of an interrupted append.
+        """
+        meta_path = self._path(self.META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        for name in ("model", "dimensions"):
+            stored, wanted = meta.get(name), getattr(self, name)
+            if wanted is not None and stored is not None and stored != wanted:
+                raise ValueError(f"Store {self.directory} holds {name}={stored}, not {wanted}")
+        self.model = meta.get("model") or self.model
+        self.dimensions = meta.get("dimensions") or self.dimensions
+        self._generation = meta.get("generation", 0)
+        if not self.dimensions:
+            return
+
+        keys_path, vectors_path = self._file(self.KEYS_FILE), self._file(self.VECTORS_FILE)
+        keys = []
+        if os.path.exists(keys_path):
+            with open(keys_path, "r") as f:
+                keys = [line.strip() for line in f if line.strip()]
+        vector_rows = os.path.getsize(vectors_path) // (4 * self.dimensions) if os.path.exists(vectors_path) else 0
+        count = min(len(keys), vector_rows)
+        if count != len(keys) or count != vector_rows:
+            logging.warning(f"Store {self.directory} was not closed cleanly, keeping its first {count} rows.")
+            with open(vectors_path, "r+b") as f:
+                f.truncate(count * 4 * self.dimensions)
+            with open(keys_path, "w") as f:
+                f.writelines(f"{key}\n" for key in keys[:count])
+        for row, key in enumerate(keys[:count]):
+            self._rows.setdefault(key, row)
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def rows(self, keys: Iterable[str]) -> Dict[str, int]:
+        """
+        Returns the row of every known key.
+        """
+        with self._lock:
+            return {key: self._rows[key] for key in keys if key in self._rows}
+
+    def add(self, keys: List[str], vectors: np.ndarray) -> List[int]:
+        """
+        Appends vectors; keys already stored keep their existing row.
+
+        Args:
+            keys (list): The text hash of every vector.
+            vectors (np.ndarray): The (len(keys), dimensions) vectors.
+
+        Returns:
+            list: The row of every key.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = int(vectors.shape[1])
+            elif len(keys) and vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Vectors of size {vectors.shape[1]} do not fit store of size {self.dimensions}")
+            if not os.path.exists(self._path(self.META_FILE)):
+                self._write_meta()
+
+            fresh, seen = [], set(self._rows)
+            for i, key in enumerate(keys):
+                if key not in seen:
+                    seen.add(key)
+                    fresh.append(i)
+            if fresh:
+                # Vectors first: an interrupted append leaves rows without keys, dropped on load
+                with open(self._file(self.VECTORS_FILE), "ab") as f:
+                    f.write(vectors[fresh].tobytes())
+                with open(self._file(self.KEYS_FILE), "a") as f:
+                    f.writelines(f"{keys[i]}\n" for i in fresh)
+                for i in fresh:
+                    self._rows[keys[i]] = self._count
+                    self._count += 1
+            return [self._rows[key] for key in keys]
+
+    def compact(self, keep: Iterable[str], batch_rows: int = 4096) -> int:
+        """
+        Drops the rows of the keys not in keep, e.g. the chunks of superseded
+        versions of a document. The kept rows are copied, in order, to the
+        files of the next generation, which the rewrite of meta.json commits:
+        an interrupted compaction leaves the current generation intact.
+
+        Args:
+            keep (iterable): The keys still needed.
+            batch_rows (int): Number of rows copied at once.
+
+        Returns:
+            int: The number of rows dropped.
+        """
+        keep = set(keep)
+        with self._lock:
+            kept = sorted((row, key) for key, row in self._rows.items() if key in keep)
+            dropped = self._count - len(kept)
+            if not dropped:
+                return 0
+            generation = self._generation + 1
+            vectors = self.vectors()
+            with open(self._file(self.VECTORS_FILE, generation), "wb") as f:
+                for start in range(0, len(kept), batch_rows):
+                    f.write(np.ascontiguousarray(vectors[[row for row, _ in kept[start:start + batch_rows]]]).tobytes())
+            with open(self._file(self.KEYS_FILE, generation), "w") as f:
+                f.writelines(f"{key}\n" for _, key in kept)
+            del vectors
+            self._memmap = None
+            old_files = [self._file(self.VECTORS_FILE), self._file(self.KEYS_FILE)]
+            self._generation = generation
+            self._write_meta()
+            self._rows = {key: row for row, (_, key) in enumerate(kept)}
+            self._count = len(kept)
+            for path in old_files:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    # e.g. still memory-mapped by a reader on Windows; the file is no longer used
+                    logging.warning(f"Could not remove {path}: {e}")
+            logging.info(f"Compacted store {self.directory}: dropped {dropped} rows, kept {self._count}")
+            return dropped
+
+    def vectors(self) -> np.ndarray:
+        """
+        Returns every stored vector as a read-only (rows, dimensions) float32 memmap.
+        """
+        with self._lock:
+            if not self._count:
+                return np.zeros((0, self.dimensions or 0), dtype=np.float32)
+            if self._memmap is None or self._memmap.shape[0] != self._count:
+                self._memmap = np.memmap(self._file(self.VECTORS_FILE), dtype=np.float32, mode="r",
+                                         shape=(self._count, self.dimensions))
+            return self._memmap
+
+    def get(self, keys: List[str]) -> np.ndarray:
+        """
+        Returns the vectors of keys, which must all be stored.
+        """
+        rows = self.rows(keys)
+        return np.asarray(self.vectors()[[rows[key] for key in keys]], dtype=np.float32)